@@ -0,0 +1,317 @@
+"""
+End-to-end gateway overhead: the real `main:app`, driven in-process with raw
+ASGI calls, proxying to a stub upstream on loopback that stands in for the
+auth, order and billing services.
+
+Each middleware layer (CORS, compression, metrics, rate limit, auth) is
+measured alone on top of a bare gateway, then all together, for a small
+and a large request/response body. Latency is sampled one request at a
+time; the latency added by the gateway is each percentile minus the same
+percentile of calling the stub directly through the gateway's own upstream
+pool. Throughput is measured separately with --concurrency requests in
+flight. Results are written as JSON so runs on two commits can be compared
+with --compare.
+
+Usage (from api_gateway/):
+    python benchmarks/bench_gateway.py [--requests 5000] [--concurrency 16]
+        [--small-bytes 256] [--large-bytes 262144] [--output results.json]
+        [--compare baseline.json]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+sys.path.insert(0, str(SRC))
+
+LAYERS = ("cors", "compression", "metrics", "rate_limit", "auth")
+PERCENTILES = {"p50": 0.50, "p99": 0.99, "p999": 0.999}
+
+
+# --- stub upstream -----------------------------------------------------------------------
+
+async def _serve_stub(ready) -> None:
+    """Minimal keep-alive HTTP/1.1 server: answers every request with `size` JSON bytes."""
+    bodies: Dict[int, bytes] = {}
+
+    def body_of(size: int) -> bytes:
+        if size not in bodies:
+            bodies[size] = b'{"data":"' + b"x" * max(0, size - 11) + b'"}'
+        return bodies[size]
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                length = 0
+                for line in header_lines:
+                    name, _, value = line.partition(":")
+                    if name.strip().lower() == "content-length":
+                        length = int(value)
+                if length:
+                    await reader.readexactly(length)
+                _, _, query = request_line.split(" ")[1].partition("?")
+                params = dict(part.partition("=")[::2] for part in query.split("&") if part)
+                body = body_of(int(params.get("size", "32")))
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\ncontent-type: application/json\r\n"
+                    b"content-length: %d\r\n\r\n%s" % (len(body), body)
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0, backlog=1024)
+    ready.send(server.sockets[0].getsockname()[1])
+    async with server:
+        await server.serve_forever()
+
+
+def run_stub(ready) -> None:
+    asyncio.run(_serve_stub(ready))
+
+
+def start_stub() -> "tuple[multiprocessing.Process, int]":
+    """Run the stub in its own process so it doesn't compete with the gateway's event loop."""
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=run_stub, args=(child,), daemon=True)
+    process.start()
+    return process, parent.recv()
+
+
+# --- measurement -------------------------------------------------------------------------
+
+def percentiles(latencies: List[float]) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    return {
+        f"{name}_ms": round(ordered[int(q * (len(ordered) - 1))] * 1000, 3)
+        for name, q in PERCENTILES.items()
+    }
+
+
+async def measure(call: Callable[[], Awaitable[int]], requests: int, concurrency: int) -> Dict[str, float]:
+    """
+    Latency percentiles from `requests` sequential calls (so they aren't
+    inflated by queueing on the shared event loop), then throughput from
+    `requests` calls spread over `concurrency` workers.
+    """
+    for _ in range(min(500, requests)):  # warm up pools, JWT cache and the middleware stack
+        status = await call()
+        assert status == 200, f"warm-up request failed with {status}"
+
+    latencies: List[float] = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        await call()
+        latencies.append(time.perf_counter() - started)
+
+    remaining = requests
+
+    async def worker() -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            await call()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    rps = round(requests / (time.perf_counter() - started), 1)
+    return {"requests": requests, "rps": rps, **percentiles(latencies)}
+
+
+async def asgi_call(app, scope: Dict[str, Any], body: bytes) -> int:
+    status = 0
+    received = False
+
+    async def receive():
+        nonlocal received
+        if received:
+            # Streamed responses poll for a disconnect that never comes
+            await asyncio.Event().wait()
+        received = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(dict(scope, headers=list(scope["headers"])), receive, send)
+    return status
+
+
+def configure(app, enabled: Dict[str, bool]) -> None:
+    """Rebuild the app's middleware stack from main.py's with only `enabled` layers active."""
+    from core.config import settings
+    from core.routing import RouteTable
+    from middleware import CompressionMiddleware, GatewayMiddleware
+    from fastapi.middleware.cors import CORSMiddleware
+
+    if not hasattr(app.state, "bench_middleware"):
+        app.state.bench_middleware = list(app.user_middleware)
+    stack = []
+    for entry in app.state.bench_middleware:
+        if entry.cls is CORSMiddleware and not enabled["cors"]:
+            continue
+        if entry.cls is CompressionMiddleware and not enabled["compression"]:
+            continue
+        if entry.cls is GatewayMiddleware:
+            kwargs = dict(entry.kwargs, metrics=enabled["metrics"], rate_limit=enabled["rate_limit"])
+            if not enabled["auth"]:
+                routes = settings.SERVICE_ROUTES
+                routes["orders"]["public_paths"] = ["/bench"]
+                kwargs["routes"] = RouteTable(routes, settings.API_VERSION)
+            entry = type(entry)(entry.cls, *entry.args, **kwargs)
+        stack.append(entry)
+    if enabled["compression"] and not any(entry.cls is CompressionMiddleware for entry in stack):
+        # COMPRESSION_ENABLED=false in the environment: measure it anyway
+        stack.insert(0, type(stack[0])(CompressionMiddleware))
+    app.user_middleware = stack
+    app.middleware_stack = None  # rebuilt on the next call
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    from jose import jwt
+
+    from core.config import settings
+    from middleware.rate_limit import RateLimiter, rate_limiter
+    import main
+
+    # Never throttle the benchmark client
+    unlimited = RateLimiter(requests_per_minute=10**9)
+    rate_limiter.capacity, rate_limiter.rate = unlimited.capacity, unlimited.rate
+    token = jwt.encode({"sub": "bench"}, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+
+    app = main.app
+    results = []
+    async with app.router.lifespan_context(app):
+        upstream = app.state.pools.client("orders")
+        upstream_url = f"{settings.SERVICE_ROUTES['orders']['host']}/bench"
+        configurations = [("bare", dict.fromkeys(LAYERS, False))]
+        configurations += [(layer, {name: name == layer for name in LAYERS}) for layer in LAYERS]
+        configurations.append(("all", dict.fromkeys(LAYERS, True)))
+
+        for size_name, size in (("small", args.small_bytes), ("large", args.large_bytes)):
+            body = b'{"data":"' + b"x" * max(0, size - 11) + b'"}'
+            query = f"size={size}"
+
+            async def direct() -> int:
+                response = await upstream.post(f"{upstream_url}?{query}", content=body)
+                return response.status_code
+
+            baseline = await measure(direct, args.requests, args.concurrency)
+            results.append({"config": "upstream", "body": size_name, "bytes": size, **baseline})
+
+            scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": "1.1",
+                "method": "POST",
+                "scheme": "http",
+                "path": f"/api/{settings.API_VERSION}/orders/bench",
+                "raw_path": f"/api/{settings.API_VERSION}/orders/bench".encode(),
+                "query_string": query.encode(),
+                "root_path": "",
+                "headers": [
+                    (b"host", b"bench"),
+                    (b"origin", b"http://bench.example"),
+                    (b"authorization", f"Bearer {token}".encode()),
+                    (b"accept-encoding", b"gzip, br, zstd"),
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+                "client": ("10.0.0.1", 50000),
+                "server": ("bench", 80),
+                "app": app,
+            }
+            for name, enabled in configurations:
+                configure(app, enabled)
+                summary = await measure(lambda: asgi_call(app, scope, body), args.requests, args.concurrency)
+                for percentile in PERCENTILES:
+                    added = summary[f"{percentile}_ms"] - baseline[f"{percentile}_ms"]
+                    summary[f"added_{percentile}_ms"] = round(added, 3)
+                results.append({"config": name, "body": size_name, "bytes": size, **summary})
+                print(f"{size_name:>5} {name:>11}: {summary['rps']:9.1f} rps  "
+                      f"added p50 {summary['added_p50_ms']:7.3f} ms  p99 {summary['added_p99_ms']:7.3f} ms  "
+                      f"p999 {summary['added_p999_ms']:7.3f} ms", file=sys.stderr)
+    return {"results": results}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=SRC, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: Dict[str, Any], baseline_path: str) -> None:
+    """Print p50/p99 added latency and RPS changes against an earlier run."""
+    baseline = json.loads(Path(baseline_path).read_text())
+    before = {(r["config"], r["body"]): r for r in baseline["results"]}
+    print(f"vs {baseline.get('commit') or baseline_path}:")
+    for result in current["results"]:
+        old = before.get((result["config"], result["body"]))
+        if old is None or "added_p50_ms" not in result:
+            continue
+        print(f"{result['body']:>5} {result['config']:>11}: "
+              f"rps {result['rps'] / old['rps'] - 1:+7.1%}  "
+              f"added p50 {result['added_p50_ms'] - old['added_p50_ms']:+7.3f} ms  "
+              f"p99 {result['added_p99_ms'] - old['added_p99_ms']:+7.3f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5_000, help="measured requests per configuration")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--small-bytes", type=int, default=256)
+    parser.add_argument("--large-bytes", type=int, default=256 * 1024)
+    parser.add_argument("--output", help="JSON results file (default: bench-gateway-<commit>.json)")
+    parser.add_argument("--compare", metavar="BASELINE", help="earlier JSON results to diff against")
+    args = parser.parse_args()
+
+    stub, port = start_stub()
+    # Must be set before the gateway's settings are imported
+    for service in ("AUTH", "ORDER", "BILLING"):
+        os.environ[f"{service}_SERVICE_HOST"] = "127.0.0.1"
+        os.environ[f"{service}_SERVICE_PORT"] = str(port)
+    os.environ.setdefault("TRACING_EXPORT_PATH", os.devnull)
+
+    commit = git_commit()
+    try:
+        # Request logs go to stdout; keep them out of the way but still pay for them
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            report = asyncio.run(run(args))
+    finally:
+        stub.terminate()
+
+    report = {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        **report,
+    }
+    output = Path(args.output or f"bench-gateway-{(commit or 'unknown')[:12]}.json")
+    output.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"results written to {output}")
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Per-request middleware overhead: the old auth / rate-limit / metrics stack
+(two function middlewares plus a BaseHTTPMiddleware) vs the fused
+GatewayMiddleware, driven with raw ASGI calls against a trivial endpoint.
+
+Usage (from api_gateway/):
+    python benchmarks/bench_middleware.py [--requests 20000]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from fastapi import FastAPI  # noqa: E402
+from jose import jwt  # noqa: E402
+
+from core.config import settings  # noqa: E402
+from middleware.auth import auth_middleware  # noqa: E402
+from middleware.gateway import GatewayMiddleware  # noqa: E402
+from middleware.metrics import MetricsMiddleware  # noqa: E402
+from middleware.rate_limit import RateLimiter, rate_limit_middleware, rate_limiter  # noqa: E402
+
+TOKEN = jwt.encode({"sub": "bench"}, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+
+
+def build_app(fused: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/v1/orders/{order_id}")
+    async def order(order_id: int):
+        return {"id": order_id}
+
+    if fused:
+        app.add_middleware(GatewayMiddleware)
+    else:
+        app.add_middleware(MetricsMiddleware)
+        app.middleware("http")(rate_limit_middleware)
+        app.middleware("http")(auth_middleware)
+    return app
+
+
+async def call(app, scope) -> int:
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(dict(scope), receive, send)
+    return status
+
+
+async def run(app, requests: int) -> float:
+    """Return microseconds per request."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/api/v1/orders/7",
+        "raw_path": b"/api/v1/orders/7",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench"), (b"authorization", f"Bearer {TOKEN}".encode())],
+        "client": ("10.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+    for _ in range(200):  # warm up routing, JWT cache and the app's middleware stack
+        assert await call(app, scope) == 200
+    started = time.perf_counter()
+    for _ in range(requests):
+        await call(app, scope)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=20_000)
+    args = parser.parse_args()
+
+    # Never throttle the benchmark client
+    unlimited = RateLimiter(requests_per_minute=10**9)
+    rate_limiter.capacity, rate_limiter.rate = unlimited.capacity, unlimited.rate
+
+    bare = asyncio.run(run(FastAPI(routes=build_app(True).router.routes), args.requests))
+    print(f"{'no middleware':>14}: {bare:7.1f} us/request")
+    for name, fused in (("legacy stack", False), ("fused ASGI", True)):
+        per_request = asyncio.run(run(build_app(fused), args.requests))
+        print(f"{name:>14}: {per_request:7.1f} us/request  "
+              f"(+{per_request - bare:.1f} us middleware overhead)")
+
+
+if __name__ == "__main__":
+    main()
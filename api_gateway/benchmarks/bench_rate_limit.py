@@ -0,0 +1,100 @@
+"""
+Rate limiter cost at 100k distinct keys: legacy per-IP datetime lists vs
+the token-bucket RateLimiter.
+
+Usage (from api_gateway/):
+    python benchmarks/bench_rate_limit.py [--keys 100000] [--rounds 5]
+"""
+import argparse
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from middleware.rate_limit import RateLimiter  # noqa: E402
+from middleware.rate_limit_shared import SharedRateLimiter  # noqa: E402
+
+
+class LegacyRateLimiter:
+    """The list-of-datetimes limiter this module used to ship."""
+
+    def __init__(self, requests_per_minute: int = 60):
+        self.requests_per_minute = requests_per_minute
+        self.requests = {}
+
+    def is_allowed(self, client_ip: str) -> bool:
+        now = datetime.now()
+        minute_ago = now - timedelta(minutes=1)
+        self.requests[client_ip] = [
+            req_time for req_time in self.requests.get(client_ip, []) if req_time > minute_ago
+        ]
+        if len(self.requests.get(client_ip, [])) >= self.requests_per_minute:
+            return False
+        if client_ip not in self.requests:
+            self.requests[client_ip] = []
+        self.requests[client_ip].append(now)
+        return True
+
+
+def run(make_limiter, keys, rounds: int):
+    """Return (ns per request, bytes of limiter state per key)."""
+    limiter = make_limiter()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for key in keys:
+            limiter.is_allowed(key)
+    elapsed = time.perf_counter() - started
+
+    # Memory is measured on a separate run: tracemalloc slows every allocation down
+    limiter = make_limiter()
+    tracemalloc.start()
+    for _ in range(rounds):
+        for key in keys:
+            limiter.is_allowed(key)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / (len(keys) * rounds) * 1e9, retained / len(keys)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--keys", type=int, default=100_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    keys = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(args.keys)]
+
+    print(f"{args.keys} keys x {args.rounds} requests each")
+    shm_dir = tempfile.mkdtemp()
+    shm_runs = iter(range(2))
+
+    def make_shared():
+        # 2^18 slots keeps 100k keys well inside the probe window
+        return SharedRateLimiter(f"{shm_dir}/rl-{next(shm_runs)}", slots=1 << 18, stripes=256)
+
+    limiters = (
+        ("legacy", LegacyRateLimiter),
+        ("token bucket", RateLimiter),
+        ("shared mmap", make_shared),
+    )
+    for name, make_limiter in limiters:
+        ns_per_call, bytes_per_key = run(make_limiter, keys, args.rounds)
+        print(f"{name:>12}: {ns_per_call:8.0f} ns/request  {bytes_per_key:6.0f} B/key")
+
+    clock = [0.0]
+    limiter = RateLimiter(clock=lambda: clock[0])
+    for key in keys:
+        limiter.is_allowed(key)
+    clock[0] += limiter.idle_after
+    started = time.perf_counter()
+    evicted = limiter.sweep()
+    print(f"{'sweep':>12}: evicted {evicted} idle keys in "
+          f"{(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Per-request routing cost: legacy string handling vs the compiled RouteTable.
+
+Usage (from api_gateway/):
+    python benchmarks/bench_routing.py
+"""
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from core.config import settings  # noqa: E402
+from core.routing import route_table  # noqa: E402
+
+PATHS = [
+    ("/api/v1/orders/123", "GET"),
+    ("/api/v1/auth/token", "POST"),
+    ("/api/v1/billing/payments/9", "GET"),
+    ("/health", "GET"),
+    ("/api/v1/unknown/x", "GET"),
+]
+
+
+def legacy_is_public_path(path: str, method: str) -> bool:
+    """is_public_path as it was before the routing table."""
+    if method.upper() == "OPTIONS":
+        return True
+    normalized = path.strip("/")
+    if normalized == "health" or normalized == f"api/{settings.API_VERSION}/health":
+        return True
+    docs_candidates = {
+        "docs", "redoc", "openapi.json",
+        f"api/{settings.API_VERSION}/docs",
+        f"api/{settings.API_VERSION}/redoc",
+        f"api/{settings.API_VERSION}/openapi.json",
+    }
+    if normalized in docs_candidates:
+        return True
+    parts = normalized.split("/") if normalized else []
+    if not parts:
+        return False
+    idx = 0
+    if len(parts) >= 2 and parts[0] == "api" and parts[1] == settings.API_VERSION:
+        idx = 2
+    if len(parts) <= idx:
+        return False
+    service = parts[idx]
+    if service not in settings.SERVICE_ROUTES:
+        return False
+    remaining_path = "/" + "/".join(parts[idx + 1:]) if len(parts) > idx + 1 else "/"
+    return remaining_path in settings.SERVICE_ROUTES[service]["public_paths"]
+
+
+def legacy_resolve(path: str):
+    """Service/target resolution from the old forward_request."""
+    api_prefix = f"/api/{settings.API_VERSION}/"
+    if path.startswith(api_prefix):
+        path = path[len(api_prefix):]
+    path = path.strip("/")
+    path_parts = path.split("/")
+    service_name = path_parts[0]
+    if service_name not in settings.SERVICE_ROUTES:
+        return None
+    service_host = settings.SERVICE_ROUTES[service_name]["host"]
+    forwarding_path = "/" + "/".join(path_parts[1:]) if len(path_parts) > 1 else "/"
+    return f"{service_host}{forwarding_path}"
+
+
+def legacy_request() -> None:
+    for path, method in PATHS:
+        if not legacy_is_public_path(path, method):
+            pass
+        legacy_resolve(path)
+
+
+def compiled_request() -> None:
+    for path, method in PATHS:
+        if not route_table.is_public(path, method):
+            pass
+        route_table.resolve(path)
+
+
+def bench(fn, number: int = 20_000, repeat: int = 5) -> float:
+    """Best per-request time in microseconds."""
+    best = min(timeit.repeat(fn, number=number, repeat=repeat))
+    return best / (number * len(PATHS)) * 1e6
+
+
+if __name__ == "__main__":
+    before = bench(legacy_request)
+    after = bench(compiled_request)
+    print(f"legacy routing:   {before:7.2f} us/request")
+    print(f"compiled routing: {after:7.2f} us/request")
+    print(f"speedup:          {before / after:7.1f}x")
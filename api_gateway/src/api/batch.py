@@ -0,0 +1,255 @@
+"""Batch endpoint: many proxied sub-requests in one round trip."""
+import asyncio
+import base64
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import orjson
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from starlette.types import Message, Scope
+
+from core.config import settings
+from core.routing import route_table
+from core.services import HOP_BY_HOP_HEADERS, UpstreamStreamingResponse, forward_request
+from middleware.rate_limit import rate_limit_key, rate_limiter
+
+router = APIRouter(tags=["Batch"])
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Sub-request headers that come from the batch request itself, never from the item
+BATCH_OWNED_HEADERS = frozenset({
+    "authorization", "host", "content-length", "accept-encoding", "x-request-id", "traceparent",
+})
+
+# Upstream response headers worth returning per item
+ITEM_RESPONSE_HEADERS = frozenset({
+    "content-type", "etag", "cache-control", "location", "retry-after", "x-cache",
+})
+
+
+class SubRequest(BaseModel):
+    id: Optional[str] = None
+    method: str = "GET"
+    path: str
+    headers: Dict[str, str] = Field(default_factory=dict)
+    body: Any = None
+    timeout: Optional[float] = Field(None, gt=0)
+
+
+def sub_request_scope(batch: Request, item: SubRequest, index: int, body: bytes) -> Scope:
+    """ASGI scope for one item, inheriting the batch's client, identity and credentials."""
+    path, _, query = item.path.partition("?")
+    if not path.startswith("/api/"):
+        path = f"/api/{settings.API_VERSION}/{path.lstrip('/')}"
+    headers = [
+        (name.lower().encode("latin-1"), value.encode("latin-1"))
+        for name, value in item.headers.items()
+        if name.lower() not in BATCH_OWNED_HEADERS and name.lower() not in HOP_BY_HOP_HEADERS
+    ]
+    authorization = batch.headers.get("authorization")
+    if authorization is not None:
+        headers.append((b"authorization", authorization.encode("latin-1")))
+    # Bodies are decoded into the NDJSON lines, so ask for them unencoded
+    headers.append((b"accept-encoding", b"identity"))
+    if body:
+        headers.append((b"content-length", str(len(body)).encode()))
+        if not any(name == b"content-type" for name, _ in headers):
+            headers.append((b"content-type", b"application/json"))
+
+    state = {"request_id": f"{batch.state.request_id}-{index}"}
+    if hasattr(batch.state, "user"):
+        state["user"] = batch.state.user
+    return {
+        "type": "http",
+        "app": batch.scope["app"],
+        "asgi": batch.scope["asgi"],
+        "http_version": batch.scope["http_version"],
+        "method": item.method.upper(),
+        "scheme": batch.scope["scheme"],
+        "server": batch.scope.get("server"),
+        "client": batch.scope.get("client"),
+        "root_path": batch.scope.get("root_path", ""),
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "headers": headers,
+        "state": state,
+    }
+
+
+async def read_response(response: Response, limit: int) -> bytes:
+    """Whole body of a (possibly streaming) proxy response, releasing its upstream connection."""
+    if not isinstance(response, StreamingResponse):
+        return response.body
+    try:
+        parts: List[bytes] = []
+        size = 0
+        async for chunk in response.body_iterator:
+            size += len(chunk)
+            if size > limit:
+                raise HTTPException(
+                    status_code=status.HTTP_502_BAD_GATEWAY,
+                    detail=f"Sub-response exceeds {limit} bytes",
+                )
+            parts.append(chunk if isinstance(chunk, bytes) else chunk.encode())
+        return b"".join(parts)
+    finally:
+        if isinstance(response, UpstreamStreamingResponse):
+            await response.upstream.aclose()
+
+
+def item_error(status_code: int, detail: Any) -> Dict[str, Any]:
+    return {"status": status_code, "body": {"detail": detail}}
+
+
+def decode_body(body: bytes, content_type: str) -> Dict[str, Any]:
+    if not body:
+        return {"body": None}
+    if "json" in content_type:
+        try:
+            return {"body": orjson.loads(body)}
+        except orjson.JSONDecodeError:
+            pass
+    if content_type.startswith("text/") or "json" in content_type:
+        return {"body": body.decode("utf-8", errors="replace")}
+    return {"body": base64.b64encode(body).decode(), "body_encoding": "base64"}
+
+
+async def run_item(
+    batch: Request, item: SubRequest, index: int, semaphore: asyncio.Semaphore, deadline: float
+) -> Dict[str, Any]:
+    result: Dict[str, Any] = {"index": index, "id": item.id}
+    body = b"" if item.body is None else orjson.dumps(item.body)
+    scope = sub_request_scope(batch, item, index, body)
+    if route_table.resolve(scope["path"]) is None:
+        return {**result, **item_error(status.HTTP_404_NOT_FOUND, "Service not found")}
+
+    async def receive() -> Message:
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def call() -> Dict[str, Any]:
+        async with semaphore:
+            response = await forward_request(Request(scope, receive))
+            content = await read_response(response, settings.BATCH_MAX_ITEM_BYTES)
+        headers = {
+            name: value for name, value in response.headers.items() if name in ITEM_RESPONSE_HEADERS
+        }
+        return {
+            "status": response.status_code,
+            "headers": headers,
+            **decode_body(content, headers.get("content-type", "")),
+        }
+
+    remaining = deadline - time.monotonic()
+    timeout = min(item.timeout, remaining) if item.timeout else remaining
+    try:
+        return {**result, **await asyncio.wait_for(call(), max(timeout, 0))}
+    except asyncio.TimeoutError:
+        return {**result, **item_error(status.HTTP_504_GATEWAY_TIMEOUT, "Sub-request timed out")}
+    except HTTPException as e:
+        return {**result, **item_error(e.status_code, e.detail)}
+    except Exception as e:
+        return {**result, **item_error(status.HTTP_502_BAD_GATEWAY, type(e).__name__)}
+
+
+async def parse_batch(request: Request) -> List[SubRequest]:
+    try:
+        raw = orjson.loads(await request.body())
+    except orjson.JSONDecodeError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Batch body must be JSON"
+        )
+    if isinstance(raw, dict):
+        raw = raw.get("requests")
+    if not isinstance(raw, list) or not raw:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Expected a non-empty array of sub-requests",
+        )
+    if len(raw) > settings.BATCH_MAX_REQUESTS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.BATCH_MAX_REQUESTS} sub-requests per batch",
+        )
+    try:
+        items = [SubRequest.model_validate(entry) for entry in raw]
+    except ValidationError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=e.errors())
+    nested = {"batch", f"api/{settings.API_VERSION}/batch"}
+    if any(item.path.split("?", 1)[0].strip("/") in nested for item in items):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Batches cannot be nested"
+        )
+    return items
+
+
+def charge_items(request: Request, items: List[SubRequest]) -> None:
+    """
+    Take one rate-limit token per item from the caller's bucket, all or none.
+
+    The middleware already charged the batch request itself, which pays for
+    the first item.
+    """
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+    if len(items) > rate_limiter.capacity:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {int(rate_limiter.capacity)} sub-requests per batch under the rate limit",
+        )
+    key = rate_limit_key(request)
+    cost = len(items) - 1
+    if cost and not rate_limiter.is_allowed(key, cost):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests",
+            headers={"Retry-After": str(rate_limiter.retry_after(key, cost))},
+        )
+
+
+@router.post(f"/api/{settings.API_VERSION}/batch")
+async def batch(request: Request) -> Response:
+    """
+    Run up to BATCH_MAX_REQUESTS sub-requests through the normal proxy path.
+
+    The body is an array (or `{"requests": [...]}`) of
+    `{"id", "method", "path", "headers", "body", "timeout"}` items; paths are
+    relative to `/api/{version}`. The batch is authenticated once and its
+    credentials apply to every item. At most BATCH_CONCURRENCY items run at
+    once and all must finish within BATCH_DEADLINE seconds (items past it
+    get 504). Every item costs one rate-limit token; a batch the caller's
+    bucket can't cover is rejected with 429. With
+    `Accept: application/x-ndjson` each result is streamed as one line as
+    soon as it completes; otherwise a JSON array in request order is
+    returned.
+    """
+    items = await parse_batch(request)
+    charge_items(request, items)
+    semaphore = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+    deadline = time.monotonic() + settings.BATCH_DEADLINE
+    tasks = [
+        asyncio.ensure_future(run_item(request, item, index, semaphore, deadline))
+        for index, item in enumerate(items)
+    ]
+
+    if NDJSON_MEDIA_TYPE not in request.headers.get("accept", ""):
+        try:
+            results = await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        return Response(content=orjson.dumps(results), media_type="application/json")
+
+    async def stream() -> AsyncIterator[bytes]:
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield orjson.dumps(await finished) + b"\n"
+        finally:
+            # Client went away: stop the sub-requests still running
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type=NDJSON_MEDIA_TYPE)
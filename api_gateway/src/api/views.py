@@ -0,0 +1,75 @@
+"""Composite views: one JSON document assembled from concurrent upstream calls."""
+import asyncio
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import quote
+
+import orjson
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.responses import Response
+from pydantic import BaseModel, Field
+
+from api.batch import SubRequest, run_item
+from core.config import settings
+
+router = APIRouter(tags=["Views"])
+
+
+class ViewPart(BaseModel):
+    service: str
+    path: str
+    timeout: float = Field(settings.VIEW_PART_TIMEOUT, gt=0)
+    required: bool = False
+
+
+VIEWS: Dict[str, Dict[str, ViewPart]] = {
+    view: {name: ViewPart.model_validate(part) for name, part in parts.items()}
+    for view, parts in settings.VIEWS.items()
+}
+
+
+def part_request(part: ViewPart, resource_id: str) -> SubRequest:
+    path = part.path.format(id=quote(resource_id, safe=""))
+    return SubRequest(path=f"/{part.service}{path}", timeout=part.timeout)
+
+
+def part_error(result: Dict[str, Any]) -> Dict[str, Any]:
+    body = result.get("body")
+    detail = body.get("detail") if isinstance(body, dict) else None
+    return {"status": result["status"], "detail": detail}
+
+
+@router.get(f"/api/{settings.API_VERSION}/views/{{view}}/{{resource_id}}")
+async def composite_view(request: Request, view: str, resource_id: str) -> Response:
+    """
+    Fetch every part of a view (settings.VIEWS) concurrently and merge them.
+
+    Parts go through the normal proxy path with the caller's credentials,
+    each bounded by its own timeout and all by VIEW_DEADLINE. A part that
+    fails or times out is null in the document and described under
+    `errors`, so the rest of the page can still render; if it is
+    `required`, its error becomes the response's instead.
+    """
+    parts = VIEWS.get(view)
+    if parts is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown view: {view}")
+
+    semaphore = asyncio.Semaphore(len(parts))
+    deadline = time.monotonic() + settings.VIEW_DEADLINE
+    results = await asyncio.gather(*(
+        run_item(request, part_request(part, resource_id), index, semaphore, deadline)
+        for index, part in enumerate(parts.values())
+    ))
+
+    document: Dict[str, Optional[Any]] = {}
+    errors: Dict[str, Dict[str, Any]] = {}
+    for (name, part), result in zip(parts.items(), results):
+        if 200 <= result["status"] < 300:
+            document[name] = result.get("body")
+            continue
+        if part.required:
+            raise HTTPException(status_code=result["status"], detail=part_error(result)["detail"])
+        document[name] = None
+        errors[name] = part_error(result)
+    document["errors"] = errors
+    return Response(content=orjson.dumps(document), media_type="application/json")
@@ -0,0 +1,231 @@
+"""Adaptive per-service concurrency limits with fair queueing and load shedding."""
+import asyncio
+import math
+import time
+from collections import Counter, OrderedDict, deque
+from typing import Callable, Deque, Dict, Iterable, Optional
+
+from fastapi import Request
+
+from core.config import settings
+
+# Priority classes, served in this order
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+
+
+class Overloaded(Exception):
+    """The request was shed; `retry_after` is a hint in whole seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AIMDLimit:
+    """
+    Concurrency limit with additive increase / multiplicative decrease.
+
+    Every completed call reports its latency. A call that failed as overload
+    (502/503/504, connection errors) or took longer than `tolerance` times
+    the service's typical latency (a slow moving average) shrinks the limit
+    by `backoff_ratio`, at most once per typical round trip so one burst of
+    slow responses counts once. Otherwise, while the limit is actually being
+    used, it grows by 1/limit per call, i.e. about one slot per round trip.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        min_limit: int,
+        max_limit: int,
+        backoff_ratio: float = 0.9,
+        tolerance: float = 2.0,
+        smoothing: float = 0.01,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self._clock = clock
+        self.baseline: Optional[float] = None
+        self._last_decrease = -math.inf
+
+    @property
+    def current(self) -> int:
+        return int(self.limit)
+
+    def on_sample(self, latency: float, in_flight: int, overloaded: bool) -> None:
+        if not overloaded:
+            # Fast failures (refused connections) would drag the baseline down
+            if self.baseline is None:
+                self.baseline = latency
+            else:
+                self.baseline += self.smoothing * (latency - self.baseline)
+
+        if overloaded or (self.baseline is not None and latency > self.tolerance * self.baseline):
+            now = self._clock()
+            if now - self._last_decrease >= (self.baseline or 0.0):
+                self.limit = max(float(self.min_limit), self.limit * self.backoff_ratio)
+                self._last_decrease = now
+        elif in_flight * 2 >= self.limit:
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+
+
+class Permit:
+    __slots__ = ("started", "overloaded")
+
+    def __init__(self, started: float):
+        self.started = started
+        self.overloaded = False
+
+
+class Bulkhead:
+    """
+    Admission control for one upstream service.
+
+    Up to `limit.current` calls run at once. Further requests wait in a
+    queue per priority class, round-robin across fairness keys (users or
+    client IPs) so one busy caller can't starve the rest. A full queue, or a
+    wait longer than `max_wait`, sheds the request with `Overloaded` instead
+    of letting it pile up behind the upstream timeout.
+    """
+
+    def __init__(
+        self,
+        limit: AIMDLimit,
+        max_queue: int,
+        max_wait: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._clock = clock
+        self.in_flight = 0
+        self._queues = (OrderedDict(), OrderedDict())  # per priority: key -> deque of waiters
+        self._queued = [0, 0]
+        self.admitted = 0
+        self.shed: Counter = Counter()
+
+    @property
+    def queued(self) -> int:
+        return sum(self._queued)
+
+    def retry_after(self) -> int:
+        """Rough time for the current queue to drain."""
+        per_call = self.limit.baseline or 1.0
+        return max(1, math.ceil((self.queued + 1) * per_call / max(1, self.limit.current)))
+
+    async def acquire(self, key: str, priority: int = PRIORITY_NORMAL) -> Permit:
+        if self.in_flight < self.limit.current and not self.queued:
+            return self._admit()
+        if self._queued[priority] >= self.max_queue:
+            self.shed["queue_full"] += 1
+            raise Overloaded("queue_full", self.retry_after())
+
+        waiter: "asyncio.Future[Permit]" = asyncio.get_running_loop().create_future()
+        waiters = self._queues[priority].setdefault(key, deque())
+        waiters.append(waiter)
+        self._queued[priority] += 1
+        try:
+            return await asyncio.wait_for(waiter, self.max_wait)
+        except asyncio.TimeoutError:
+            self._discard(priority, key, waiters, waiter)
+            self.shed["timeout"] += 1
+            raise Overloaded("timeout", self.retry_after()) from None
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as the client went away: hand the slot on unused
+                self._free_slot()
+            else:
+                self._discard(priority, key, waiters, waiter)
+            raise
+
+    def release(self, permit: Permit) -> None:
+        self.limit.on_sample(self._clock() - permit.started, self.in_flight, permit.overloaded)
+        self._free_slot()
+
+    def _free_slot(self) -> None:
+        self.in_flight -= 1
+        while self.in_flight < self.limit.current:
+            waiter = self._next_waiter()
+            if waiter is None:
+                break
+            if not waiter.done():
+                waiter.set_result(self._admit())
+
+    def _admit(self) -> Permit:
+        self.in_flight += 1
+        self.admitted += 1
+        return Permit(self._clock())
+
+    def _next_waiter(self) -> Optional["asyncio.Future[Permit]"]:
+        for priority, queues in enumerate(self._queues):
+            if queues:
+                key, waiters = next(iter(queues.items()))
+                waiter = waiters.popleft()
+                if waiters:
+                    queues.move_to_end(key)
+                else:
+                    del queues[key]
+                self._queued[priority] -= 1
+                return waiter
+        return None
+
+    def _discard(
+        self, priority: int, key: str, waiters: Deque["asyncio.Future[Permit]"], waiter: "asyncio.Future[Permit]"
+    ) -> None:
+        try:
+            waiters.remove(waiter)
+        except ValueError:
+            return  # already handed a permit and dequeued
+        self._queued[priority] -= 1
+        if not waiters and self._queues[priority].get(key) is waiters:
+            del self._queues[priority][key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "limit": self.limit.current,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "shed_queue_full": self.shed["queue_full"],
+            "shed_timeout": self.shed["timeout"],
+        }
+
+
+def fairness_key(request: Request) -> str:
+    """Queue fairness is per authenticated user, else per client IP."""
+    user = getattr(request.state, "user", None)
+    if user:
+        return f"user:{user.get('sub', '')}"
+    return f"ip:{request.client.host if request.client else ''}"
+
+
+def request_priority(forward_path: str) -> int:
+    return PRIORITY_HIGH if forward_path in settings.ADMISSION_PRIORITY_PATHS else PRIORITY_NORMAL
+
+
+def build_bulkheads(services: Iterable[str]) -> Dict[str, Bulkhead]:
+    return {
+        name: Bulkhead(
+            limit=AIMDLimit(
+                initial=settings.ADMISSION_INITIAL_LIMIT,
+                min_limit=settings.ADMISSION_MIN_LIMIT,
+                max_limit=settings.ADMISSION_MAX_LIMIT,
+                backoff_ratio=settings.ADMISSION_BACKOFF_RATIO,
+                tolerance=settings.ADMISSION_LATENCY_TOLERANCE,
+            ),
+            max_queue=settings.ADMISSION_MAX_QUEUE,
+            max_wait=settings.ADMISSION_MAX_WAIT,
+        )
+        for name in services
+    }
+
+
+bulkheads = build_bulkheads(settings.SERVICE_ROUTES)
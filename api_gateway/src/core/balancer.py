@@ -0,0 +1,286 @@
+"""Replica selection for multi-endpoint upstreams."""
+import asyncio
+import ipaddress
+import random
+import socket
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import httpx
+import structlog
+
+from core.config import settings
+
+logger = structlog.get_logger()
+
+
+class Endpoint:
+    """One replica of an upstream service and its live load/health figures."""
+
+    __slots__ = (
+        "url", "authority", "in_flight", "latency", "requests", "failures",
+        "consecutive_failures", "ejected_until", "ejections", "ejection_streak",
+    )
+
+    def __init__(self, url: str, authority: Optional[str] = None):
+        self.url = url
+        # Host header to send when `url` is a resolved address of a named host
+        self.authority = authority
+        self.in_flight = 0
+        self.latency: Optional[float] = None  # EWMA of time to response headers
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.ejections = 0
+        self.ejection_streak = 0
+
+    def ejected(self, now: float) -> bool:
+        return now < self.ejected_until
+
+
+class LoadBalancer:
+    """
+    Picks a replica per upstream attempt with power of two choices.
+
+    Two random available endpoints are compared by expected wait, their
+    latency EWMA times (outstanding requests + 1), and the cheaper one is
+    taken, which steers load away from slow or busy replicas without the
+    herding a strict least-loaded pick causes across gateway workers.
+    Endpoints not measured yet are costed at the average of the others.
+
+    Passive outlier ejection: `consecutive_failures` 5xx responses or
+    connection errors in a row take an endpoint out of rotation for
+    `ejection_time` seconds, multiplied by how many times in a row it has
+    been ejected (capped at `max_ejection_time`). At most
+    `max_ejection_percent` of the endpoints are ejected at once, so a
+    service-wide outage is left to the circuit breaker.
+    """
+
+    def __init__(
+        self,
+        origin: str,
+        endpoints: Iterable[Endpoint],
+        smoothing: float = 0.3,
+        consecutive_failures: int = 5,
+        ejection_time: float = 30.0,
+        max_ejection_time: float = 300.0,
+        max_ejection_percent: float = 50.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.origin = origin  # the route's host, which proxied URLs are built on
+        self.endpoints: List[Endpoint] = list(endpoints)
+        self.smoothing = smoothing
+        self.consecutive_failures = consecutive_failures
+        self.ejection_time = ejection_time
+        self.max_ejection_time = max_ejection_time
+        self.max_ejection_percent = max_ejection_percent
+        self._clock = clock
+
+    def pick(self, exclude: Sequence[Endpoint] = ()) -> Endpoint:
+        """
+        Endpoint for the next attempt, preferring ones not in `exclude` (earlier
+        attempts of the same request). The caller must `release` it.
+        """
+        endpoints = self.endpoints
+        if len(endpoints) == 1:
+            chosen = endpoints[0]
+        else:
+            available = self.available()
+            candidates = [endpoint for endpoint in available if endpoint not in exclude] or available
+            if len(candidates) == 1:
+                chosen = candidates[0]
+            else:
+                first, second = random.sample(candidates, 2)
+                default = self._default_latency()
+                chosen = first if self._cost(first, default) <= self._cost(second, default) else second
+        chosen.in_flight += 1
+        return chosen
+
+    def available(self) -> List[Endpoint]:
+        """Endpoints in rotation (all of them if every one is ejected)."""
+        now = self._clock()
+        return [endpoint for endpoint in self.endpoints if not endpoint.ejected(now)] or self.endpoints
+
+    def _default_latency(self) -> float:
+        measured = [endpoint.latency for endpoint in self.endpoints if endpoint.latency is not None]
+        return sum(measured) / len(measured) if measured else 1.0
+
+    @staticmethod
+    def _cost(endpoint: Endpoint, default_latency: float) -> float:
+        latency = endpoint.latency if endpoint.latency is not None else default_latency
+        return latency * (endpoint.in_flight + 1)
+
+    def release(self, endpoint: Endpoint, latency: Optional[float] = None, failed: bool = False) -> None:
+        """
+        End an attempt. `latency` (None when unknown or not representative,
+        e.g. cancelled or long-polled) feeds the EWMA; `failed` counts toward
+        ejection.
+        """
+        endpoint.in_flight -= 1
+        endpoint.requests += 1
+        if latency is not None:
+            if endpoint.latency is None:
+                endpoint.latency = latency
+            else:
+                endpoint.latency += self.smoothing * (latency - endpoint.latency)
+        if not failed:
+            endpoint.consecutive_failures = 0
+            endpoint.ejection_streak = 0
+            return
+        endpoint.failures += 1
+        endpoint.consecutive_failures += 1
+        if endpoint.consecutive_failures >= self.consecutive_failures:
+            self._eject(endpoint)
+
+    def _eject(self, endpoint: Endpoint) -> None:
+        now = self._clock()
+        if endpoint.ejected(now):
+            return
+        ejected = sum(1 for other in self.endpoints if other.ejected(now))
+        if (ejected + 1) * 100 > len(self.endpoints) * self.max_ejection_percent:
+            return
+        endpoint.ejection_streak += 1
+        endpoint.ejections += 1
+        endpoint.consecutive_failures = 0
+        duration = min(self.max_ejection_time, self.ejection_time * endpoint.ejection_streak)
+        endpoint.ejected_until = now + duration
+        logger.warning("upstream_endpoint_ejected", endpoint=endpoint.url, seconds=duration)
+
+    def update(self, targets: Iterable[Tuple[str, Optional[str]]]) -> None:
+        """Replace the endpoint set with `(url, authority)` pairs, keeping the state of survivors."""
+        current = {endpoint.url: endpoint for endpoint in self.endpoints}
+        endpoints = [current.get(url) or Endpoint(url, authority) for url, authority in targets]
+        if endpoints:
+            self.endpoints = endpoints
+
+    def url(self, endpoint: Endpoint, target_url: str) -> str:
+        """Point `target_url` (built on the route's host) at `endpoint`."""
+        if endpoint.url == self.origin:
+            return target_url
+        return endpoint.url + target_url[len(self.origin):]
+
+    def target(
+        self, endpoint: Endpoint, target_url: str, headers: Sequence[Tuple[str, str]] = ()
+    ) -> Tuple[str, List[Tuple[str, str]]]:
+        """
+        URL and headers sending a request built for the route's host to
+        `endpoint`; every request to it (proxied, warm-up, health probe) must
+        use these so they share its pooled connections.
+        """
+        headers = list(headers)
+        if endpoint.authority is not None:
+            headers.append(("host", endpoint.authority))
+        return self.url(endpoint, target_url), headers
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        now = self._clock()
+        return {
+            endpoint.url: {
+                "in_flight": endpoint.in_flight,
+                "latency": endpoint.latency,
+                "requests": endpoint.requests,
+                "failures": endpoint.failures,
+                "ejected": endpoint.ejected(now),
+                "ejections": endpoint.ejections,
+            }
+            for endpoint in self.endpoints
+        }
+
+
+def build_balancers(routes: Dict[str, Dict[str, Any]]) -> Dict[str, LoadBalancer]:
+    return {
+        name: LoadBalancer(
+            route["host"],
+            (Endpoint(url) for url in route["endpoints"]),
+            smoothing=settings.BALANCER_LATENCY_SMOOTHING,
+            consecutive_failures=settings.OUTLIER_CONSECUTIVE_FAILURES,
+            ejection_time=settings.OUTLIER_EJECTION_TIME,
+            max_ejection_time=settings.OUTLIER_MAX_EJECTION_TIME,
+            max_ejection_percent=settings.OUTLIER_MAX_EJECTION_PERCENT,
+        )
+        for name, route in routes.items()
+    }
+
+
+class EndpointDiscovery:
+    """
+    Keeps each service's endpoints in line with DNS.
+
+    Every configured endpoint whose host is a name is re-resolved every
+    `interval` seconds into one endpoint per address (docker `--scale` and
+    headless k8s services answer with all replicas), sent with the original
+    Host header. If a lookup fails the addresses from the last good one are
+    kept, or the named endpoint itself until a lookup first succeeds.
+    """
+
+    def __init__(
+        self,
+        routes: Dict[str, Dict[str, Any]],
+        balancers: Dict[str, LoadBalancer],
+        interval: float = settings.UPSTREAM_DNS_REFRESH_INTERVAL,
+    ):
+        self._routes = routes
+        self._balancers = balancers
+        self._interval = interval
+        self._resolved: Dict[str, List[Tuple[str, Optional[str]]]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def _resolve(self, source: str) -> List[Tuple[str, Optional[str]]]:
+        url = httpx.URL(source)
+        try:
+            ipaddress.ip_address(url.host)
+            return [(source, None)]
+        except ValueError:
+            pass
+        port = url.port or (443 if url.scheme == "https" else 80)
+        loop = asyncio.get_running_loop()
+        try:
+            infos = await loop.getaddrinfo(url.host, port, type=socket.SOCK_STREAM)
+        except OSError as e:
+            logger.warning("upstream_dns_refresh_failed", host=url.host, error=str(e))
+            return self._resolved.get(source) or [(source, None)]
+        addresses = sorted({info[4][0] for info in infos})
+        authority = source.split("://", 1)[-1]
+        resolved = [
+            (f"{url.scheme}://{f'[{address}]' if ':' in address else address}:{port}", authority)
+            for address in addresses
+        ]
+        self._resolved[source] = resolved
+        return resolved
+
+    async def refresh(self) -> None:
+        for name, route in self._routes.items():
+            balancer = self._balancers.get(name)
+            if balancer is None:
+                continue
+            targets: Dict[str, Optional[str]] = {}
+            for source in route["endpoints"]:
+                targets.update(await self._resolve(source))
+            balancer.update(targets.items())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                await self.refresh()
+            except Exception as e:  # keep the refresher alive whatever happens
+                logger.error("upstream_dns_refresh_failed", error=str(e), error_type=type(e).__name__)
+
+    def start(self) -> None:
+        """Start the background refresher (no-op when the interval is 0)."""
+        if self._task is None and self._interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+
+balancers = build_balancers(settings.SERVICE_ROUTES)
+endpoint_discovery = EndpointDiscovery(settings.SERVICE_ROUTES, balancers)
@@ -0,0 +1,231 @@
+"""Shared in-memory cache for proxied GET responses."""
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from fastapi import Request
+
+from core.compression import accepted_encodings
+from core.config import settings
+
+# Rough per-entry bookkeeping cost (key tuple, entry tuple, OrderedDict node, indexes)
+ENTRY_OVERHEAD_BYTES = 512
+
+# Vary on anything else would need the request headers in the key; such responses aren't stored.
+# Cookie is not covered: the key scopes by authenticated user, and anonymous sessions share ""
+CACHEABLE_VARY = frozenset({"accept-encoding", "authorization"})
+
+CacheKey = Tuple[str, str, str, str, str]
+RawHeaders = List[Tuple[bytes, bytes]]
+
+
+class CachedResponse(NamedTuple):
+    status_code: int
+    raw_headers: RawHeaders
+    body: bytes
+    etag: Optional[str]
+    stored_at: float
+    expires_at: float
+    size: int
+    # Compressed copies of an identity body, by coding (made on first use)
+    variants: Dict[str, bytes]
+
+
+def cache_key(request: Request, path: str) -> CacheKey:
+    """(method, upstream path, query, user scope, accepted codings) for a request."""
+    user = getattr(request.state, "user", None)
+    scope = str(user.get("sub", "")) if user else ""
+    return (
+        request.method,
+        path,
+        str(request.url.query),
+        scope,
+        accepted_encodings(request.headers.get("accept-encoding", "")),
+    )
+
+
+def parse_cache_control(value: str) -> Dict[str, Optional[str]]:
+    directives: Dict[str, Optional[str]] = {}
+    for part in value.split(","):
+        name, _, argument = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') if argument else None
+    return directives
+
+
+def freshness_lifetime(headers, max_ttl: float) -> Optional[float]:
+    """
+    Seconds a response may be served without revalidation, or None if it
+    must not be stored. Responses with an ETag but no explicit lifetime are
+    stored with a lifetime of 0 so they can still be revalidated cheaply.
+    """
+    directives = parse_cache_control(headers.get("cache-control", ""))
+    if "no-store" in directives or "set-cookie" in headers:
+        return None
+    vary = {v.strip().lower() for v in headers.get("vary", "").split(",") if v.strip()}
+    if not vary <= CACHEABLE_VARY:
+        return None
+
+    lifetime: Optional[float] = None
+    if "no-cache" not in directives:
+        for name in ("s-maxage", "max-age"):
+            raw = directives.get(name)
+            if raw is not None and raw.isdigit():
+                lifetime = float(raw)
+                break
+    if lifetime is None:
+        return 0.0 if "etag" in headers else None
+
+    age = headers.get("age", "")
+    if age.isdigit():
+        lifetime -= float(age)
+    return max(0.0, min(lifetime, max_ttl))
+
+
+def etag_matches(if_none_match: str, etag: Optional[str]) -> bool:
+    """Weak comparison of an If-None-Match header against an entity tag (RFC 9110 §13.1.2)."""
+    if etag is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+class ResponseCache:
+    """
+    LRU of upstream responses bounded by entry count and total bytes.
+
+    Entries are keyed by `cache_key`, so authenticated responses are only
+    ever served back to the same user. Fresh entries are served directly;
+    stale entries with an ETag are kept so the gateway can revalidate them
+    with If-None-Match and reuse the body on 304. Unsafe requests invalidate
+    every entry for their path, regardless of query or user.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        max_entry_bytes: int,
+        max_ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.max_ttl = max_ttl
+        self._clock = clock
+        self._entries: "OrderedDict[CacheKey, CachedResponse]" = OrderedDict()
+        self._by_path: Dict[str, Set[CacheKey]] = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evictions = 0
+
+    def get(self, key: CacheKey) -> Optional[CachedResponse]:
+        """Entry for `key`, fresh or stale; callers check `is_fresh`."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def is_fresh(self, entry: CachedResponse) -> bool:
+        return entry.expires_at > self._clock()
+
+    def age(self, entry: CachedResponse) -> int:
+        return int(self._clock() - entry.stored_at)
+
+    def put(
+        self,
+        key: CacheKey,
+        status_code: int,
+        raw_headers: RawHeaders,
+        body: bytes,
+        etag: Optional[str],
+        lifetime: float,
+    ) -> bool:
+        """Store a response; returns False if it is too large to cache."""
+        size = len(body) + sum(len(k) + len(v) for k, v in raw_headers) + ENTRY_OVERHEAD_BYTES
+        if size > self.max_entry_bytes:
+            return False
+        now = self._clock()
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = CachedResponse(
+            status_code, raw_headers, body, etag, now, now + lifetime, size, {}
+        )
+        self._by_path.setdefault(key[1], set()).add(key)
+        self.bytes += size
+        self._evict()
+        return True
+
+    def add_variant(self, key: CacheKey, entry: CachedResponse, encoding: str, body: bytes) -> None:
+        """Keep a compressed copy of `entry`'s body, if the entry is still cached."""
+        if self._entries.get(key) is not entry or encoding in entry.variants:
+            return
+        entry.variants[encoding] = body
+        self.bytes += len(body)
+        self._evict()
+
+    def _evict(self) -> None:
+        while self._entries and (
+            len(self._entries) > self.max_entries or self.bytes > self.max_bytes
+        ):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def refresh(self, key: CacheKey, lifetime: float) -> Optional[CachedResponse]:
+        """Extend a revalidated entry's freshness (after a 304)."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        now = self._clock()
+        entry = entry._replace(stored_at=now, expires_at=now + lifetime)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        return entry
+
+    def invalidate_path(self, path: str) -> int:
+        keys = list(self._by_path.get(path, ()))
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def _remove(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key)
+        self.bytes -= entry.size + sum(len(body) for body in entry.variants.values())
+        keys = self._by_path[key[1]]
+        keys.discard(key)
+        if not keys:
+            del self._by_path[key[1]]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_path.clear()
+        self.bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+        }
+
+
+response_cache = ResponseCache(
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    max_bytes=settings.RESPONSE_CACHE_MAX_BYTES,
+    max_entry_bytes=settings.RESPONSE_CACHE_MAX_ENTRY_BYTES,
+    max_ttl=settings.RESPONSE_CACHE_MAX_TTL,
+)
@@ -0,0 +1,149 @@
+"""Content-encoding negotiation and response body compression."""
+import zlib
+from typing import Dict, Iterable, Optional, Protocol, Tuple
+
+from core.config import settings
+
+try:  # optional: pip install 'api-gateway[compression]'
+    import brotli
+except ImportError:
+    brotli = None
+
+try:  # optional: pip install 'api-gateway[compression]'
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Streams the gateway never compresses, whatever COMPRESSION_LEVELS says
+NEVER_COMPRESS = frozenset({"text/event-stream"})
+
+
+class Compressor(Protocol):
+    def compress(self, data: bytes) -> bytes: ...
+    def flush(self) -> bytes: ...
+    def finish(self) -> bytes: ...
+
+
+class GzipCompressor:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliCompressor:
+    def __init__(self, level: int):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class ZstdCompressor:
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+COMPRESSORS = {"gzip": GzipCompressor}
+if brotli is not None:
+    COMPRESSORS["br"] = BrotliCompressor
+if zstandard is not None:
+    COMPRESSORS["zstd"] = ZstdCompressor
+
+
+def parse_accept_encoding(value: str) -> Dict[str, float]:
+    """Coding -> q-value from an Accept-Encoding header (RFC 9110 §12.5.3)."""
+    codings: Dict[str, float] = {}
+    for part in value.split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, raw = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(raw)
+                except ValueError:
+                    q = 0.0
+        codings[coding] = q
+    return codings
+
+
+def accepted_encodings(value: str) -> str:
+    """Canonical form of an Accept-Encoding header, so equivalent headers share cache entries."""
+    return ",".join(sorted(coding for coding, q in parse_accept_encoding(value).items() if q > 0))
+
+
+def negotiate(accept_encoding: str, preference: Iterable[str]) -> Optional[str]:
+    """
+    Best coding the client accepts, or None for identity. Higher q wins;
+    ties go to the earlier coding in `preference`.
+    """
+    if not accept_encoding:
+        return None
+    accepted = parse_accept_encoding(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    best, best_q = None, 0.0
+    for coding in preference:
+        q = accepted.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compression_level(content_type: str, encoding: str, levels: Dict[str, Dict[str, int]]) -> Optional[int]:
+    """Configured level for a media type (exact, then `type/*`), or None if it isn't compressed."""
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    if not media_type or media_type in NEVER_COMPRESS:
+        return None
+    by_encoding = levels.get(media_type) or levels.get(media_type.split("/", 1)[0] + "/*")
+    return by_encoding.get(encoding) if by_encoding else None
+
+
+def choose_encoding(
+    accept_encoding: str,
+    content_type: str,
+    preference: Optional[Iterable[str]] = None,
+    levels: Optional[Dict[str, Dict[str, int]]] = None,
+) -> Optional[Tuple[str, int]]:
+    """(coding, level) to compress a response with, or None to send it as is."""
+    if preference is None:
+        preference = settings.COMPRESSION_ENCODINGS
+    encoding = negotiate(accept_encoding, [coding for coding in preference if coding in COMPRESSORS])
+    if encoding is None:
+        return None
+    level = compression_level(content_type, encoding, settings.COMPRESSION_LEVELS if levels is None else levels)
+    return (encoding, level) if level is not None else None
+
+
+def compressor(encoding: str, level: int) -> Compressor:
+    return COMPRESSORS[encoding](level)
+
+
+def compress(body: bytes, encoding: str, level: int) -> bytes:
+    stream = compressor(encoding, level)
+    return stream.compress(body) + stream.finish()
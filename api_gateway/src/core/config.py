@@ -1,6 +1,9 @@
+import os
+import tempfile
+
 from pydantic_settings import BaseSettings
-from pydantic import Field
-from typing import Dict, List
+from pydantic import AliasChoices, Field
+from typing import Any, Dict, List, Literal, Optional
 
 
 class Settings(BaseSettings):
@@ -8,7 +11,16 @@ class Settings(BaseSettings):
     
     # Service host and port
     HOST: str = "0.0.0.0"
-    PORT: int = Field(9000, env="API_GATEWAY_PORT")
+    PORT: int = Field(9000, validation_alias=AliasChoices("API_GATEWAY_PORT", "PORT"))
+
+    # Production launcher (python src/main.py): pre-forked workers sharing the port
+    SERVER_WORKERS: int = Field(1, env="SERVER_WORKERS")
+    SERVER_BACKLOG: int = Field(2048, env="SERVER_BACKLOG")  # listen() queue per socket
+    SERVER_REUSE_PORT: bool = Field(True, env="SERVER_REUSE_PORT")  # else one socket bound before fork
+    SERVER_PRELOAD: bool = Field(True, env="SERVER_PRELOAD")  # import the app once, share it copy-on-write
+    SERVER_MAX_REQUESTS: int = Field(0, env="SERVER_MAX_REQUESTS")  # recycle workers after N requests; 0 = never
+    SERVER_MAX_REQUESTS_JITTER: int = Field(0, env="SERVER_MAX_REQUESTS_JITTER")
+    SERVER_GRACEFUL_TIMEOUT: int = Field(30, env="SERVER_GRACEFUL_TIMEOUT")
     
     # API Version
     API_VERSION: str = Field("v1", env="API_VERSION")
@@ -16,56 +28,272 @@ class Settings(BaseSettings):
     # Rate limiting
     RATE_LIMIT_ENABLED: bool = Field(True, env="RATE_LIMIT_ENABLED")
     RATE_LIMIT_REQUESTS_PER_MINUTE: int = Field(60, env="RATE_LIMIT_REQUESTS_PER_MINUTE")
+    RATE_LIMIT_BURST: int = Field(0, env="RATE_LIMIT_BURST")  # 0 = requests per minute
+    RATE_LIMIT_KEY: Literal["ip", "user", "api_key"] = Field("ip", env="RATE_LIMIT_KEY")
+    RATE_LIMIT_SWEEP_INTERVAL: float = Field(60.0, env="RATE_LIMIT_SWEEP_INTERVAL")
+    # "memory": per-process buckets; "shared": one mmap'd table for all workers on the host
+    RATE_LIMIT_BACKEND: Literal["memory", "shared"] = Field("memory", env="RATE_LIMIT_BACKEND")
+    RATE_LIMIT_SHM_PATH: str = Field("/dev/shm/asyncflow-gateway-ratelimit", env="RATE_LIMIT_SHM_PATH")
+    RATE_LIMIT_SHM_SLOTS: int = Field(65536, env="RATE_LIMIT_SHM_SLOTS")
+    RATE_LIMIT_SHM_STRIPES: int = Field(64, env="RATE_LIMIT_SHM_STRIPES")
     
     # Request timeouts (seconds)
     DEFAULT_TIMEOUT: float = Field(30.0, env="DEFAULT_TIMEOUT")
-    LONG_POLLING_TIMEOUT: float = Field(90.0, env="LONG_POLLING_TIMEOUT")
+    LONG_POLLING_TIMEOUT: float = Field(90.0, env="LONG_POLLING_TIMEOUT")  # read timeout for long polls / SSE
+    # Adaptive per-route read timeouts: MULTIPLIER x the route's recent QUANTILE time to
+    # headers, clamped to [FLOOR, DEFAULT_TIMEOUT]; DEFAULT_TIMEOUT until MIN_SAMPLES are seen.
+    # Kept per method and applied to idempotent requests only; writes always get DEFAULT_TIMEOUT
+    ADAPTIVE_TIMEOUTS_ENABLED: bool = Field(True, env="ADAPTIVE_TIMEOUTS_ENABLED")
+    ADAPTIVE_TIMEOUT_QUANTILE: float = Field(0.99, env="ADAPTIVE_TIMEOUT_QUANTILE")
+    ADAPTIVE_TIMEOUT_MULTIPLIER: float = Field(3.0, env="ADAPTIVE_TIMEOUT_MULTIPLIER")
+    ADAPTIVE_TIMEOUT_FLOOR: float = Field(0.5, env="ADAPTIVE_TIMEOUT_FLOOR")
+    ADAPTIVE_TIMEOUT_MIN_SAMPLES: int = Field(100, env="ADAPTIVE_TIMEOUT_MIN_SAMPLES")
+    ADAPTIVE_TIMEOUT_WINDOW: int = Field(1000, env="ADAPTIVE_TIMEOUT_WINDOW")  # samples; two windows kept
+    ADAPTIVE_TIMEOUT_MAX_ROUTES_PER_SERVICE: int = Field(50, env="ADAPTIVE_TIMEOUT_MAX_ROUTES_PER_SERVICE")
+    # Fixed parts of adaptive timeouts: TCP connect, and waiting for a free pooled connection
+    UPSTREAM_CONNECT_TIMEOUT: float = Field(2.0, env="UPSTREAM_CONNECT_TIMEOUT")
+    UPSTREAM_POOL_TIMEOUT: float = Field(5.0, env="UPSTREAM_POOL_TIMEOUT")
+
+    # Proxy body handling (bytes; 0 disables the limit)
+    PROXY_STREAMING_ENABLED: bool = Field(True, env="PROXY_STREAMING_ENABLED")
+    PROXY_MAX_REQUEST_BODY_BYTES: int = Field(10 * 1024 * 1024, env="PROXY_MAX_REQUEST_BODY_BYTES")
+    PROXY_MAX_RESPONSE_BODY_BYTES: int = Field(0, env="PROXY_MAX_RESPONSE_BODY_BYTES")
+    # Request bodies up to this size are buffered so a failed attempt can be retried
+    PROXY_REPLAYABLE_BODY_BYTES: int = Field(64 * 1024, env="PROXY_REPLAYABLE_BODY_BYTES")
+    PROXY_STREAM_CHUNK_SIZE: int = Field(64 * 1024, env="PROXY_STREAM_CHUNK_SIZE")
+
+    # Response compression; upstream bodies that are already encoded pass through untouched
+    COMPRESSION_ENABLED: bool = Field(True, env="COMPRESSION_ENABLED")
+    COMPRESSION_MIN_SIZE: int = Field(1000, env="COMPRESSION_MIN_SIZE")
+    # Server preference; br and zstd need the `compression` extra and are skipped without it
+    COMPRESSION_ENCODINGS: List[str] = Field(["zstd", "br", "gzip"], env="COMPRESSION_ENCODINGS")
+    # Level per media type (exact or "type/*") and coding; unlisted types are not compressed
+    COMPRESSION_LEVELS: Dict[str, Dict[str, int]] = Field(
+        {
+            "application/json": {"zstd": 3, "br": 4, "gzip": 6},
+            "application/x-ndjson": {"zstd": 3, "br": 4, "gzip": 6},
+            "application/javascript": {"zstd": 6, "br": 6, "gzip": 6},
+            "application/xml": {"zstd": 3, "br": 4, "gzip": 6},
+            "text/*": {"zstd": 3, "br": 4, "gzip": 6},
+        },
+        env="COMPRESSION_LEVELS",
+    )
+
+    # Upstream retries: only idempotent methods or requests with an Idempotency-Key
+    RETRY_MAX_ATTEMPTS: int = Field(3, env="RETRY_MAX_ATTEMPTS")
+    RETRY_BACKOFF_BASE: float = Field(0.1, env="RETRY_BACKOFF_BASE")
+    RETRY_BACKOFF_MAX: float = Field(1.0, env="RETRY_BACKOFF_MAX")
+    # Retries may add at most this fraction of live traffic per service
+    RETRY_BUDGET_RATIO: float = Field(0.2, env="RETRY_BUDGET_RATIO")
+    RETRY_BUDGET_MIN_PER_SECOND: float = Field(1.0, env="RETRY_BUDGET_MIN_PER_SECOND")
+
+    # Per-service circuit breakers
+    CIRCUIT_BREAKER_ENABLED: bool = Field(True, env="CIRCUIT_BREAKER_ENABLED")
+    CIRCUIT_FAILURE_THRESHOLD: int = Field(5, env="CIRCUIT_FAILURE_THRESHOLD")
+    CIRCUIT_RECOVERY_TIMEOUT: float = Field(10.0, env="CIRCUIT_RECOVERY_TIMEOUT")
+    CIRCUIT_HALF_OPEN_MAX_CALLS: int = Field(1, env="CIRCUIT_HALF_OPEN_MAX_CALLS")
+
+    # Hedged GET/HEAD requests: re-send once the route's recent p95 has passed
+    HEDGING_ENABLED: bool = Field(False, env="HEDGING_ENABLED")
+    HEDGING_PERCENTILE: float = Field(0.95, env="HEDGING_PERCENTILE")
+    HEDGING_MIN_DELAY: float = Field(0.01, env="HEDGING_MIN_DELAY")
+    HEDGING_MIN_SAMPLES: int = Field(20, env="HEDGING_MIN_SAMPLES")
+    HEDGING_WINDOW_SIZE: int = Field(200, env="HEDGING_WINDOW_SIZE")
+    # Hedges may add at most this fraction of a route's traffic
+    HEDGING_MAX_RATIO: float = Field(0.05, env="HEDGING_MAX_RATIO")
+
+    # Gateway response cache for GETs (honours upstream Cache-Control/ETag)
+    RESPONSE_CACHE_ENABLED: bool = Field(True, env="RESPONSE_CACHE_ENABLED")
+    RESPONSE_CACHE_MAX_ENTRIES: int = Field(10_000, env="RESPONSE_CACHE_MAX_ENTRIES")
+    RESPONSE_CACHE_MAX_BYTES: int = Field(64 * 1024 * 1024, env="RESPONSE_CACHE_MAX_BYTES")
+    RESPONSE_CACHE_MAX_ENTRY_BYTES: int = Field(1024 * 1024, env="RESPONSE_CACHE_MAX_ENTRY_BYTES")
+    RESPONSE_CACHE_MAX_TTL: float = Field(300.0, env="RESPONSE_CACHE_MAX_TTL")
+
+    # Adaptive per-service concurrency limits (AIMD on upstream latency)
+    ADMISSION_ENABLED: bool = Field(True, env="ADMISSION_ENABLED")
+    ADMISSION_INITIAL_LIMIT: int = Field(50, env="ADMISSION_INITIAL_LIMIT")
+    ADMISSION_MIN_LIMIT: int = Field(5, env="ADMISSION_MIN_LIMIT")
+    ADMISSION_MAX_LIMIT: int = Field(1000, env="ADMISSION_MAX_LIMIT")
+    ADMISSION_BACKOFF_RATIO: float = Field(0.9, env="ADMISSION_BACKOFF_RATIO")
+    # Latency above this multiple of the service's typical latency counts as overload
+    ADMISSION_LATENCY_TOLERANCE: float = Field(2.0, env="ADMISSION_LATENCY_TOLERANCE")
+    # Requests over the limit wait (round-robin per user) this long at most, then get a 503
+    ADMISSION_MAX_QUEUE: int = Field(100, env="ADMISSION_MAX_QUEUE")
+    ADMISSION_MAX_WAIT: float = Field(1.0, env="ADMISSION_MAX_WAIT")
+    # Upstream paths queued ahead of everything else (health probes, token issuance)
+    ADMISSION_PRIORITY_PATHS: List[str] = Field(["/health", "/token"], env="ADMISSION_PRIORITY_PATHS")
+
+    # Single-flight for identical concurrent GET/HEAD requests
+    COALESCING_ENABLED: bool = Field(True, env="COALESCING_ENABLED")
+    COALESCING_MAX_WAIT: float = Field(5.0, env="COALESCING_MAX_WAIT")
+    # Larger responses are streamed to one waiter; the others make their own call
+    COALESCING_MAX_BODY_BYTES: int = Field(1024 * 1024, env="COALESCING_MAX_BODY_BYTES")
+
+    # POST /api/{version}/batch: sub-requests per batch, run at once, and the whole batch's deadline
+    BATCH_MAX_REQUESTS: int = Field(50, env="BATCH_MAX_REQUESTS")
+    BATCH_CONCURRENCY: int = Field(10, env="BATCH_CONCURRENCY")
+    BATCH_DEADLINE: float = Field(10.0, env="BATCH_DEADLINE")
+    BATCH_MAX_ITEM_BYTES: int = Field(1024 * 1024, env="BATCH_MAX_ITEM_BYTES")
+
+    # Composite views, GET /api/{version}/views/{view}/{id}: parts fetched concurrently and
+    # merged into one document. A part's path is on its service, with "{id}" from the URL;
+    # a failed or timed-out part is null (details under "errors") unless it is required
+    VIEWS: Dict[str, Dict[str, Dict[str, Any]]] = Field(
+        {
+            "order": {
+                "order": {"service": "orders", "path": "/api/orders/{id}", "timeout": 1.0, "required": True},
+                "payment": {"service": "billing", "path": "/payments?order_id={id}", "timeout": 0.5},
+                "user": {"service": "auth", "path": "/auth/me", "timeout": 0.5},
+            },
+        },
+        env="VIEWS",
+    )
+    VIEW_PART_TIMEOUT: float = Field(1.0, env="VIEW_PART_TIMEOUT")  # for parts without their own
+    VIEW_DEADLINE: float = Field(2.0, env="VIEW_DEADLINE")
+
+    # Upstream connection pools (one per service; defaults below, per-service
+    # overrides in UPSTREAM_POOLS, e.g. '{"orders": {"max_connections": 200}}')
+    POOL_MAX_CONNECTIONS: int = Field(100, env="POOL_MAX_CONNECTIONS")
+    POOL_MAX_KEEPALIVE_CONNECTIONS: int = Field(20, env="POOL_MAX_KEEPALIVE_CONNECTIONS")
+    POOL_KEEPALIVE_EXPIRY: float = Field(30.0, env="POOL_KEEPALIVE_EXPIRY")
+    POOL_HTTP2: bool = Field(False, env="POOL_HTTP2")  # h2c prior knowledge, needs `h2`
+    POOL_DNS_CACHE_TTL: float = Field(30.0, env="POOL_DNS_CACHE_TTL")  # 0 disables
+    POOL_WARMUP_CONNECTIONS: int = Field(2, env="POOL_WARMUP_CONNECTIONS")
+    POOL_WARMUP_TIMEOUT: float = Field(2.0, env="POOL_WARMUP_TIMEOUT")
+    UPSTREAM_POOLS: Dict[str, Dict[str, Any]] = Field(default_factory=dict, env="UPSTREAM_POOLS")
+
+    # Upstream replicas: endpoints per service replacing its default host, e.g.
+    # '{"orders": ["http://orders-1:9001", "http://orders-2:9001"]}'; picked per attempt
+    # with power of two choices on latency EWMA x outstanding requests
+    UPSTREAM_ENDPOINTS: Dict[str, List[str]] = Field(default_factory=dict, env="UPSTREAM_ENDPOINTS")
+    # Re-resolve endpoint host names this often, one endpoint per address (0 disables)
+    UPSTREAM_DNS_REFRESH_INTERVAL: float = Field(10.0, env="UPSTREAM_DNS_REFRESH_INTERVAL")
+    BALANCER_LATENCY_SMOOTHING: float = Field(0.3, env="BALANCER_LATENCY_SMOOTHING")
+    # Passive outlier ejection on consecutive 5xx responses / connection errors
+    OUTLIER_CONSECUTIVE_FAILURES: int = Field(5, env="OUTLIER_CONSECUTIVE_FAILURES")
+    OUTLIER_EJECTION_TIME: float = Field(30.0, env="OUTLIER_EJECTION_TIME")
+    OUTLIER_MAX_EJECTION_TIME: float = Field(300.0, env="OUTLIER_MAX_EJECTION_TIME")
+    OUTLIER_MAX_EJECTION_PERCENT: float = Field(50.0, env="OUTLIER_MAX_EJECTION_PERCENT")
     
+    # Upstream health aggregation (/health)
+    HEALTH_PROBE_TIMEOUT: float = Field(2.0, env="HEALTH_PROBE_TIMEOUT")
+    HEALTH_CACHE_TTL: float = Field(5.0, env="HEALTH_CACHE_TTL")
+    HEALTH_REFRESH_INTERVAL: float = Field(2.0, env="HEALTH_REFRESH_INTERVAL")
+    HEALTH_HISTORY_SIZE: int = Field(20, env="HEALTH_HISTORY_SIZE")
+
     # Metrics
     ENABLE_METRICS: bool = Field(True, env="ENABLE_METRICS")
     METRICS_PATH: str = Field("/metrics", env="METRICS_PATH")
+    METRICS_LATENCY_BUCKETS: List[float] = Field(
+        [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0],
+        env="METRICS_LATENCY_BUCKETS",
+    )
+    METRICS_PHASE_BUCKETS: List[float] = Field(
+        [0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0],
+        env="METRICS_PHASE_BUCKETS",
+    )
+    # Routes beyond this many per service are reported as "other"
+    METRICS_MAX_ROUTES_PER_SERVICE: int = Field(50, env="METRICS_MAX_ROUTES_PER_SERVICE")
+    # Attach the request id as an exemplar (exposed in OpenMetrics format)
+    METRICS_EXEMPLARS: bool = Field(True, env="METRICS_EXEMPLARS")
+    # Serve repeated scrapes within this many seconds from the last rendered exposition
+    METRICS_CACHE_TTL: float = Field(1.0, env="METRICS_CACHE_TTL")
+    # Workers share counters/histograms through mmap'd files here (prometheus_client
+    # multiprocess mode); defaults to a temp directory when SERVER_WORKERS > 1.
+    # Exemplars are not kept in this mode
+    METRICS_MULTIPROCESS_DIR: Optional[str] = Field(
+        None, validation_alias=AliasChoices("METRICS_MULTIPROCESS_DIR", "PROMETHEUS_MULTIPROC_DIR")
+    )
+    # How often each worker publishes its scrape-time gauges (pools, breakers, caches, ...)
+    METRICS_WORKER_SNAPSHOT_INTERVAL: float = Field(5.0, env="METRICS_WORKER_SNAPSHOT_INTERVAL")
     
     # Logging
     LOG_LEVEL: str = Field("INFO", env="LOG_LEVEL")
     LOG_FORMAT: str = Field("json", env="LOG_FORMAT")
+    # Records are queued and written by a background thread; a full queue drops records
+    LOG_QUEUE_SIZE: int = Field(10_000, env="LOG_QUEUE_SIZE")
+    LOG_BATCH_SIZE: int = Field(512, env="LOG_BATCH_SIZE")
+    # Fraction of each event kept, e.g. '{"incoming_request": 0.1}'; errors and slow requests always are
+    LOG_SAMPLE_RATES: Dict[str, float] = Field(default_factory=dict, env="LOG_SAMPLE_RATES")
+    LOG_SLOW_REQUEST_MS: float = Field(1000.0, env="LOG_SLOW_REQUEST_MS")
+
+    # Tracing (W3C traceparent); spans go to TRACING_EXPORT_PATH as JSON lines, or stdout if unset
+    TRACING_ENABLED: bool = Field(True, env="TRACING_ENABLED")
+    TRACING_EXPORT_PATH: Optional[str] = Field(None, env="TRACING_EXPORT_PATH")
+    # Tail sampling: slow or failed traces are always exported, others at this rate
+    TRACING_SLOW_MS: float = Field(500.0, env="TRACING_SLOW_MS")
+    TRACING_SAMPLE_RATE: float = Field(0.01, env="TRACING_SAMPLE_RATE")
+    TRACING_MAX_SPANS_PER_TRACE: int = Field(256, env="TRACING_MAX_SPANS_PER_TRACE")
     
     # CORS Settings
     CORS_ORIGINS: List[str] = Field(["*"], env="CORS_ORIGINS")
     CORS_ALLOW_CREDENTIALS: bool = Field(True, env="CORS_ALLOW_CREDENTIALS")
     
-    # Per-service ports (can be overridden via env)
+    # Per-service hosts and ports (can be overridden via env, e.g. to point at local stubs)
+    AUTH_SERVICE_HOST: str = Field("auth_service", env="AUTH_SERVICE_HOST")
+    ORDER_SERVICE_HOST: str = Field("order_service", env="ORDER_SERVICE_HOST")
+    BILLING_SERVICE_HOST: str = Field("billing_service", env="BILLING_SERVICE_HOST")
     AUTH_SERVICE_PORT: int = Field(9003, env="AUTH_SERVICE_PORT")
     ORDER_SERVICE_PORT: int = Field(9001, env="ORDER_SERVICE_PORT")
     BILLING_SERVICE_PORT: int = Field(9002, env="BILLING_SERVICE_PORT")
 
     # Service routes configuration (computed from ports so Field() isn't used inside strings)
     @property
-    def SERVICE_ROUTES(self) -> Dict[str, Dict[str, str]]:
-        return {
+    def SERVICE_ROUTES(self) -> Dict[str, Dict[str, Any]]:
+        routes: Dict[str, Dict[str, Any]] = {
             "auth": {
-                "host": f"http://auth_service:{self.AUTH_SERVICE_PORT}",
+                "host": f"http://{self.AUTH_SERVICE_HOST}:{self.AUTH_SERVICE_PORT}",
                 "prefix": "auth",
                 "public_paths": ["/register", "/token"]
             },
             "orders": {
-                "host": f"http://order_service:{self.ORDER_SERVICE_PORT}",
+                "host": f"http://{self.ORDER_SERVICE_HOST}:{self.ORDER_SERVICE_PORT}",
                 "prefix": "orders",
                 "public_paths": []
             },
             "billing": {
-                "host": f"http://billing_service:{self.BILLING_SERVICE_PORT}",
+                "host": f"http://{self.BILLING_SERVICE_HOST}:{self.BILLING_SERVICE_PORT}",
                 "prefix": "billing",
                 "public_paths": []
             }
         }
+        for name, route in routes.items():
+            route["pool"] = self.pool_config(name)
+            route["endpoints"] = list(self.UPSTREAM_ENDPOINTS.get(name) or [route["host"]])
+        return routes
+
+    def pool_config(self, service: str) -> Dict[str, Any]:
+        """Connection pool settings for a service: global defaults + UPSTREAM_POOLS overrides."""
+        return {
+            "max_connections": self.POOL_MAX_CONNECTIONS,
+            "max_keepalive_connections": self.POOL_MAX_KEEPALIVE_CONNECTIONS,
+            "keepalive_expiry": self.POOL_KEEPALIVE_EXPIRY,
+            "http2": self.POOL_HTTP2,
+            "dns_cache_ttl": self.POOL_DNS_CACHE_TTL,
+            "warmup_connections": self.POOL_WARMUP_CONNECTIONS,
+            **self.UPSTREAM_POOLS.get(service, {}),
+        }
     
     # JWT configuration
     JWT_SECRET_KEY: str = "your-secret-key"  # Should match auth service
     JWT_ALGORITHM: str = "HS256"
+
+    # Verified-token cache (entries expire at the token's exp, capped by MAX_TTL)
+    JWT_CACHE_ENABLED: bool = Field(True, env="JWT_CACHE_ENABLED")
+    JWT_CACHE_MAX_ENTRIES: int = Field(10_000, env="JWT_CACHE_MAX_ENTRIES")
+    JWT_CACHE_MAX_BYTES: int = Field(8 * 1024 * 1024, env="JWT_CACHE_MAX_BYTES")
+    JWT_CACHE_MAX_TTL: float = Field(300.0, env="JWT_CACHE_MAX_TTL")
     
     class Config:
         env_file = ".env"
         case_sensitive = True
 
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
+
+if settings.METRICS_MULTIPROCESS_DIR is None and settings.SERVER_WORKERS > 1:
+    settings.METRICS_MULTIPROCESS_DIR = os.path.join(tempfile.gettempdir(), "asyncflow-gateway-metrics")
+if settings.METRICS_MULTIPROCESS_DIR:
+    # prometheus_client decides where metric values live when it is first imported
+    os.makedirs(settings.METRICS_MULTIPROCESS_DIR, exist_ok=True)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = settings.METRICS_MULTIPROCESS_DIR
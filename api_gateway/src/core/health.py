@@ -0,0 +1,127 @@
+"""Cached, concurrently refreshed upstream health."""
+import asyncio
+import datetime
+import random
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+import httpx
+import structlog
+
+from core.config import settings
+from core.pools import UpstreamPools
+
+logger = structlog.get_logger()
+
+
+class HealthAggregator:
+    """
+    Keeps a snapshot of upstream health that /health can serve without I/O.
+
+    All services are probed concurrently on their pooled clients, each probe
+    with its own deadline, so one dead service costs at most one timeout per
+    refresh instead of adding up. A background task refreshes the snapshot
+    every HEALTH_REFRESH_INTERVAL; if it falls behind (or was never started),
+    a stale read triggers a single shared refresh.
+    """
+
+    def __init__(
+        self,
+        routes: Dict[str, Dict[str, Any]],
+        pools: UpstreamPools,
+        probe_timeout: float = settings.HEALTH_PROBE_TIMEOUT,
+        ttl: float = settings.HEALTH_CACHE_TTL,
+        refresh_interval: float = settings.HEALTH_REFRESH_INTERVAL,
+        history_size: int = settings.HEALTH_HISTORY_SIZE,
+    ):
+        self._routes = routes
+        self._pools = pools
+        self._probe_timeout = probe_timeout
+        self._ttl = ttl
+        self._refresh_interval = refresh_interval
+        self._history: Dict[str, Deque[Optional[int]]] = {
+            name: deque(maxlen=history_size) for name in routes
+        }
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._taken_at = 0.0
+        self._refreshing: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _probe(self, service: str) -> Dict[str, Any]:
+        # One replica in rotation per refresh, over the connections proxied requests use
+        url, headers = random.choice(self._pools.targets(service, "/health"))
+        started = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(
+                self._pools.client(service).get(url, headers=headers, timeout=self._probe_timeout),
+                timeout=self._probe_timeout,
+            )
+        except (httpx.HTTPError, asyncio.TimeoutError, OSError) as e:
+            self._history[service].append(None)
+            return {"status": "down", "error": str(e) or type(e).__name__}
+
+        latency_ms = int((time.perf_counter() - started) * 1000)
+        self._history[service].append(latency_ms)
+        return {
+            "status": "up" if response.status_code == 200 else "degraded",
+            "latency_ms": latency_ms,
+        }
+
+    async def refresh(self) -> Dict[str, Any]:
+        """Probe every service concurrently and replace the snapshot."""
+        names = list(self._routes)
+        results = await asyncio.gather(
+            *(self._probe(name) for name in names)
+        )
+
+        services: Dict[str, Any] = {}
+        for name, result in zip(names, results):
+            result["history_ms"] = list(self._history[name])
+            services[name] = result
+
+        statuses = [svc["status"] for svc in services.values()]
+        if all(s == "up" for s in statuses):
+            overall = "healthy"
+        elif statuses and all(s == "down" for s in statuses):
+            overall = "unhealthy"
+        else:
+            overall = "degraded"
+
+        self._snapshot = {
+            "status": overall,
+            "checked_at": datetime.datetime.utcnow().isoformat(),
+            "services": services,
+        }
+        self._taken_at = time.monotonic()
+        return self._snapshot
+
+    async def snapshot(self) -> Dict[str, Any]:
+        """Latest snapshot; refreshes (once, shared by all callers) if older than the TTL."""
+        if self._snapshot is not None and time.monotonic() - self._taken_at < self._ttl:
+            return self._snapshot
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.create_task(self.refresh())
+        return await asyncio.shield(self._refreshing)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:  # keep the refresher alive whatever happens
+                logger.error("health_refresh_failed", error=str(e), error_type=type(e).__name__)
+            await asyncio.sleep(self._refresh_interval)
+
+    def start(self) -> None:
+        """Start the background refresher."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,164 @@
+"""Hedged upstream requests for idempotent reads."""
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Iterable, Optional
+
+import httpx
+
+from core.config import settings
+from core.resilience import RetryBudget
+
+# Hedges are only sent for reads with no body, so sending one twice is always safe
+HEDGEABLE_METHODS = frozenset({"GET", "HEAD"})
+
+# Recompute the percentile every N samples instead of sorting on every request
+PERCENTILE_REFRESH_EVERY = 16
+
+
+class Hedger:
+    """
+    Sends a second copy of a slow read and takes whichever answers first.
+
+    The hedge delay is the route's recent p95 time-to-headers (never below
+    `min_delay`), so only the slowest ~5% of requests are duplicated. Hedges
+    draw from a token budget that earns `max_ratio` tokens per request, which
+    caps the extra load at that fraction of traffic even when the whole
+    upstream slows down. A 5xx or an error doesn't win while the other
+    attempt is still running. The losing attempt is cancelled, or closed if
+    it had already produced a response.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 0.95,
+        min_delay: float = 0.01,
+        min_samples: int = 20,
+        window: int = 200,
+        max_ratio: float = 0.05,
+        clock: Callable[[], float] = time.perf_counter,
+    ):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._since_refresh = 0
+        self._delay: Optional[float] = None
+        self._budget = RetryBudget(ratio=max_ratio, min_per_second=0.0, max_balance=1.0)
+        self._clock = clock
+        self.requests = 0
+        self.fired = 0
+        self.won = 0
+        self.denied = 0
+
+    def record(self, latency: float) -> None:
+        self._samples.append(latency)
+        self._since_refresh += 1
+        if self._delay is None or self._since_refresh >= PERCENTILE_REFRESH_EVERY:
+            self._refresh_delay()
+
+    def _refresh_delay(self) -> None:
+        self._since_refresh = 0
+        if len(self._samples) < self.min_samples:
+            self._delay = None
+            return
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, math.ceil(self.percentile * len(ordered)) - 1)
+        self._delay = max(self.min_delay, ordered[index])
+
+    def delay(self) -> Optional[float]:
+        """Current hedge delay, or None until enough latencies have been seen."""
+        return self._delay
+
+    async def send(self, attempt: Callable[[int], Awaitable[httpx.Response]]) -> httpx.Response:
+        """
+        Run `attempt(0)` and, if it is slower than the hedge delay, `attempt(1)`.
+
+        `attempt` receives the attempt index so callers can route the hedge to
+        a different replica. Returns the first non-5xx response; if there is
+        none, a 5xx response if any attempt produced one, else the last error
+        is raised.
+        """
+        self.requests += 1
+        self._budget.deposit()
+        started = self._clock()
+        primary = asyncio.ensure_future(attempt(0))
+        tasks = {primary}
+        try:
+            delay = self._delay
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    if self._budget.try_withdraw():
+                        self.fired += 1
+                        tasks.add(asyncio.ensure_future(attempt(1)))
+                    else:
+                        self.denied += 1
+
+            error: Optional[BaseException] = None
+            fallback: Optional[httpx.Response] = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    response = task.result()
+                    if response.status_code >= 500:
+                        # A fast error must not cancel an attempt that may still succeed
+                        if fallback is None:
+                            fallback = response
+                        else:
+                            await response.aclose()
+                        continue
+                    if task is not primary:
+                        self.won += 1
+                    self.record(self._clock() - started)
+                    for other in done - {task}:
+                        if other.exception() is None and other.result() is not fallback:
+                            await other.result().aclose()
+                    if fallback is not None:
+                        await fallback.aclose()
+                    return response
+            if fallback is not None:
+                return fallback
+            raise error
+        finally:
+            await _cancel_losers(tasks)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "requests": self.requests,
+            "fired": self.fired,
+            "won": self.won,
+            "denied": self.denied,
+        }
+
+
+async def _cancel_losers(tasks) -> None:
+    """Cancel attempts still in flight and release any response they produced anyway."""
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        try:
+            response = await task
+        except (asyncio.CancelledError, Exception):
+            continue
+        await response.aclose()
+
+
+def build_hedgers(services: Iterable[str]) -> Dict[str, Hedger]:
+    return {
+        name: Hedger(
+            percentile=settings.HEDGING_PERCENTILE,
+            min_delay=settings.HEDGING_MIN_DELAY,
+            min_samples=settings.HEDGING_MIN_SAMPLES,
+            window=settings.HEDGING_WINDOW_SIZE,
+            max_ratio=settings.HEDGING_MAX_RATIO,
+        )
+        for name in services
+    }
+
+
+hedgers = build_hedgers(settings.SERVICE_ROUTES)
@@ -0,0 +1,175 @@
+"""Non-blocking, batched log output with sampling."""
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import weakref
+import zlib
+from typing import Any, Callable, Dict, List, Optional, TextIO
+
+import structlog
+
+from core.config import settings
+
+# Levels (structlog method names) that are never sampled out
+ALWAYS_KEEP_METHODS = frozenset({"warning", "warn", "error", "exception", "critical", "fatal"})
+
+_STOP = object()
+
+
+def render_json(event_dict: Dict[str, Any]) -> str:
+    return json.dumps(event_dict, default=str)
+
+
+class LogSink:
+    """
+    Bounded queue of log records drained by a background thread.
+
+    Producers only pay for a `put_nowait`; rendering and writing happen on the
+    writer thread, which takes whatever has queued up (up to `batch_size`)
+    and writes it with a single write + flush. When the queue is full the
+    record is dropped and counted rather than blocking the event loop.
+    """
+
+    def __init__(
+        self,
+        render: Callable[[Any], str] = render_json,
+        max_queue: int = 10_000,
+        batch_size: int = 512,
+        stream: Optional[TextIO] = None,
+    ):
+        self._render = render
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self._stream = stream
+        self._thread: Optional[threading.Thread] = None
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        ref = weakref.ref(self)
+        os.register_at_fork(after_in_child=lambda: (sink := ref()) and sink._after_fork())
+
+    def _after_fork(self) -> None:
+        """
+        The writer thread doesn't survive fork (pre-forked workers), and the
+        queue's lock may have been held by it: start over with a fresh queue.
+        """
+        running = self._thread is not None
+        self._queue = queue.Queue(maxsize=self._queue.maxsize)
+        self._thread = None
+        self.written = self.dropped = self.errors = 0
+        if running:
+            self.start()
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+            self._thread.start()
+
+    def put(self, record: Any) -> bool:
+        """Queue a record; returns False (and counts it) if the queue is full."""
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = _STOP in batch
+            self._write([record for record in batch if record is not _STOP])
+            if stop:
+                return
+
+    def _write(self, batch: List[Any]) -> None:
+        lines = []
+        for record in batch:
+            try:
+                lines.append(self._render(record))
+            except Exception:
+                self.errors += 1
+        if not lines:
+            return
+        # Resolve the stream per batch so redirected stdout (tests, reloaders) is honoured
+        stream = self._stream or sys.stdout
+        try:
+            stream.write("\n".join(lines) + "\n")
+            stream.flush()
+            self.written += len(lines)
+        except Exception:
+            self.errors += len(lines)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Flush everything queued so far and stop the writer thread."""
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        # Blocking put: the stop marker must not be dropped
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "written": self.written,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "queued": self.depth(),
+        }
+
+    def processor(self, _logger: Any, _method_name: str, event_dict: Dict[str, Any]) -> Dict[str, Any]:
+        """Final structlog processor: hand the event to the writer thread."""
+        self.put(event_dict)
+        raise structlog.DropEvent
+
+
+class LogSampler:
+    """
+    structlog processor that keeps a configured fraction of each event.
+
+    Warnings and errors, events with a 5xx `status_code` and events whose
+    `duration_ms` is at least `slow_ms` are always kept. Events carrying a
+    `request_id` are sampled by a hash of it, so all lines of a kept request
+    are kept together.
+    """
+
+    def __init__(self, rates: Dict[str, float], slow_ms: float):
+        self.rates = rates
+        self.slow_ms = slow_ms
+        self.sampled_out = 0
+
+    def keep(self, event: str, method_name: str, event_dict: Dict[str, Any]) -> bool:
+        rate = self.rates.get(event, 1.0)
+        if rate >= 1.0 or method_name in ALWAYS_KEEP_METHODS:
+            return True
+        status_code = event_dict.get("status_code")
+        if isinstance(status_code, int) and status_code >= 500:
+            return True
+        duration_ms = event_dict.get("duration_ms")
+        if isinstance(duration_ms, (int, float)) and duration_ms >= self.slow_ms:
+            return True
+        request_id = event_dict.get("request_id")
+        if request_id is not None:
+            return zlib.crc32(str(request_id).encode()) % 10_000 < rate * 10_000
+        return random.random() < rate
+
+    def __call__(self, _logger: Any, method_name: str, event_dict: Dict[str, Any]) -> Dict[str, Any]:
+        if self.keep(str(event_dict.get("event")), method_name, event_dict):
+            return event_dict
+        self.sampled_out += 1
+        raise structlog.DropEvent
+
+
+log_sink = LogSink(max_queue=settings.LOG_QUEUE_SIZE, batch_size=settings.LOG_BATCH_SIZE)
+log_sampler = LogSampler(settings.LOG_SAMPLE_RATES, slow_ms=settings.LOG_SLOW_REQUEST_MS)
@@ -0,0 +1,189 @@
+"""Prometheus exposition shared by pre-forked gateway workers."""
+import asyncio
+import glob
+import json
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import structlog
+from prometheus_client import multiprocess
+from prometheus_client.metrics_core import Metric
+from prometheus_client.mmap_dict import MmapedDict
+from prometheus_client.registry import Collector
+
+logger = structlog.get_logger()
+
+SNAPSHOT_PREFIX = "collectors_"
+
+
+def reset_directory(directory: str) -> None:
+    """Remove metric files left by an earlier run; the launcher calls this before forking."""
+    for path in glob.glob(os.path.join(directory, "*.db")) + glob.glob(
+        os.path.join(directory, f"{SNAPSHOT_PREFIX}*.json")
+    ):
+        os.remove(path)
+
+
+def archive_worker(directory: str, pid: int) -> None:
+    """
+    Clean up after a dead worker.
+
+    Its counters and histograms are added into per-type `*_archive.db` files,
+    so the totals never go backwards, and its own files are removed so the
+    directory doesn't grow with every worker ever started. Its gauges and
+    collector snapshot describe a process that no longer exists and are
+    dropped.
+    """
+    multiprocess.mark_process_dead(pid, directory)
+    for path in glob.glob(os.path.join(directory, f"*_{pid}.db")):
+        kind = os.path.basename(path).split("_", 1)[0]
+        if kind != "gauge":
+            archive = MmapedDict(os.path.join(directory, f"{kind}_archive.db"))
+            try:
+                for key, value, timestamp, _ in MmapedDict.read_all_values_from_file(path):
+                    total, _ = archive.read_value(key)
+                    archive.write_value(key, total + value, timestamp)
+            finally:
+                archive.close()
+        os.remove(path)
+    snapshot = os.path.join(directory, f"{SNAPSHOT_PREFIX}{pid}.json")
+    if os.path.exists(snapshot):
+        os.remove(snapshot)
+
+
+class MultiProcessCollector(multiprocess.MultiProcessCollector):
+    """Aggregates every worker's mmap'd metrics; retries a read that raced with `archive_worker`."""
+
+    def collect(self) -> Iterable[Metric]:
+        for _ in range(2):
+            try:
+                return list(super().collect())
+            except FileNotFoundError:
+                continue
+        return list(super().collect())
+
+
+class WorkerCollectors:
+    """
+    Scrape-time collectors (pools, breakers, caches, ...) of every worker.
+
+    Those read in-process state that only exists in each worker, so every
+    worker writes their output, with a `pid` label, to a JSON snapshot in
+    the multiprocess directory every `interval` seconds. Whichever worker
+    answers a scrape reports its own collectors live and the others from
+    their latest snapshots.
+    """
+
+    def __init__(self, directory: str, collectors: Iterable[Collector], interval: float):
+        self._directory = directory
+        self._collectors = list(collectors)
+        self._interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def _own(self) -> List[Metric]:
+        pid = str(os.getpid())
+        families = []
+        for collector in self._collectors:
+            for family in collector.collect():
+                labelled = Metric(family.name, family.documentation, family.type, family.unit)
+                for sample in family.samples:
+                    labelled.add_sample(sample.name, {**sample.labels, "pid": pid}, sample.value)
+                families.append(labelled)
+        return families
+
+    def write(self) -> None:
+        snapshot = [
+            {
+                "name": family.name,
+                "documentation": family.documentation,
+                "type": family.type,
+                "unit": family.unit,
+                "samples": [[sample.name, sample.labels, sample.value] for sample in family.samples],
+            }
+            for family in self._own()
+        ]
+        path = os.path.join(self._directory, f"{SNAPSHOT_PREFIX}{os.getpid()}.json")
+        partial = f"{path}.tmp"
+        with open(partial, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(partial, path)
+
+    def _others(self) -> Iterator[Dict[str, Any]]:
+        own = f"{SNAPSHOT_PREFIX}{os.getpid()}.json"
+        for path in glob.glob(os.path.join(self._directory, f"{SNAPSHOT_PREFIX}*.json")):
+            if os.path.basename(path) == own:
+                continue
+            try:
+                with open(path) as f:
+                    yield from json.load(f)
+            except (OSError, ValueError):  # worker just exited, or mid-replace
+                continue
+
+    def collect(self) -> Iterable[Metric]:
+        families: Dict[str, Metric] = {family.name: family for family in self._own()}
+        for entry in self._others():
+            family = families.get(entry["name"])
+            if family is None:
+                family = families[entry["name"]] = Metric(
+                    entry["name"], entry["documentation"], entry["type"], entry["unit"]
+                )
+            for name, labels, value in entry["samples"]:
+                family.add_sample(name, labels, value)
+        return list(families.values())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                self.write()
+            except Exception as e:  # keep publishing whatever happens
+                logger.error("metrics_snapshot_failed", error=str(e), error_type=type(e).__name__)
+            await asyncio.sleep(self._interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+
+class CachedExposition:
+    """
+    Rendered exposition reused for `ttl` seconds, per format.
+
+    Aggregating and serializing every worker's metrics is the expensive part
+    of a scrape; several Prometheus servers (or a short scrape interval)
+    then cost one render per TTL instead of one per request.
+    """
+
+    def __init__(
+        self,
+        render: Callable[[bool], bytes],
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._render = render
+        self._ttl = ttl
+        self._clock = clock
+        self._cache: Dict[bool, Tuple[float, bytes]] = {}
+        self.renders = 0
+
+    def get(self, openmetrics_format: bool = False) -> bytes:
+        now = self._clock()
+        cached = self._cache.get(openmetrics_format)
+        if cached is not None and now - cached[0] < self._ttl:
+            return cached[1]
+        content = self._render(openmetrics_format)
+        self.renders += 1
+        self._cache[openmetrics_format] = (now, content)
+        return content
+
+    def clear(self) -> None:
+        self._cache.clear()
@@ -0,0 +1,221 @@
+"""Per-upstream HTTP connection pools."""
+import asyncio
+import ipaddress
+import itertools
+import socket
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import httpcore
+import httpx
+import structlog
+
+from core.balancer import LoadBalancer, balancers
+from core.config import settings
+
+logger = structlog.get_logger()
+
+
+class CachingDNSBackend(httpcore.AsyncNetworkBackend):
+    """
+    Network backend that memoises name resolution for `ttl` seconds.
+
+    httpx resolves the upstream host name on every new connection. Behind
+    docker/k8s DNS that lookup is a noticeable part of connection setup, so
+    we resolve once per TTL and connect to the cached address. A stale entry
+    is reused if the resolver fails, which keeps the gateway up during DNS
+    hiccups. Proxied requests mostly go to addresses `EndpointDiscovery`
+    already resolved; this covers endpoints it could not resolve yet.
+    """
+
+    def __init__(self, backend: httpcore.AsyncNetworkBackend, ttl: float):
+        self._backend = backend
+        self._ttl = ttl
+        self._cache: Dict[Tuple[str, int], Tuple[float, str]] = {}
+
+    async def resolve(self, host: str, port: int) -> str:
+        try:
+            ipaddress.ip_address(host)
+            return host
+        except ValueError:
+            pass
+
+        now = time.monotonic()
+        cached = self._cache.get((host, port))
+        if cached is not None and cached[0] > now:
+            return cached[1]
+
+        loop = asyncio.get_running_loop()
+        try:
+            infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except OSError:
+            if cached is not None:
+                return cached[1]
+            raise
+        address = infos[0][4][0]
+        self._cache[(host, port)] = (now + self._ttl, address)
+        return address
+
+    async def connect_tcp(
+        self,
+        host: str,
+        port: int,
+        timeout: Optional[float] = None,
+        local_address: Optional[str] = None,
+        socket_options: Optional[Iterable[Any]] = None,
+    ) -> httpcore.AsyncNetworkStream:
+        address = await self.resolve(host, port)
+        return await self._backend.connect_tcp(
+            address, port, timeout=timeout, local_address=local_address,
+            socket_options=socket_options,
+        )
+
+    async def connect_unix_socket(
+        self,
+        path: str,
+        timeout: Optional[float] = None,
+        socket_options: Optional[Iterable[Any]] = None,
+    ) -> httpcore.AsyncNetworkStream:
+        return await self._backend.connect_unix_socket(
+            path, timeout=timeout, socket_options=socket_options
+        )
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def build_transport(service: str, pool: Dict[str, Any]) -> httpx.AsyncHTTPTransport:
+    """Create the transport for one upstream from its pool configuration."""
+    http2 = bool(pool.get("http2"))
+    if http2 and not _http2_available():
+        logger.warning("http2_unavailable", service=service, hint="pip install 'httpx[http2]'")
+        http2 = False
+
+    transport = httpx.AsyncHTTPTransport(
+        limits=httpx.Limits(
+            max_connections=pool["max_connections"],
+            max_keepalive_connections=pool["max_keepalive_connections"],
+            keepalive_expiry=pool["keepalive_expiry"],
+        ),
+        # Upstreams are plain http inside the cluster: HTTP/2 there means h2c
+        # with prior knowledge, so HTTP/1.1 has to be switched off explicitly.
+        http1=not http2,
+        http2=http2,
+    )
+
+    ttl = pool.get("dns_cache_ttl") or 0
+    core_pool = getattr(transport, "_pool", None)
+    if ttl > 0 and core_pool is not None and hasattr(core_pool, "_network_backend"):
+        # httpx does not expose the network backend; wrap the one it created.
+        core_pool._network_backend = CachingDNSBackend(core_pool._network_backend, ttl)
+    return transport
+
+
+class UpstreamPools:
+    """
+    Registry of pooled HTTP clients, one per upstream service.
+
+    Isolating pools per service means a slow upstream can only exhaust its own
+    connections instead of starving every other route. Warm-up and health
+    probes go to the replicas in `balancers`, the way proxied requests do,
+    since connections are pooled per address.
+    """
+
+    def __init__(
+        self,
+        routes: Dict[str, Dict[str, Any]],
+        timeout: float = settings.DEFAULT_TIMEOUT,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        balancers: Dict[str, LoadBalancer] = balancers,
+    ):
+        self._routes = routes
+        self._timeout = timeout
+        # Shared transport override (tests, benchmarks); pool settings are ignored then
+        self._transport = transport
+        self._balancers = balancers
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    def _create_client(self, service: str) -> httpx.AsyncClient:
+        route = self._routes[service]
+        transport = self._transport or build_transport(service, route["pool"])
+        return httpx.AsyncClient(transport=transport, timeout=self._timeout)
+
+    def client(self, service: str) -> httpx.AsyncClient:
+        """Pooled client for `service` (created on first use)."""
+        client = self._clients.get(service)
+        if client is None:
+            client = self._clients[service] = self._create_client(service)
+        return client
+
+    def targets(self, service: str, path: str) -> List[Tuple[str, List[Tuple[str, str]]]]:
+        """URL and headers reaching `path` on each of the service's replicas in rotation."""
+        url = f"{self._routes[service]['host']}{path}"
+        balancer = self._balancers.get(service)
+        if balancer is None:
+            return [(url, [])]
+        return [balancer.target(endpoint, url) for endpoint in balancer.available()]
+
+    async def start(self, warm_up: bool = True) -> None:
+        """Create every pool and optionally open warm connections."""
+        for service in self._routes:
+            self.client(service)
+        if warm_up:
+            await self.warm_up()
+
+    async def warm_up(self) -> None:
+        """
+        Pre-open keep-alive connections so the first requests after a deploy
+        don't pay for TCP setup. Failures are logged and ignored: upstreams
+        may legitimately still be starting.
+        """
+        probes = []
+        for service, route in self._routes.items():
+            count = min(route["pool"].get("warmup_connections", 0),
+                        route["pool"]["max_keepalive_connections"])
+            # Spread over the replicas, which each get their own connections
+            targets = itertools.cycle(self.targets(service, "/health"))
+            probes.extend(self._warm_one(service, *next(targets)) for _ in range(count))
+        if not probes:
+            return
+        results = await asyncio.gather(*probes)
+        logger.info("upstream_pools_warmed", opened=sum(results), attempted=len(results))
+
+    async def _warm_one(self, service: str, url: str, headers: List[Tuple[str, str]]) -> bool:
+        try:
+            response = await self.client(service).get(
+                url, headers=headers, timeout=settings.POOL_WARMUP_TIMEOUT
+            )
+            await response.aclose()
+            return True
+        except httpx.HTTPError as e:
+            logger.warning("upstream_warmup_failed", service=service, error=str(e))
+            return False
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Connection usage per service, for the /metrics gauges."""
+        result: Dict[str, Dict[str, int]] = {}
+        for service, client in self._clients.items():
+            core_pool = getattr(client._transport, "_pool", None)
+            connections = list(getattr(core_pool, "connections", []))
+            idle = sum(1 for conn in connections if conn.is_idle())
+            result[service] = {
+                "active": len(connections) - idle,
+                "idle": idle,
+                "max": self._routes[service]["pool"]["max_connections"],
+            }
+        return result
+
+    async def aclose(self) -> None:
+        clients, self._clients = self._clients, {}
+        await asyncio.gather(*(client.aclose() for client in clients.values()))
+
+
+upstream_pools = UpstreamPools(settings.SERVICE_ROUTES)
@@ -0,0 +1,201 @@
+"""Circuit breakers and retry budgets for upstream calls."""
+import random
+import time
+from collections import Counter
+from enum import Enum
+from typing import Any, Callable, Dict, Iterable, Mapping, Optional
+
+from core.config import settings
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+# Upstream answers that mean "the service is struggling", not "your request is wrong"
+FAILURE_STATUS_CODES = frozenset({502, 503, 504})
+
+
+def is_idempotent(method: str, headers: Mapping[str, str]) -> bool:
+    """Whether a request may safely be sent more than once."""
+    return method.upper() in IDEMPOTENT_METHODS or "idempotency-key" in headers
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with full jitter for the given (1-based) failed attempt."""
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    CLOSED lets everything through and opens after `failure_threshold`
+    failures in a row. OPEN rejects immediately until `recovery_timeout` has
+    passed, then HALF_OPEN admits up to `half_open_max_calls` probes: one
+    success closes the circuit, one failure opens it again. Probes that never
+    report back (e.g. cancelled) are forgotten after another recovery period.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 10.0,
+        half_open_max_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self.state = CircuitState.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._half_open_calls = 0
+        self._half_open_since = 0.0
+
+    def allow_request(self) -> bool:
+        if self.state is CircuitState.CLOSED:
+            return True
+
+        now = self._clock()
+        if self.state is CircuitState.OPEN:
+            if now - self.opened_at < self.recovery_timeout:
+                return False
+            self.state = CircuitState.HALF_OPEN
+            self._half_open_calls = 0
+            self._half_open_since = now
+        elif now - self._half_open_since >= self.recovery_timeout:
+            self._half_open_calls = 0
+            self._half_open_since = now
+
+        if self._half_open_calls >= self.half_open_max_calls:
+            return False
+        self._half_open_calls += 1
+        return True
+
+    def retry_after(self) -> float:
+        """Seconds until the circuit will admit a probe."""
+        return max(0.0, self.opened_at + self.recovery_timeout - self._clock())
+
+    def record_success(self) -> None:
+        self.failures = 0
+        if self.state is not CircuitState.CLOSED:
+            self.state = CircuitState.CLOSED
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state is CircuitState.HALF_OPEN or (
+            self.state is CircuitState.CLOSED and self.failures >= self.failure_threshold
+        ):
+            self.state = CircuitState.OPEN
+            self.opened_at = self._clock()
+            self.times_opened += 1
+
+
+class RetryBudget:
+    """
+    Caps retries at a fraction of live traffic.
+
+    Every original request deposits `ratio` tokens and every retry withdraws a
+    whole one, so retries can never exceed `ratio` x requests (plus a small
+    time-based allowance of `min_per_second` so low-traffic services can still
+    retry). The balance is capped so a quiet period can't bank an unbounded
+    burst of retries for the next brownout.
+    """
+
+    def __init__(
+        self,
+        ratio: float = 0.2,
+        min_per_second: float = 1.0,
+        max_balance: float = 10.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_balance = max_balance
+        self._clock = clock
+        self._balance = max_balance
+        self._updated = clock()
+
+    def _refill(self, amount: float) -> None:
+        now = self._clock()
+        self._balance = min(
+            self.max_balance,
+            self._balance + amount + (now - self._updated) * self.min_per_second,
+        )
+        self._updated = now
+
+    def deposit(self) -> None:
+        """Account for one original (non-retry) request."""
+        self._refill(self.ratio)
+
+    def try_withdraw(self) -> bool:
+        """Take one retry from the budget if available."""
+        self._refill(0.0)
+        if self._balance < 1.0:
+            return False
+        self._balance -= 1.0
+        return True
+
+
+class ServiceGuard:
+    """Breaker, retry budget and retry accounting for one upstream service."""
+
+    def __init__(self, breaker: CircuitBreaker, budget: RetryBudget, max_attempts: int):
+        self.breaker = breaker
+        self.budget = budget
+        self.max_attempts = max_attempts
+        self.retries = 0
+        self.retries_denied: Counter = Counter()
+        self.rejected = 0
+
+    def retry_denied_reason(self, attempt: int, idempotent: bool, replayable: bool) -> Optional[str]:
+        """None if another attempt may be made, otherwise why not (for metrics)."""
+        if attempt >= self.max_attempts:
+            reason = "max_attempts"
+        elif not idempotent:
+            reason = "not_idempotent"
+        elif not replayable:
+            reason = "body_consumed"
+        elif not self.budget.try_withdraw():
+            reason = "budget_exhausted"
+        else:
+            self.retries += 1
+            return None
+        self.retries_denied[reason] += 1
+        return reason
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.breaker.state.value,
+            "times_opened": self.breaker.times_opened,
+            "rejected": self.rejected,
+            "retries": self.retries,
+            "retries_denied": dict(self.retries_denied),
+        }
+
+
+def build_guards(services: Iterable[str]) -> Dict[str, ServiceGuard]:
+    return {
+        name: ServiceGuard(
+            breaker=CircuitBreaker(
+                failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD,
+                recovery_timeout=settings.CIRCUIT_RECOVERY_TIMEOUT,
+                half_open_max_calls=settings.CIRCUIT_HALF_OPEN_MAX_CALLS,
+            ),
+            budget=RetryBudget(
+                ratio=settings.RETRY_BUDGET_RATIO,
+                min_per_second=settings.RETRY_BUDGET_MIN_PER_SECOND,
+            ),
+            max_attempts=settings.RETRY_MAX_ATTEMPTS,
+        )
+        for name in services
+    }
+
+
+service_guards = build_guards(settings.SERVICE_ROUTES)
@@ -0,0 +1,104 @@
+"""Precompiled gateway routing table."""
+import re
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, Mapping, NamedTuple, Optional
+
+from core.config import Settings, settings
+
+# Path segments that identify a resource rather than a route: numbers, UUIDs,
+# long hex digests and long opaque tokens
+ID_SEGMENT = re.compile(
+    r"^(\d+|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}"
+    r"|[0-9a-fA-F]{16,}|[A-Za-z0-9_\-]{32,})$"
+)
+
+
+def route_template(forward_path: str) -> str:
+    """Collapse identifier segments of an upstream path, e.g. `/orders/42` -> `/orders/{id}`."""
+    return "/".join(
+        "{id}" if ID_SEGMENT.match(segment) else segment
+        for segment in forward_path.split("/")
+    )
+
+
+class ServiceEntry(NamedTuple):
+    host: str
+    public_paths: FrozenSet[str]
+
+
+class RouteMatch(NamedTuple):
+    """Result of resolving a gateway path."""
+    version: Optional[str]  # None for bare /{service}/... paths
+    service: str
+    host: str
+    forward_path: str
+    is_public: bool
+
+
+class RouteTable:
+    """
+    Immutable routing table compiled once from `Settings.SERVICE_ROUTES`.
+
+    Resolves version, service, forwarding path and public/private status with a
+    single strip + partition of the request path and a couple of dict/frozenset
+    lookups, instead of rebuilding the routes dict and re-splitting the path on
+    every check.
+    """
+
+    __slots__ = ("_api_prefix", "_version", "_services", "_public_paths")
+
+    def __init__(self, routes: Dict[str, Dict[str, Any]], api_version: str):
+        self._version = api_version
+        self._api_prefix = f"api/{api_version}/"
+        self._services: Mapping[str, ServiceEntry] = MappingProxyType({
+            name: ServiceEntry(config["host"], frozenset(config["public_paths"]))
+            for name, config in routes.items()
+        })
+        # Gateway-local endpoints that never require authentication
+        self._public_paths: FrozenSet[str] = frozenset({
+            "health",
+            "docs",
+            "redoc",
+            "openapi.json",
+            f"api/{api_version}/health",
+            f"api/{api_version}/docs",
+            f"api/{api_version}/redoc",
+            f"api/{api_version}/openapi.json",
+        })
+
+    @classmethod
+    def from_settings(cls, config: Settings) -> "RouteTable":
+        return cls(config.SERVICE_ROUTES, config.API_VERSION)
+
+    @property
+    def services(self) -> Mapping[str, ServiceEntry]:
+        return self._services
+
+    def resolve(self, path: str) -> Optional[RouteMatch]:
+        """Map `/api/{version}/{service}/...` or `/{service}/...` to its upstream route."""
+        normalized = path.strip("/")
+        version: Optional[str] = None
+        if normalized.startswith(self._api_prefix):
+            normalized = normalized[len(self._api_prefix):]
+            version = self._version
+
+        service, _, remaining = normalized.partition("/")
+        entry = self._services.get(service)
+        if entry is None:
+            return None
+        forward_path = "/" + remaining
+        return RouteMatch(version, service, entry.host, forward_path,
+                          forward_path in entry.public_paths)
+
+    def is_public(self, path: str, method: str) -> bool:
+        """Whether a request may bypass authentication."""
+        # Allow CORS preflight
+        if method.upper() == "OPTIONS":
+            return True
+        if path.strip("/") in self._public_paths:
+            return True
+        match = self.resolve(path)
+        return match is not None and match.is_public
+
+
+route_table = RouteTable.from_settings(settings)
@@ -1,20 +1,128 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
 from fastapi import HTTPException, status
 from jose import JWTError, jwt
 from core.config import settings
 
+# Rough per-entry bookkeeping cost (digest, tuple, OrderedDict node) on top of the token size
+ENTRY_OVERHEAD_BYTES = 256
+
+
+class TokenCache:
+    """
+    Bounded LRU of verified JWT payloads.
+
+    Keyed by the SHA-256 digest of the token, so raw bearer tokens are never
+    kept in memory. An entry expires at the token's own `exp` (capped by
+    `max_ttl`), and the cache is bounded both by entry count and by an
+    estimated byte budget; whichever limit is hit first evicts the least
+    recently used entries.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        max_ttl: float,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_ttl = max_ttl
+        self._clock = clock
+        self._entries: "OrderedDict[bytes, Tuple[float, dict, int]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, payload, _ = entry
+        if expires_at <= self._clock():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return dict(payload)
+
+    def put(self, token: str, payload: dict) -> None:
+        expires_at = self._clock() + self.max_ttl
+        exp = payload.get("exp")
+        if isinstance(exp, (int, float)):
+            expires_at = min(expires_at, float(exp))
+
+        key = self._key(token)
+        size = len(token) + ENTRY_OVERHEAD_BYTES
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (expires_at, dict(payload), size)
+        self.bytes += size
+
+        while self._entries and (
+            len(self._entries) > self.max_entries or self.bytes > self.max_bytes
+        ):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: bytes) -> None:
+        _, _, size = self._entries.pop(key)
+        self.bytes -= size
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+        }
+
+
+token_cache = TokenCache(
+    max_entries=settings.JWT_CACHE_MAX_ENTRIES,
+    max_bytes=settings.JWT_CACHE_MAX_BYTES,
+    max_ttl=settings.JWT_CACHE_MAX_TTL,
+)
+
 
 async def verify_token(token: str) -> dict:
     """Verify JWT token and return payload."""
+    if settings.JWT_CACHE_ENABLED:
+        cached = token_cache.get(token)
+        if cached is not None:
+            return cached
+
     try:
         payload = jwt.decode(
             token,
             settings.JWT_SECRET_KEY,
             algorithms=[settings.JWT_ALGORITHM]
         )
-        return payload
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials",
             headers={"WWW-Authenticate": "Bearer"},
-        )
\ No newline at end of file
+        )
+
+    if settings.JWT_CACHE_ENABLED:
+        token_cache.put(token, payload)
+    return payload
@@ -1,102 +1,745 @@
-from typing import Optional, Any
+from typing import (
+    Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple, Union,
+)
 import asyncio
+import functools
+import math
+import time
+import anyio
 import httpx
 from fastapi import Request, HTTPException, status
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
+from starlette.types import Receive, Scope, Send
 
+from core.admission import Bulkhead, Overloaded, bulkheads, fairness_key, request_priority
+from core.balancer import Endpoint, LoadBalancer, balancers
+from core.cache import (
+    CacheKey,
+    CachedResponse,
+    cache_key,
+    etag_matches,
+    freshness_lifetime,
+    parse_cache_control,
+    response_cache,
+)
+from core.compression import choose_encoding, compress
 from core.config import settings
+from core.hedging import HEDGEABLE_METHODS, Hedger, hedgers
+from core.pools import UpstreamPools
+from core.resilience import FAILURE_STATUS_CODES, backoff_delay, is_idempotent, service_guards
+from core.routing import route_table, route_template
+from core.timeouts import RouteLatency, adaptive_timeouts
+from core.timing import RequestPhases, request_phases
+from core.tracing import tracer
+
+# Headers that describe a single hop and must not be forwarded by a proxy (RFC 9110 §7.6.1)
+HOP_BY_HOP_HEADERS = frozenset({
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "proxy-connection",
+    "te",
+    "trailer",
+    "trailers",
+    "transfer-encoding",
+    "upgrade",
+})
+
+# Replaced by the gateway's own request id and a per-attempt traceparent
+TRACE_HEADERS = frozenset({"x-request-id", "traceparent"})
+
+# Requests that never invalidate cached responses (RFC 9110 §9.2.1)
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "TRACE"})
+
+
+def is_push_request(request: Request) -> bool:
+    """Long polls (`?wait_for_change=`) and SSE streams, which the upstream may hold open."""
+    return (
+        "wait_for_change" in request.query_params
+        or "text/event-stream" in request.headers.get("accept", "")
+    )
+
+
+def upstream_timeout(request: Request) -> Union[float, httpx.Timeout]:
+    """Push requests may wait up to LONG_POLLING_TIMEOUT for the upstream's next byte."""
+    if is_push_request(request):
+        return httpx.Timeout(settings.DEFAULT_TIMEOUT, read=settings.LONG_POLLING_TIMEOUT)
+    return settings.DEFAULT_TIMEOUT
+
+
+class BodyTooLarge(Exception):
+    """Raised when a proxied body exceeds the configured size limit."""
+
+
+class RequestBody:
+    """
+    Client request body as seen by the upstream call.
+
+    Small bodies (and requests without a body) are buffered up front and can be
+    replayed on every retry. Larger or chunked bodies are piped straight from the
+    client to the upstream; once the first chunk has been handed to httpx the
+    body is gone and the request can no longer be retried.
+    """
+
+    def __init__(self, request: Request, max_bytes: int, replayable_bytes: int):
+        self._request = request
+        self._max_bytes = max_bytes
+        self._replayable_bytes = replayable_bytes
+        self._buffered: Optional[bytes] = None
+        self._consumed = False
+
+    async def prepare(self) -> None:
+        """Decide between buffering and streaming based on the request headers."""
+        headers = self._request.headers
+        content_length = headers.get("content-length")
+
+        if content_length is None and "transfer-encoding" not in headers:
+            # No body at all (typical GET/DELETE)
+            self._buffered = b""
+            return
+
+        if content_length is not None:
+            try:
+                length = int(content_length)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid Content-Length header")
+            if self._max_bytes and length > self._max_bytes:
+                raise BodyTooLarge(f"Request body of {length} bytes exceeds limit")
+            if length <= self._replayable_bytes:
+                self._buffered = await self._request.body()
+
+    @property
+    def buffered(self) -> bool:
+        """Whether the whole body is in memory and can be sent any number of times."""
+        return self._buffered is not None
+
+    @property
+    def empty(self) -> bool:
+        """Whether the request has no body at all."""
+        return self._buffered == b""
+
+    @property
+    def replayable(self) -> bool:
+        """Whether the body can still be sent (again) to an upstream."""
+        return self._buffered is not None or not self._consumed
+
+    def content(self) -> Union[bytes, AsyncIterator[bytes]]:
+        """Body to hand to httpx for a single attempt."""
+        if self._buffered is not None:
+            return self._buffered
+        return self._stream()
+
+    async def _stream(self) -> AsyncIterator[bytes]:
+        received = 0
+        async for chunk in self._request.stream():
+            if not chunk:
+                continue
+            self._consumed = True
+            received += len(chunk)
+            if self._max_bytes and received > self._max_bytes:
+                raise BodyTooLarge(f"Request body exceeds {self._max_bytes} bytes")
+            yield chunk
+
+
+class UpstreamStreamingResponse(StreamingResponse):
+    """Streams an upstream httpx response and always releases its connection."""
+
+    def __init__(
+        self,
+        upstream: httpx.Response,
+        raw_headers: List[Tuple[bytes, bytes]],
+        content: Optional[AsyncIterator[bytes]] = None,
+    ):
+        super().__init__(
+            content=content if content is not None else iter_upstream_body(upstream),
+            status_code=upstream.status_code,
+        )
+        self.raw_headers = raw_headers
+        self.upstream = upstream
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # Client may have gone away mid-stream: the surrounding cancel scope is
+            # already cancelled, so shield the close or the connection leaks.
+            with anyio.CancelScope(shield=True):
+                await self.upstream.aclose()
+
+
+async def iter_upstream_body(
+    upstream: httpx.Response, phases: Optional[RequestPhases] = None
+) -> AsyncIterator[bytes]:
+    """Yield raw (still encoded) upstream chunks, enforcing the response size limit."""
+    limit = settings.PROXY_MAX_RESPONSE_BODY_BYTES
+    received = 0
+    started = time.perf_counter()
+    try:
+        async for chunk in upstream.aiter_raw(settings.PROXY_STREAM_CHUNK_SIZE):
+            received += len(chunk)
+            if limit and received > limit:
+                # Headers are already sent; aborting the stream is all that is left.
+                raise BodyTooLarge(f"Upstream response exceeds {limit} bytes")
+            yield chunk
+    finally:
+        if phases is not None:
+            phases.add("stream", time.perf_counter() - started)
+
+
+def build_upstream_headers(request: Request) -> List[Tuple[str, str]]:
+    """Headers forwarded to the upstream service."""
+    headers = [
+        (name, value)
+        for name, value in request.headers.items()
+        if name != "host" and name not in HOP_BY_HOP_HEADERS and name not in TRACE_HEADERS
+    ]
+    if hasattr(request.state, "user"):
+        headers.append(("X-User", request.state.user.get("sub")))
+    request_id = getattr(request.state, "request_id", None)
+    if request_id is not None:
+        headers.append(("X-Request-ID", request_id))
+    if "accept-encoding" not in request.headers:
+        # Otherwise httpx adds its own default and the raw body may be encoded
+        # in a way the client never asked for
+        headers.append(("Accept-Encoding", "identity"))
+    return headers
+
+
+def build_response_headers(upstream: httpx.Response) -> List[Tuple[bytes, bytes]]:
+    """Raw response headers for the client, keeping repeated fields such as Set-Cookie."""
+    return [
+        (name.lower().encode("latin-1"), value.encode("latin-1"))
+        for name, value in upstream.headers.multi_items()
+        if name.lower() not in HOP_BY_HOP_HEADERS
+    ]
+
+
+async def read_upstream_body(
+    upstream: httpx.Response, phases: Optional[RequestPhases] = None
+) -> bytes:
+    """Buffer a raw upstream body (non-streaming mode)."""
+    try:
+        declared = upstream.headers.get("content-length")
+        limit = settings.PROXY_MAX_RESPONSE_BODY_BYTES
+        if limit and declared is not None and declared.isdigit() and int(declared) > limit:
+            raise BodyTooLarge(f"Upstream response of {declared} bytes exceeds limit")
+        return b"".join([chunk async for chunk in iter_upstream_body(upstream, phases)])
+    finally:
+        await upstream.aclose()
+
+
+async def tee_to_cache(
+    chunks: AsyncIterator[bytes], store: Callable[[bytes], Any], limit: int
+) -> AsyncIterator[bytes]:
+    """Pass chunks through and hand the complete body to `store` if it stayed under `limit`."""
+    parts: Optional[List[bytes]] = []
+    size = 0
+    async for chunk in chunks:
+        if parts is not None:
+            size += len(chunk)
+            if size > limit:
+                parts = None
+            else:
+                parts.append(chunk)
+        yield chunk
+    if parts is not None:
+        store(b"".join(parts))
+
+
+def cached_response(request: Request, key: CacheKey, entry: CachedResponse, outcome: str) -> Response:
+    """
+    Serve a cache entry, or a bodyless 304 if the client already has it.
+
+    Identity bodies are served in the client's preferred coding; each
+    compressed variant is made once and kept with the entry, so hits don't
+    pay for compression again.
+    """
+    extra = [
+        (b"age", str(response_cache.age(entry)).encode()),
+        (b"x-cache", outcome.encode()),
+    ]
+    if etag_matches(request.headers.get("if-none-match", ""), entry.etag):
+        response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+        response.raw_headers = [
+            (name, value) for name, value in entry.raw_headers
+            if name in (b"etag", b"cache-control", b"expires", b"vary")
+        ] + extra
+        return response
+
+    body, raw_headers = entry.body, entry.raw_headers
+    if (
+        settings.COMPRESSION_ENABLED and request.method != "HEAD"
+        and len(body) >= settings.COMPRESSION_MIN_SIZE
+        and all(name != b"content-encoding" for name, _ in raw_headers)
+    ):
+        content_type = next((value for name, value in raw_headers if name == b"content-type"), b"")
+        chosen = choose_encoding(request.headers.get("accept-encoding", ""), content_type.decode("latin-1"))
+        if chosen is not None:
+            encoding, level = chosen
+            body = entry.variants.get(encoding)
+            if body is None:
+                body = compress(entry.body, encoding, level)
+                response_cache.add_variant(key, entry, encoding, body)
+            raw_headers = raw_headers + [
+                (b"content-encoding", encoding.encode()),
+                (b"vary", b"Accept-Encoding"),
+            ]
+    response = Response(content=body, status_code=entry.status_code)
+    response.raw_headers = raw_headers + [(b"content-length", str(len(body)).encode())] + extra
+    return response
+
+
+def cacheable_headers(raw_headers: List[Tuple[bytes, bytes]]) -> List[Tuple[bytes, bytes]]:
+    """Response headers worth storing; length and age are recomputed when served."""
+    return [(name, value) for name, value in raw_headers if name not in (b"content-length", b"age")]
+
+
+def fits_in_buffer(upstream: httpx.Response, limit: int) -> bool:
+    """Whether the upstream declared a body of at most `limit` bytes."""
+    declared = upstream.headers.get("content-length")
+    return bool(limit) and declared is not None and declared.isdigit() and int(declared) <= limit
+
+
+def copy_response(response: Response) -> Response:
+    """Independent copy of a buffered response, so each waiter can send its own."""
+    copy = Response(content=response.body, status_code=response.status_code)
+    copy.raw_headers = list(response.raw_headers)
+    return copy
+
+
+class Flight:
+    """One in-flight upstream call and the requests waiting for it."""
+
+    __slots__ = ("task", "waiters", "claimed")
+
+    def __init__(self, task: "asyncio.Future[Response]"):
+        self.task = task
+        self.waiters = 0
+        self.claimed = False
+
+    def claim(self) -> bool:
+        """Take ownership of a streamed result; only one waiter can send it."""
+        if self.claimed:
+            return False
+        self.claimed = True
+        return True
+
+
+class RequestCoalescer:
+    """
+    Single-flight for identical concurrent GET/HEAD requests.
+
+    The first request for a key starts the upstream call in its own task;
+    requests arriving while it runs wait on the same task and each get a
+    copy of the buffered response, so N identical requests cost one upstream
+    call. Waiting is shielded: a client that disconnects only stops waiting,
+    and the call is cancelled once nobody is waiting for it any more.
+    Followers give up after `max_wait` and make their own call, as does
+    everyone but the first waiter when the body was too large to buffer
+    (`max_body_bytes`) and had to be streamed.
+    """
+
+    def __init__(self, max_wait: float, max_body_bytes: int):
+        self.max_wait = max_wait
+        self.max_body_bytes = max_body_bytes
+        self._flights: Dict[Hashable, Flight] = {}
+        # Strong references to pending stream closes, which the loop only holds weakly
+        self._closing: Set["asyncio.Task[None]"] = set()
+        self.leaders = 0
+        self.shared = 0
+        self.timeouts = 0
+        self.unshareable = 0
+
+    async def run(self, key: Hashable, call: Callable[..., Awaitable[Response]]) -> Response:
+        flight = self._flights.get(key)
+        leader = flight is None
+        if flight is None:
+            flight = Flight(asyncio.ensure_future(call(buffer_limit=self.max_body_bytes)))
+            self._flights[key] = flight
+            flight.task.add_done_callback(functools.partial(self._finished, key, flight))
+            self.leaders += 1
+
+        flight.waiters += 1
+        received = False
+        try:
+            waiter = asyncio.shield(flight.task)
+            result = await (waiter if leader else asyncio.wait_for(waiter, self.max_wait))
+            received = True
+        except asyncio.TimeoutError:
+            result = None
+            self.timeouts += 1
+        finally:
+            flight.waiters -= 1
+            # The last waiter to receive the result sends (or re-requests) it itself
+            if flight.waiters == 0 and not received:
+                self._abandon(flight)
+
+        if result is None:
+            return await call()
+        if isinstance(result, StreamingResponse):
+            if flight.claim():
+                return result
+            self.unshareable += 1
+            return await call()
+        if not leader:
+            self.shared += 1
+        return copy_response(result)
+
+    def _finished(self, key: Hashable, flight: Flight, _task: asyncio.Future) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def _abandon(self, flight: Flight) -> None:
+        """Nobody is waiting any more: stop the call or release an unsent stream."""
+        task = flight.task
+        if not task.done():
+            task.cancel()
+        elif not task.cancelled() and task.exception() is None:
+            result = task.result()
+            if isinstance(result, UpstreamStreamingResponse) and flight.claim():
+                closing = asyncio.ensure_future(result.upstream.aclose())
+                self._closing.add(closing)
+                closing.add_done_callback(self._closing.discard)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "leaders": self.leaders,
+            "shared": self.shared,
+            "timeouts": self.timeouts,
+            "unshareable": self.unshareable,
+            "in_flight": len(self._flights),
+        }
+
+
+request_coalescer = RequestCoalescer(
+    max_wait=settings.COALESCING_MAX_WAIT,
+    max_body_bytes=settings.COALESCING_MAX_BODY_BYTES,
+)
+
+
+async def send_upstream(
+    client: httpx.AsyncClient,
+    request: Request,
+    target_url: str,
+    headers: List[Tuple[str, str]],
+    body: RequestBody,
+    hedger: Optional[Hedger] = None,
+    balancer: Optional[LoadBalancer] = None,
+    tried: Optional[List[Endpoint]] = None,
+    route_latency: Optional[RouteLatency] = None,
+) -> httpx.Response:
+    """
+    Send one (possibly hedged) attempt and return the streaming upstream response.
+
+    With a `balancer` every attempt, hedges included, goes to a replica it
+    picks, avoiding those in `tried` (earlier attempts, appended to) while
+    others are available, and reports back time to headers and failures.
+    With `route_latency` attempts use the route's adaptive timeout and feed
+    its latency sketch.
+    """
+    phases = request_phases(request)
+    tried = [] if tried is None else tried
+    # Parked requests say nothing about an endpoint's speed
+    measured = not is_push_request(request)
+    timeout = route_latency.timeout if route_latency is not None else upstream_timeout(request)
+
+    async def attempt(index: int = 0) -> httpx.Response:
+        url, attempt_headers = target_url, headers
+        endpoint: Optional[Endpoint] = None
+        if balancer is not None:
+            endpoint = balancer.pick(exclude=tried)
+            tried.append(endpoint)
+            url, attempt_headers = balancer.target(endpoint, target_url, headers)
+        started = time.perf_counter()
+        latency: Optional[float] = None
+        failed = False
+        try:
+            with tracer.span("upstream.request", method=request.method, url=url, attempt=index) as span:
+                upstream_request = client.build_request(
+                    method=request.method,
+                    url=url,
+                    headers=[*attempt_headers, ("traceparent", span.traceparent())],
+                    content=body.content(),
+                    params=request.query_params,
+                    timeout=timeout,
+                    extensions={"trace": phases.upstream_trace()} if phases is not None else None,
+                )
+                upstream = await client.send(upstream_request, stream=True, follow_redirects=True)
+                span.set(status_code=upstream.status_code)
+            failed = upstream.status_code >= 500
+            elapsed = time.perf_counter() - started
+            if measured:
+                latency = elapsed
+            if route_latency is not None and not failed:
+                route_latency.record(elapsed)
+            return upstream
+        except httpx.ReadTimeout:
+            failed = True
+            if route_latency is not None:
+                # The route took at least this long; without the sample a slowdown
+                # would keep timing out at the old limit instead of raising it
+                route_latency.record(time.perf_counter() - started)
+            raise
+        except httpx.RequestError:
+            failed = True
+            raise
+        finally:
+            if endpoint is not None:
+                balancer.release(endpoint, latency, failed)
+
+    if hedger is None:
+        return await attempt()
+    return await hedger.send(attempt)
 
 
 async def forward_request(request: Request) -> Any:
     """
     Forward request to appropriate service.
-    
+
     This function:
-    1. Extracts service name from path
+    1. Resolves service and forwarding path from the routing table
     2. Forwards request to appropriate service
-    3. Streams response back to client
+    3. Streams request and response bodies between client and service
     4. Preserves headers and status codes
+    5. Fails fast while the service's circuit is open and retries transient
+       errors only for idempotent requests, within the service's retry budget
+    6. Optionally hedges slow GET/HEAD requests (HEDGING_ENABLED)
+    7. Serves and revalidates GETs from the gateway response cache
+    8. Coalesces identical concurrent GET/HEAD requests into one upstream call
+    9. Bounds concurrent upstream calls per service with an adaptive limit,
+       queueing fairly per user and shedding excess load with 503s
+    10. Lets long polls and SSE streams wait up to LONG_POLLING_TIMEOUT for
+        the upstream, outside the cache, coalescing and admission control
+    11. Spreads attempts over the service's replicas (power of two choices
+        on latency and outstanding requests), ejecting failing ones
+    12. Times out each route's idempotent upstream calls at a multiple of its
+        recent p99
     """
-    path = request.url.path
-    # If gateway exposes versioned API under /api/{version}/..., strip that prefix
-    api_prefix = f"/api/{settings.API_VERSION}/"
-    if path.startswith(api_prefix):
-        path = path[len(api_prefix):]
-    else:
-        # Also allow bare /api/... (no version) by stripping first two segments if present
-        if path.startswith("/api/"):
-            # remove leading /api/{something}/
-            parts = path.strip("/").split("/")
-            if len(parts) >= 2:
-                path = "/" + "/".join(parts[2:]) if len(parts) > 2 else "/"
-
-    path = path.strip("/")
-    path_parts = path.split("/")
-    
-    if not path_parts:
-        raise HTTPException(status_code=404, detail="Invalid path")
-    
-    service_name = path_parts[0]
-    if service_name not in settings.SERVICE_ROUTES:
+    route = route_table.resolve(request.url.path)
+    if route is None:
         raise HTTPException(status_code=404, detail="Service not found")
-    
-    # Get service configuration
-    service_config = settings.SERVICE_ROUTES[service_name]
-    service_host = service_config["host"]
-    
-    # Remove service prefix from path for forwarding
-    forwarding_path = "/" + "/".join(path_parts[1:]) if len(path_parts) > 1 else "/"
-    target_url = f"{service_host}{forwarding_path}"
-    
-    # Build headers to forward
-    headers = dict(request.headers)
-    headers.pop("host", None)
-    if hasattr(request.state, "user"):
-        headers["X-User"] = request.state.user.get("sub")
 
-    # Prefer app-scoped http client created in lifespan; fall back to a local client
-    client: Optional[httpx.AsyncClient] = getattr(request.app.state, "http_client", None)
+    service_name = route.service
+    target_url = f"{route.host}{route.forward_path}"
+
+    headers = build_upstream_headers(request)
+    body = RequestBody(
+        request,
+        max_bytes=settings.PROXY_MAX_REQUEST_BODY_BYTES,
+        replayable_bytes=settings.PROXY_REPLAYABLE_BODY_BYTES,
+    )
+    try:
+        await body.prepare()
+    except BodyTooLarge as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+
+    # Long polls and SSE are parked upstream: never cached or coalesced, and kept out of
+    # admission control, where they would pin slots and skew the limit's latency samples
+    push = is_push_request(request)
+    key: Optional[CacheKey] = None
+    cached: Optional[CachedResponse] = None
+    if settings.RESPONSE_CACHE_ENABLED and request.method == "GET" and not push:
+        directives = parse_cache_control(request.headers.get("cache-control", ""))
+        if "no-store" not in directives:
+            key = cache_key(request, target_url)
+            cached = response_cache.get(key)
+        if cached is not None:
+            if response_cache.is_fresh(cached) and "no-cache" not in directives:
+                response_cache.hits += 1
+                return cached_response(request, key, cached, "HIT")
+            if cached.etag:
+                # Revalidate our copy; the client's own validators are answered from it
+                headers = [
+                    (name, value) for name, value in headers
+                    if name not in ("if-none-match", "if-modified-since")
+                ]
+                headers.append(("if-none-match", cached.etag))
+
+    call = functools.partial(
+        proxy_upstream, request, service_name, target_url, headers, body, key, cached
+    )
+    if settings.ADMISSION_ENABLED and not push:
+        call = functools.partial(
+            admitted, bulkheads[service_name], request, route.forward_path, service_name, call
+        )
+    if settings.COALESCING_ENABLED and request.method in HEDGEABLE_METHODS and body.empty and not push:
+        flight = cache_key(request, target_url) + (request.headers.get("if-none-match", ""),)
+        return await request_coalescer.run(flight, call)
+    return await call()
+
+
+async def admitted(
+    bulkhead: Bulkhead,
+    request: Request,
+    forward_path: str,
+    service_name: str,
+    call: Callable[..., Awaitable[Response]],
+    **kwargs: Any,
+) -> Response:
+    """
+    Run `call` within the service's concurrency limit.
+
+    The slot is held until the upstream response headers are in (streamed
+    bodies don't count against it), and the time taken feeds the limit.
+    """
+    try:
+        permit = await bulkhead.acquire(fairness_key(request), request_priority(forward_path))
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Service overloaded: {service_name}",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    try:
+        response = await call(**kwargs)
+    except HTTPException as e:
+        permit.overloaded = e.status_code in FAILURE_STATUS_CODES
+        raise
+    except Exception:
+        permit.overloaded = True
+        raise
+    else:
+        permit.overloaded = response.status_code in FAILURE_STATUS_CODES
+        return response
+    finally:
+        bulkhead.release(permit)
 
-    # Simple retry/backoff for transient errors
-    max_attempts = 3
-    backoff = 0.25
-    last_exc = None
 
-    for attempt in range(1, max_attempts + 1):
+async def proxy_upstream(
+    request: Request,
+    service_name: str,
+    target_url: str,
+    headers: List[Tuple[str, str]],
+    body: RequestBody,
+    key: Optional[CacheKey],
+    cached: Optional[CachedResponse],
+    buffer_limit: int = 0,
+) -> Response:
+    """
+    Call the upstream with circuit breaking, retries and hedging.
+
+    Responses are streamed, except bodies declared to be at most
+    `buffer_limit` bytes, which are read fully so they can be shared.
+    """
+    # Prefer the service's pooled client created in lifespan; fall back to a local client
+    pools: Optional[UpstreamPools] = getattr(request.app.state, "pools", None)
+    client: Optional[httpx.AsyncClient] = pools.client(service_name) if pools else None
+
+    phases = request_phases(request)
+    guard = service_guards[service_name]
+    balancer = balancers.get(service_name)
+    tried: List[Endpoint] = []
+    breaker = guard.breaker if settings.CIRCUIT_BREAKER_ENABLED else None
+    idempotent = is_idempotent(request.method, request.headers)
+    route_latency: Optional[RouteLatency] = None
+    # A write timed out after the upstream committed it would be reported as failed
+    if settings.ADAPTIVE_TIMEOUTS_ENABLED and idempotent and not is_push_request(request):
+        route = route_table.resolve(request.url.path)
+        route_latency = adaptive_timeouts.for_route(
+            service_name, request.method, route_template(route.forward_path)
+        )
+    guard.budget.deposit()
+    hedger = (
+        hedgers[service_name]
+        if settings.HEDGING_ENABLED and client is not None
+        and request.method in HEDGEABLE_METHODS and body.buffered
+        and not is_push_request(request)
+        else None
+    )
+
+    attempt = 0
+    while True:
+        attempt += 1
+        if breaker is not None and not breaker.allow_request():
+            # Fail fast instead of queueing more work on a service that is down
+            guard.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"Service unavailable: {service_name} circuit open",
+                headers={"Retry-After": str(max(1, math.ceil(breaker.retry_after())))},
+            )
+
         created_local_client = False
+        upstream: Optional[httpx.Response] = None
         try:
             if client is None:
-                client = httpx.AsyncClient(timeout=settings.DEFAULT_TIMEOUT)
+                client = httpx.AsyncClient(timeout=upstream_timeout(request))
                 created_local_client = True
 
-            response = await client.request(
-                method=request.method,
-                url=target_url,
-                headers=headers,
-                content=await request.body(),
-                params=request.query_params,
-                follow_redirects=True,
-                timeout=settings.DEFAULT_TIMEOUT,
+            sent_at = time.perf_counter()
+            traced_ttfb = phases.durations.get("ttfb") if phases is not None else None
+            upstream = await send_upstream(
+                client, request, target_url, headers, body, hedger, balancer, tried, route_latency
             )
-            
-            return StreamingResponse(
-                content=bytes(response.content or b""),
-                status_code=response.status_code,
-                headers=dict(response.headers),
-                media_type=response.headers.get("content-type")
+            if phases is not None and phases.durations.get("ttfb") == traced_ttfb:
+                # Transport without httpcore tracing (mock/ASGI): count the whole send
+                phases.add("ttfb", time.perf_counter() - sent_at)
+            if breaker is not None:
+                if upstream.status_code in FAILURE_STATUS_CODES:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+            response_headers = build_response_headers(upstream)
+
+            store: Optional[Callable[[bytes], Any]] = None
+            if key is not None:
+                if upstream.status_code == status.HTTP_304_NOT_MODIFIED and cached is not None:
+                    await upstream.aclose()
+                    lifetime = freshness_lifetime(upstream.headers, settings.RESPONSE_CACHE_MAX_TTL)
+                    entry = response_cache.refresh(key, lifetime or 0.0) or cached
+                    response_cache.revalidated += 1
+                    return cached_response(request, key, entry, "REVALIDATED")
+                response_cache.misses += 1
+                lifetime = freshness_lifetime(upstream.headers, settings.RESPONSE_CACHE_MAX_TTL)
+                if upstream.status_code == status.HTTP_200_OK and lifetime is not None:
+                    store = functools.partial(
+                        response_cache.put, key, upstream.status_code,
+                        cacheable_headers(response_headers), etag=upstream.headers.get("etag"),
+                        lifetime=lifetime,
+                    )
+            elif request.method not in SAFE_METHODS and upstream.status_code < 400:
+                response_cache.invalidate_path(target_url)
+
+            if (
+                settings.PROXY_STREAMING_ENABLED and not created_local_client
+                and not fits_in_buffer(upstream, buffer_limit)
+            ):
+                content = iter_upstream_body(upstream, phases)
+                if store is not None:
+                    content = tee_to_cache(content, store, settings.RESPONSE_CACHE_MAX_ENTRY_BYTES)
+                return UpstreamStreamingResponse(upstream, response_headers, content)
+
+            content = await read_upstream_body(upstream, phases)
+            if store is not None:
+                store(content)
+            response = Response(content=content, status_code=upstream.status_code)
+            response.raw_headers = response_headers
+            return response
+
+        except BodyTooLarge as e:
+            if upstream is not None:
+                await upstream.aclose()
+            code = (
+                status.HTTP_502_BAD_GATEWAY if upstream is not None
+                else status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
             )
+            raise HTTPException(status_code=code, detail=str(e))
 
         except (httpx.RequestError, httpx.TimeoutException) as e:
-            last_exc = e
-            # transient error -> retry with backoff
-            if attempt < max_attempts:
-                await asyncio.sleep(backoff * attempt)
+            if breaker is not None:
+                breaker.record_failure()
+            # transient error -> retry only if safe, the body can be resent and budget allows
+            if guard.retry_denied_reason(attempt, idempotent, body.replayable) is None:
+                await asyncio.sleep(
+                    backoff_delay(attempt, settings.RETRY_BACKOFF_BASE, settings.RETRY_BACKOFF_MAX)
+                )
                 continue
-            # final attempt failed
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail=f"Service unavailable: {str(e)}"
             )
         finally:
             if created_local_client and client is not None:
-                await client.aclose()
\ No newline at end of file
+                await client.aclose()
+                client = None
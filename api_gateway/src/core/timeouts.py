@@ -0,0 +1,184 @@
+"""Per-route upstream timeouts derived from observed latency."""
+import math
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from core.config import settings
+
+# Recompute a route's timeout every N samples instead of walking the sketch per request
+TIMEOUT_REFRESH_EVERY = 16
+
+
+class LatencySketch:
+    """
+    Streaming quantiles in constant memory (log-bucketed, HDR/DDSketch style).
+
+    Bucket bounds grow geometrically from `min_value` to `max_value`, so any
+    quantile is reported within `accuracy` relative error using a few
+    hundred counters whatever the traffic. To follow changes in latency,
+    samples go to a current window of `window` samples; when it is full it
+    replaces the previous one, and quantiles are read over both.
+    """
+
+    __slots__ = ("min_value", "window", "_log_gamma", "_gamma", "_size", "_current",
+                 "_previous", "_current_count", "_previous_count")
+
+    def __init__(
+        self,
+        accuracy: float = 0.02,
+        min_value: float = 1e-4,
+        max_value: float = 600.0,
+        window: int = 1000,
+    ):
+        self.min_value = min_value
+        self.window = window
+        self._gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._size = math.ceil(math.log(max_value / min_value) / self._log_gamma) + 1
+        self._current: List[int] = [0] * self._size
+        self._previous: List[int] = [0] * self._size
+        self._current_count = 0
+        self._previous_count = 0
+
+    def record(self, value: float) -> None:
+        if value <= self.min_value:
+            index = 0
+        else:
+            index = min(self._size - 1, math.ceil(math.log(value / self.min_value) / self._log_gamma))
+        self._current[index] += 1
+        self._current_count += 1
+        if self._current_count >= self.window:
+            self._previous, self._previous_count = self._current, self._current_count
+            self._current, self._current_count = [0] * self._size, 0
+
+    @property
+    def count(self) -> int:
+        return self._current_count + self._previous_count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Value at quantile `q` (0..1), or None before any sample."""
+        total = self.count
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for index, (current, previous) in enumerate(zip(self._current, self._previous)):
+            seen += current + previous
+            if seen > rank:
+                if index == 0:
+                    return self.min_value
+                # Midpoint (in relative terms) of the bucket's (lower, upper] range
+                return 2 * self.min_value * self._gamma ** index / (self._gamma + 1)
+        return self.min_value * self._gamma ** (self._size - 1)
+
+
+class RouteLatency:
+    """Latency sketch of one route and the timeout derived from it."""
+
+    __slots__ = ("sketch", "timeout", "_owner", "_since_refresh")
+
+    def __init__(self, owner: "AdaptiveTimeouts"):
+        self.sketch = LatencySketch(window=owner.window)
+        self._owner = owner
+        self._since_refresh = 0
+        self.timeout = owner.build_timeout(None)
+
+    def record(self, latency: float) -> None:
+        self.sketch.record(latency)
+        self._since_refresh += 1
+        if self._since_refresh >= TIMEOUT_REFRESH_EVERY or self.sketch.count == self._owner.min_samples:
+            self._since_refresh = 0
+            self.timeout = self._owner.build_timeout(self.sketch)
+
+
+class AdaptiveTimeouts:
+    """
+    Upstream timeouts per (service, method, route template).
+
+    The read timeout, which bounds the wait for response headers and for
+    each body chunk, is `multiplier` times the route's recent `quantile`
+    time to headers, clamped to [`floor`, `ceiling`]. Until `min_samples`
+    have been seen it is the ceiling. Connect and pool timeouts are fixed:
+    they measure the gateway's side, not the route. Routes beyond
+    `max_routes_per_service` share one "other" entry per service and method.
+
+    Methods are kept apart because a fast read and a slow write on one
+    template would otherwise share a p99. Callers should only apply these
+    timeouts to idempotent requests: a write cut off after the upstream
+    committed it would be reported as failed.
+    """
+
+    OTHER = "other"
+
+    def __init__(
+        self,
+        quantile: float = 0.99,
+        multiplier: float = 3.0,
+        floor: float = 0.5,
+        ceiling: float = 30.0,
+        min_samples: int = 100,
+        window: int = 1000,
+        connect: float = 2.0,
+        pool: float = 5.0,
+        max_routes_per_service: int = 50,
+    ):
+        self.quantile = quantile
+        self.multiplier = multiplier
+        self.floor = floor
+        self.ceiling = ceiling
+        self.min_samples = min_samples
+        self.window = window
+        self.connect = connect
+        self.pool = pool
+        self.max_routes_per_service = max_routes_per_service
+        self.routes: Dict[str, Dict[Tuple[str, str], RouteLatency]] = {}
+
+    def read_timeout(self, sketch: Optional[LatencySketch]) -> float:
+        if sketch is None or sketch.count < self.min_samples:
+            return self.ceiling
+        observed = sketch.quantile(self.quantile) or 0.0
+        return min(self.ceiling, max(self.floor, observed * self.multiplier))
+
+    def build_timeout(self, sketch: Optional[LatencySketch]) -> httpx.Timeout:
+        read = self.read_timeout(sketch)
+        # Writes stream the client's body, which the route's latency says nothing about
+        return httpx.Timeout(read, connect=self.connect, write=self.ceiling, pool=self.pool)
+
+    def for_route(self, service: str, method: str, route: str) -> RouteLatency:
+        routes = self.routes.setdefault(service, {})
+        key = (method, route)
+        entry = routes.get(key)
+        if entry is None:
+            if len(routes) >= self.max_routes_per_service:
+                key = (method, self.OTHER)
+                entry = routes.get(key)
+            if entry is None:
+                entry = routes[key] = RouteLatency(self)
+        return entry
+
+    def stats(self) -> Dict[Tuple[str, str, str], Dict[str, Optional[float]]]:
+        return {
+            (service, method, route): {
+                "samples": entry.sketch.count,
+                "observed": entry.sketch.quantile(self.quantile),
+                "connect": entry.timeout.connect,
+                "read": entry.timeout.read,
+                "pool": entry.timeout.pool,
+            }
+            for service, routes in self.routes.items()
+            for (method, route), entry in routes.items()
+        }
+
+
+adaptive_timeouts = AdaptiveTimeouts(
+    quantile=settings.ADAPTIVE_TIMEOUT_QUANTILE,
+    multiplier=settings.ADAPTIVE_TIMEOUT_MULTIPLIER,
+    floor=settings.ADAPTIVE_TIMEOUT_FLOOR,
+    ceiling=settings.DEFAULT_TIMEOUT,
+    min_samples=settings.ADAPTIVE_TIMEOUT_MIN_SAMPLES,
+    window=settings.ADAPTIVE_TIMEOUT_WINDOW,
+    connect=settings.UPSTREAM_CONNECT_TIMEOUT,
+    pool=settings.UPSTREAM_POOL_TIMEOUT,
+    max_routes_per_service=settings.ADAPTIVE_TIMEOUT_MAX_ROUTES_PER_SERVICE,
+)
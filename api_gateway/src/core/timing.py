@@ -0,0 +1,76 @@
+"""Per-request phase timings for the latency breakdown metrics."""
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+
+from fastapi import Request
+
+# Phases reported in gateway_request_phase_seconds
+PHASES = ("auth", "rate_limit", "queue", "connect", "ttfb", "stream")
+
+TraceCallback = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+
+class RequestPhases:
+    """
+    Seconds spent in each phase of one request.
+
+    Created by the gateway middleware and stored on `request.state.phases`;
+    the proxy adds upstream phases to it and the middleware observes them all
+    once the response has been sent. Repeated phases (retries) accumulate.
+    """
+
+    __slots__ = ("durations",)
+
+    def __init__(self):
+        self.durations: Dict[str, float] = {}
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.durations[phase] = self.durations.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def measure(self, phase: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - started)
+
+    def upstream_trace(self) -> TraceCallback:
+        """
+        httpcore `trace` extension for one upstream attempt.
+
+        queue:   from the send until httpcore starts using a connection
+                 (waiting for a free pooled connection)
+        connect: TCP connect plus TLS handshake, only when a new connection is made
+        ttfb:    request headers sent -> response headers received
+        """
+        started = time.perf_counter()
+        marks: Dict[str, float] = {}
+
+        async def trace(event: str, info: Dict[str, Any]) -> None:
+            now = time.perf_counter()
+            step, _, stage = event.rpartition(".")
+            if stage == "started":
+                if "queue" not in marks and (
+                    step.startswith("connection.connect") or step.endswith("send_request_headers")
+                ):
+                    marks["queue"] = now
+                    self.add("queue", now - started)
+                marks[step] = now
+            elif stage == "complete":
+                begun = marks.get(step)
+                if begun is None:
+                    return
+                if step.startswith("connection.connect") or step.endswith("start_tls"):
+                    self.add("connect", now - begun)
+                elif step.endswith("receive_response_headers"):
+                    sent = marks.get(step.replace("receive_response_headers", "send_request_headers"))
+                    self.add("ttfb", now - (sent if sent is not None else begun))
+
+        return trace
+
+
+def request_phases(request: Request) -> Optional[RequestPhases]:
+    """The request's phase recorder, if the metrics middleware installed one."""
+    return getattr(request.state, "phases", None)
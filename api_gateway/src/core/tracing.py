@@ -0,0 +1,222 @@
+"""W3C trace context propagation and an in-process span recorder."""
+import asyncio
+import random
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional
+
+from core.config import settings
+from core.logsink import LogSink
+
+# version-traceid-parentid-flags; later versions may append fields (W3C Trace Context §3.2)
+TRACEPARENT = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})(-.*)?$")
+INVALID_TRACE_ID = "0" * 32
+INVALID_SPAN_ID = "0" * 16
+
+
+class TraceContext(NamedTuple):
+    trace_id: str
+    span_id: str
+    sampled: bool
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[TraceContext]:
+    """The remote parent from a `traceparent` header, or None if absent or malformed."""
+    if not value:
+        return None
+    match = TRACEPARENT.match(value.strip().lower())
+    if match is None:
+        return None
+    version, trace_id, span_id, flags, rest = match.groups()
+    if version == "ff" or (version == "00" and rest):
+        return None
+    if trace_id == INVALID_TRACE_ID or span_id == INVALID_SPAN_ID:
+        return None
+    return TraceContext(trace_id, span_id, bool(int(flags, 16) & 0x01))
+
+
+def format_traceparent(context: TraceContext) -> str:
+    return f"00-{context.trace_id}-{context.span_id}-{'01' if context.sampled else '00'}"
+
+
+class Span:
+    """One timed operation. Children share the local root's `spans` buffer."""
+
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_id", "sampled", "attributes",
+        "error", "start_ns", "started", "duration_ms", "root", "spans",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: Optional[str],
+        sampled: bool,
+        root: Optional["Span"],
+        attributes: Dict[str, Any],
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.attributes = attributes
+        self.error = False
+        self.start_ns = time.time_ns()
+        self.started = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.root = root or self
+        self.spans: List[Span] = []
+
+    def context(self) -> TraceContext:
+        return TraceContext(self.trace_id, self.span_id, self.sampled)
+
+    def traceparent(self) -> str:
+        return format_traceparent(self.context())
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def to_dict(self, service: str) -> Dict[str, Any]:
+        return {
+            "type": "span",
+            "service": service,
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_us": self.start_ns // 1000,
+            "duration_ms": self.duration_ms,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """
+    Records spans in memory and exports whole local traces with tail sampling.
+
+    A span opened with no span active in the current context (typically with
+    the remote parent from `traceparent`) is a local root: it and all of its
+    descendants are buffered until it ends, then either all exported or all
+    discarded. A local trace is kept when it is slow (root >= `slow_ms`), when
+    any span in it failed, or when the trace is head-sampled. Head sampling
+    hashes the trace id, so every service keeps the same baseline traces and
+    those arrive complete; slow or failed segments are kept wherever they
+    happen, even if other services dropped their part of the same trace.
+
+    With `enabled=False` spans are still created so context keeps
+    propagating, but nothing is buffered or exported.
+    """
+
+    def __init__(
+        self,
+        service: str,
+        export: Callable[[Dict[str, Any]], Any],
+        slow_ms: float,
+        sample_rate: float,
+        max_spans_per_trace: int = 256,
+        enabled: bool = True,
+    ):
+        self.service = service
+        self.export = export
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        self.max_spans_per_trace = max_spans_per_trace
+        self.enabled = enabled
+        self.exported = 0
+        self.discarded = 0
+        self.spans_dropped = 0
+
+    def head_sampled(self, trace_id: str) -> bool:
+        return int(trace_id[16:], 16) < self.sample_rate * 2**64
+
+    @staticmethod
+    def current() -> Optional[Span]:
+        return _current_span.get()
+
+    def traceparent(self) -> Optional[str]:
+        """`traceparent` value for an outgoing call from the current span."""
+        span = _current_span.get()
+        return span.traceparent() if span is not None else None
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[TraceContext] = None, **attributes: Any) -> Iterator[Span]:
+        """
+        Time the block as a span. Without `parent` the span is a child of the
+        current span, or starts a new trace if there is none.
+        """
+        current = _current_span.get()
+        if parent is None and current is not None:
+            span = Span(name, current.trace_id, current.span_id, current.sampled, current.root, attributes)
+        elif parent is not None:
+            sampled = parent.sampled or self.head_sampled(parent.trace_id)
+            span = Span(name, parent.trace_id, parent.span_id, sampled, None, attributes)
+        else:
+            trace_id = f"{random.getrandbits(128):032x}"
+            span = Span(name, trace_id, None, self.head_sampled(trace_id), None, attributes)
+
+        token = _current_span.set(span)
+        try:
+            yield span
+        except asyncio.CancelledError:
+            # Lost hedges and abandoned coalesced calls are cancelled; not a failure
+            span.attributes["cancelled"] = True
+            raise
+        except Exception as e:
+            span.error = True
+            span.attributes.setdefault("error_type", type(e).__name__)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.duration_ms = round((time.perf_counter() - span.started) * 1000, 3)
+            if self.enabled:
+                self._finish(span)
+
+    def _finish(self, span: Span) -> None:
+        root = span.root
+        if span is not root:
+            if root.duration_ms is not None or len(root.spans) >= self.max_spans_per_trace:
+                # Outlived its local root (detached task) or the trace is too large
+                self.spans_dropped += 1
+            else:
+                root.spans.append(span)
+            return
+
+        spans, root.spans = root.spans, []
+        spans.append(root)
+        if root.sampled or root.duration_ms >= self.slow_ms or any(s.error for s in spans):
+            for finished in spans:
+                self.export(finished.to_dict(self.service))
+            self.exported += 1
+        else:
+            self.discarded += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "exported": self.exported,
+            "discarded": self.discarded,
+            "spans_dropped": self.spans_dropped,
+        }
+
+
+# Spans share the log pipeline's design: written in batches by a background thread
+span_sink = LogSink(
+    max_queue=settings.LOG_QUEUE_SIZE,
+    batch_size=settings.LOG_BATCH_SIZE,
+    stream=open(settings.TRACING_EXPORT_PATH, "a") if settings.TRACING_EXPORT_PATH else None,
+)
+tracer = Tracer(
+    service="api_gateway",
+    export=span_sink.put,
+    slow_ms=settings.TRACING_SLOW_MS,
+    sample_rate=settings.TRACING_SAMPLE_RATE,
+    max_spans_per_trace=settings.TRACING_MAX_SPANS_PER_TRACE,
+    enabled=settings.TRACING_ENABLED,
+)
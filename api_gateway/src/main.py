@@ -1,36 +1,65 @@
 import datetime
+import functools
+import time
 import uuid
 from contextlib import asynccontextmanager
 
-import uvicorn
 from fastapi import FastAPI, Request, Response, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
-import httpx
 import structlog
 
+from api import batch, views
+from core.balancer import endpoint_discovery
 from core.config import settings
+from core.health import HealthAggregator
+from core.launcher import serve
+from core.logsink import log_sampler, log_sink
+from core.metrics_store import archive_worker, reset_directory
+from core.pools import upstream_pools
 from core.services import forward_request
-from middleware import MetricsMiddleware, get_metrics
-from middleware import auth_middleware
-from middleware import rate_limit_middleware
+from core.tracing import span_sink
+from middleware import CompressionMiddleware, GatewayMiddleware, get_metrics
+from middleware.metrics import OPENMETRICS_CONTENT_TYPE, worker_collectors
+from middleware.rate_limit import rate_limiter
 
-# Configure structured logging
+# Configure structured logging: sampled, then serialized and written off the event loop
 structlog.configure(
     processors=[
+        log_sampler,
         structlog.processors.TimeStamper(fmt="iso"),
-        structlog.processors.JSONRenderer(),
+        log_sink.processor,
     ]
 )
+log_sink.start()
+span_sink.start()
 logger = structlog.get_logger()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifecycle management."""
-    # Create HTTP client pool
-    app.state.http_client = httpx.AsyncClient(timeout=settings.DEFAULT_TIMEOUT)
+    # Expand upstream host names into one endpoint per replica, and keep them current
+    await endpoint_discovery.refresh()
+    endpoint_discovery.start()
+    # Create per-service HTTP connection pools and open warm connections
+    await upstream_pools.start()
+    app.state.pools = upstream_pools
+    # Keep an upstream health snapshot warm in the background
+    app.state.health = HealthAggregator(settings.SERVICE_ROUTES, upstream_pools)
+    app.state.health.start()
+    if settings.RATE_LIMIT_ENABLED:
+        rate_limiter.start()
+    # Publish this worker's pool/breaker/cache gauges for scrapes answered by other workers
+    if worker_collectors is not None:
+        worker_collectors.start()
     yield
-    await app.state.http_client.aclose()
+    if worker_collectors is not None:
+        await worker_collectors.stop()
+    await rate_limiter.stop()
+    await app.state.health.stop()
+    await endpoint_discovery.stop()
+    await upstream_pools.aclose()
+    span_sink.close()
+    log_sink.close()
 
 # Create FastAPI application
 app = FastAPI(
@@ -49,7 +78,18 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-# Add CORS middleware
+# Authentication, rate limiting and metrics in one pure-ASGI pass
+app.add_middleware(
+    GatewayMiddleware,
+    metrics=settings.ENABLE_METRICS,
+    rate_limit=settings.RATE_LIMIT_ENABLED,
+)
+
+# Response compression (zstd/br/gzip); already-encoded upstream bodies pass through
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+# Add CORS middleware (outermost, so 401/429 responses carry CORS headers too)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.CORS_ORIGINS,
@@ -58,64 +98,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Add GZip compression
-app.add_middleware(GZipMiddleware, minimum_size=1000)
-
-# Add metrics middleware if enabled
-if settings.ENABLE_METRICS:
-    app.add_middleware(MetricsMiddleware)
-
-# Add rate limiting if enabled
-if settings.RATE_LIMIT_ENABLED:
-    app.middleware("http")(rate_limit_middleware)
-
-# Add authentication middleware
-app.middleware("http")(auth_middleware)
-
 
 @app.get("/health", tags=["System"])
-async def health_check():
-    """Enhanced health check endpoint with service status."""
-    health_info = {
-        "status": "healthy",
+async def health_check(request: Request):
+    """Enhanced health check endpoint with service status (served from a cached snapshot)."""
+    snapshot = await request.app.state.health.snapshot()
+    return {
+        "status": snapshot["status"],
         "timestamp": datetime.datetime.utcnow().isoformat(),
         "version": settings.API_VERSION,
-        "services": {}
+        "checked_at": snapshot["checked_at"],
+        "services": snapshot["services"],
     }
-    
-    # Check each service
-    for service_name, config in settings.SERVICE_ROUTES.items():
-        try:
-            async with httpx.AsyncClient(timeout=2.0) as client:
-                response = await client.get(f"{config['host']}/health")
-                health_info["services"][service_name] = {
-                    "status": "up" if response.status_code == 200 else "degraded",
-                    "latency_ms": int(response.elapsed.total_seconds() * 1000)
-                }
-        except Exception as e:
-            health_info["services"][service_name] = {
-                "status": "down",
-                "error": str(e)
-            }
-            if all(svc.get("status") == "down" for svc in health_info["services"].values()):
-                health_info["status"] = "unhealthy"
-            else:
-                health_info["status"] = "degraded"
-    
-    return health_info
 
 # Backward/forward-compatible alias: expose health under versioned path as well
 @app.get(f"/api/{settings.API_VERSION}/health", tags=["System"])
-async def health_check_versioned():
-    return await health_check()
+async def health_check_versioned(request: Request):
+    return await health_check(request)
 
 @app.get("/metrics", tags=["System"], include_in_schema=settings.ENABLE_METRICS)
-async def metrics():
-    """Prometheus metrics endpoint."""
+async def metrics(request: Request):
+    """Prometheus metrics endpoint (OpenMetrics with exemplars when the scraper asks for it)."""
     if not settings.ENABLE_METRICS:
         raise HTTPException(status_code=404)
+    if "application/openmetrics-text" in request.headers.get("accept", ""):
+        return Response(content=get_metrics(openmetrics_format=True), media_type=OPENMETRICS_CONTENT_TYPE)
     return Response(content=get_metrics(), media_type="text/plain")
 
+# Registered before the catch-all proxy route below
+app.include_router(batch.router)
+app.include_router(views.router)
+
 @app.api_route("/api/{version}/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "HEAD", "OPTIONS"])
 async def api_gateway(request: Request, version: str, path: str):
     """
@@ -130,8 +143,9 @@ async def api_gateway(request: Request, version: str, path: str):
             detail=f"API version {version} not found. Current version: {settings.API_VERSION}"
         )
     
-    # Add request context for logging
-    request_id = str(uuid.uuid4())
+    # Add request context for logging (id assigned by GatewayMiddleware)
+    request_id = getattr(request.state, "request_id", None) or str(uuid.uuid4())
+    started = time.perf_counter()
     logger.info(
         "incoming_request",
         request_id=request_id,
@@ -146,7 +160,8 @@ async def api_gateway(request: Request, version: str, path: str):
         logger.info(
             "request_completed",
             request_id=request_id,
-            status_code=response.status_code
+            status_code=response.status_code,
+            duration_ms=round((time.perf_counter() - started) * 1000, 2),
         )
         return response
     except Exception as e:
@@ -154,15 +169,28 @@ async def api_gateway(request: Request, version: str, path: str):
             "request_failed",
             request_id=request_id,
             error=str(e),
-            error_type=type(e).__name__
+            error_type=type(e).__name__,
+            duration_ms=round((time.perf_counter() - started) * 1000, 2),
         )
         raise
 
 
 if __name__ == "__main__":
-    uvicorn.run(
-        "main:app",
+    on_worker_exit = None
+    if settings.METRICS_MULTIPROCESS_DIR:
+        # Counters restart with the server; dead workers' files are folded into an archive
+        reset_directory(settings.METRICS_MULTIPROCESS_DIR)
+        on_worker_exit = functools.partial(archive_worker, settings.METRICS_MULTIPROCESS_DIR)
+    # Production entry point; this process has already built `app`, so preloading is free
+    serve(
+        app if settings.SERVER_PRELOAD else "main:app",
         host=settings.HOST,
         port=settings.PORT,
-        reload=True
+        workers=settings.SERVER_WORKERS,
+        backlog=settings.SERVER_BACKLOG,
+        reuse_port=settings.SERVER_REUSE_PORT,
+        max_requests=settings.SERVER_MAX_REQUESTS,
+        max_requests_jitter=settings.SERVER_MAX_REQUESTS_JITTER,
+        graceful_timeout=settings.SERVER_GRACEFUL_TIMEOUT,
+        on_worker_exit=on_worker_exit,
     )
\ No newline at end of file
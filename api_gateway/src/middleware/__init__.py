@@ -1,9 +1,13 @@
 from .auth import auth_middleware
+from .compression import CompressionMiddleware
+from .gateway import GatewayMiddleware
 from .metrics import MetricsMiddleware, get_metrics
 from .rate_limit import rate_limit_middleware   
 
 __all__ = [
     "auth_middleware",
+    "CompressionMiddleware",
+    "GatewayMiddleware",
     "MetricsMiddleware",
     "get_metrics",
     "rate_limit_middleware",
@@ -0,0 +1,97 @@
+"""Negotiated zstd / brotli / gzip response compression as a pure-ASGI middleware."""
+from typing import Dict, List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.compression import Compressor, choose_encoding, compressor
+from core.config import settings
+
+
+class CompressionMiddleware:
+    """
+    Compress responses with the best coding the client accepts.
+
+    Replaces Starlette's GZipMiddleware. Responses that already carry a
+    Content-Encoding (upstream bodies the proxy streams through raw, cached
+    variants) are passed through untouched, so nothing is decompressed or
+    compressed twice. Only media types listed in COMPRESSION_LEVELS are
+    compressed, at the level configured for the type and coding. Complete
+    bodies below `minimum_size` are left alone; streamed bodies are
+    compressed chunk by chunk with a sync flush so clients still see each
+    chunk as it arrives.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: Optional[int] = None,
+        encodings: Optional[List[str]] = None,
+        levels: Optional[Dict[str, Dict[str, int]]] = None,
+    ):
+        self.app = app
+        self.minimum_size = settings.COMPRESSION_MIN_SIZE if minimum_size is None else minimum_size
+        self.encodings = encodings or settings.COMPRESSION_ENCODINGS
+        self.levels = levels or settings.COMPRESSION_LEVELS
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+        if not accept_encoding:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        stream: Optional[Compressor] = None
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, stream
+            if message["type"] == "http.response.start":
+                # Held back until the first body chunk shows whether it is worth compressing
+                start = message
+                return
+            if start is None or message["type"] != "http.response.body":
+                if start is not None:
+                    await send(start)
+                    start = None
+                if stream is not None and message["type"] == "http.response.body":
+                    more_body = message.get("more_body", False)
+                    body = stream.compress(message.get("body", b""))
+                    message["body"] = body + (stream.flush() if more_body else stream.finish())
+                await send(message)
+                return
+
+            held, start = start, None
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            headers = MutableHeaders(scope=held)
+            chosen = None
+            if (
+                "content-encoding" not in headers
+                and held["status"] not in (204, 304)
+                and (more_body or len(body) >= self.minimum_size)
+            ):
+                chosen = choose_encoding(
+                    accept_encoding, headers.get("content-type", ""), self.encodings, self.levels
+                )
+            if chosen is None:
+                await send(held)
+                await send(message)
+                return
+
+            encoding, level = chosen
+            stream = compressor(encoding, level)
+            headers["content-encoding"] = encoding
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                del headers["content-length"]
+                message["body"] = stream.compress(body) + stream.flush()
+            else:
+                message["body"] = stream.compress(body) + stream.finish()
+                headers["content-length"] = str(len(message["body"]))
+            await send(held)
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
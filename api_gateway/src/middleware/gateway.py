@@ -0,0 +1,194 @@
+"""Fused metrics, rate limiting and authentication as one pure-ASGI middleware."""
+import re
+import time
+import uuid
+from contextlib import nullcontext
+from typing import Callable, Optional
+
+from fastapi import HTTPException, Request, status
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.config import settings
+from core.routing import RouteTable, route_table
+from core.security import verify_token
+from core.timing import RequestPhases
+from core.tracing import Tracer, parse_traceparent, tracer as default_tracer
+from middleware.metrics import (
+    REQUEST_COUNT,
+    REQUEST_LATENCY,
+    REQUEST_PHASE_LATENCY,
+    UPSTREAM_ERRORS,
+    RouteLabeler,
+    route_labeler,
+)
+from middleware.rate_limit import RateLimiter, rate_limit_key, rate_limiter
+
+
+# Accept a caller-supplied X-Request-ID only if it is short and header/label safe
+REQUEST_ID = re.compile(r"^[A-Za-z0-9._\-]{1,64}$")
+
+# Responses that say nothing about whether the path is a real route: they may
+# reuse a known route label but not claim a new one
+UNADMITTED_STATUSES = frozenset({
+    status.HTTP_401_UNAUTHORIZED, status.HTTP_404_NOT_FOUND, status.HTTP_429_TOO_MANY_REQUESTS,
+})
+
+
+def scope_header(scope: Scope, header: bytes) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == header:
+            return value.decode("latin-1")
+    return None
+
+
+def incoming_request_id(scope: Scope) -> Optional[str]:
+    request_id = scope_header(scope, b"x-request-id")
+    return request_id if request_id is not None and REQUEST_ID.match(request_id) else None
+
+
+def unauthorized(detail: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        content={"detail": detail},
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+class GatewayMiddleware:
+    """
+    Authentication, rate limiting and request metrics in a single ASGI pass.
+
+    Replaces the `auth_middleware` / `rate_limit_middleware` function
+    middlewares and the `MetricsMiddleware` BaseHTTPMiddleware, each of which
+    wrapped the request and response streams in its own task. Here the
+    checks run inline on the scope; rejected requests are answered with 401
+    or 429 without entering the app, and the response is passed through
+    untouched (so streaming keeps working) while the status is read off the
+    `http.response.start` message. Auth still runs before the limiter so
+    rate limit keys can use the user; metrics now also count the 401/429
+    responses.
+
+    Metrics are labelled by resolved service and route template, and the
+    time spent in each phase (auth, rate_limit, plus the upstream phases the
+    proxy records on `request.state.phases`) goes to its own histogram. Every
+    response carries an `X-Request-ID` (the caller's, if it sent a sane one),
+    which is also attached to the observations as an exemplar.
+
+    Each request is the local root span of a trace, continuing the caller's
+    `traceparent` if it sent one; 5xx responses mark the span as failed so
+    tail sampling keeps them.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        metrics: bool = True,
+        rate_limit: bool = True,
+        limiter: Optional[RateLimiter] = None,
+        key_func: Optional[Callable[[Request], str]] = None,
+        routes: Optional[RouteTable] = None,
+        labeler: Optional[RouteLabeler] = None,
+        tracer: Optional[Tracer] = None,
+    ):
+        self.app = app
+        self.metrics = metrics
+        self.rate_limit = rate_limit
+        self.limiter = limiter or rate_limiter
+        self.key_func = key_func or rate_limit_key
+        self.routes = routes or route_table
+        self.labeler = labeler or route_labeler
+        self.tracer = tracer or default_tracer
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        state = scope.setdefault("state", {})
+        request_id = state["request_id"] = incoming_request_id(scope) or uuid.uuid4().hex
+        parent = parse_traceparent(scope_header(scope, b"traceparent"))
+        with self.tracer.span(
+            "gateway.request", parent, method=scope["method"], path=scope["path"], request_id=request_id
+        ) as span:
+            status_code = 500
+
+            async def send_with_request_id(message: Message) -> None:
+                nonlocal status_code
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                    span.set(status_code=status_code)
+                    span.error = span.error or status_code >= 500
+                    message["headers"] = [*message.get("headers", ()), (b"x-request-id", request_id.encode())]
+                await send(message)
+
+            if not self.metrics:
+                await self._handle(scope, receive, send_with_request_id, None)
+                return
+
+            phases = state["phases"] = RequestPhases()
+            started = time.perf_counter()
+            error: Optional[BaseException] = None
+            try:
+                await self._handle(scope, receive, send_with_request_id, phases)
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                # Labelled once the outcome is known, so only real routes can claim a label
+                service, route = self.labeler.labels(
+                    scope["path"], admit=error is None and status_code not in UNADMITTED_STATUSES
+                )
+                if isinstance(error, Exception):
+                    UPSTREAM_ERRORS.labels(service=service, error_type=type(error).__name__).inc()
+                elif error is None:
+                    REQUEST_COUNT.labels(service=service, route=route, status=status_code).inc()
+                exemplar = {"request_id": request_id} if settings.METRICS_EXEMPLARS else None
+                REQUEST_LATENCY.labels(service=service, route=route).observe(
+                    time.perf_counter() - started, exemplar
+                )
+                for phase, seconds in phases.durations.items():
+                    REQUEST_PHASE_LATENCY.labels(service=service, route=route, phase=phase).observe(
+                        seconds, exemplar
+                    )
+
+    async def _handle(
+        self, scope: Scope, receive: Receive, send: Send, phases: Optional[RequestPhases]
+    ) -> None:
+        request = Request(scope)
+        with phases.measure("auth") if phases is not None else nullcontext():
+            rejection = await self._authenticate(request)
+        if rejection is None and self.rate_limit and scope["path"] != "/health":
+            with phases.measure("rate_limit") if phases is not None else nullcontext():
+                key = self.key_func(request)
+                allowed = self.limiter.is_allowed(key)
+            if not allowed:
+                rejection = JSONResponse(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    content={"detail": "Too many requests"},
+                    headers={"Retry-After": str(self.limiter.retry_after(key))},
+                )
+        if rejection is not None:
+            await rejection(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+    async def _authenticate(self, request: Request) -> Optional[JSONResponse]:
+        """Set `request.state.user`, or return the 401 to send instead."""
+        if self.routes.is_public(request.scope["path"], request.scope["method"]):
+            return None
+
+        auth_header = request.headers.get("authorization")
+        if not auth_header:
+            return unauthorized("Missing authentication token")
+        parts = auth_header.split()
+        if len(parts) != 2:
+            return unauthorized("Invalid authentication format")
+        scheme, token = parts
+        if scheme.lower() != "bearer":
+            return unauthorized("Invalid authentication scheme")
+        try:
+            request.state.user = await verify_token(token)
+        except HTTPException as e:
+            return unauthorized(e.detail)
+        return None
@@ -1,20 +1,48 @@
 """Gateway metrics collection and reporting."""
-from prometheus_client import Counter, Histogram, generate_latest
+from typing import Dict, Iterable, Optional, Set, Tuple
+from prometheus_client import CollectorRegistry, Counter, Histogram, generate_latest, REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.openmetrics import exposition as openmetrics
 from fastapi import Request
 from starlette.middleware.base import BaseHTTPMiddleware
 import time
 
+from core.admission import bulkheads
+from core.balancer import balancers
+from core.cache import response_cache
+from core.config import settings
+from core.hedging import hedgers
+from core.logsink import log_sampler, log_sink
+from core.metrics_store import CachedExposition, MultiProcessCollector, WorkerCollectors
+from core.pools import upstream_pools
+from core.resilience import CircuitState, service_guards
+from core.routing import RouteTable, route_table, route_template
+from core.security import token_cache
+from core.services import request_coalescer
+from core.timeouts import adaptive_timeouts
+from core.tracing import tracer
+
+OPENMETRICS_CONTENT_TYPE = openmetrics.CONTENT_TYPE_LATEST
+
 # Define metrics
 REQUEST_COUNT = Counter(
     'gateway_requests_total',
-    'Total count of requests by service and status',
-    ['service', 'status']
+    'Total count of requests by service, route and status',
+    ['service', 'route', 'status']
 )
 
 REQUEST_LATENCY = Histogram(
     'gateway_request_latency_seconds',
-    'Request latency by service',
-    ['service']
+    'End-to-end request latency by service and route',
+    ['service', 'route'],
+    buckets=settings.METRICS_LATENCY_BUCKETS,
+)
+
+REQUEST_PHASE_LATENCY = Histogram(
+    'gateway_request_phase_seconds',
+    'Time spent per request phase (auth, rate_limit, queue, connect, ttfb, stream)',
+    ['service', 'route', 'phase'],
+    buckets=settings.METRICS_PHASE_BUCKETS,
 )
 
 UPSTREAM_ERRORS = Counter(
@@ -24,19 +52,410 @@ UPSTREAM_ERRORS = Counter(
 )
 
 
+class RouteLabeler:
+    """
+    Maps request paths to (service, route) label values with bounded cardinality.
+
+    Proxied paths are labelled with the resolved service and the upstream path
+    with identifier segments collapsed (`/orders/42` -> `/orders/{id}`). Each
+    service may contribute at most `max_routes_per_service` distinct routes;
+    later ones, gateway paths that aren't known endpoints and unknown services
+    are all reported as "other". Only `admit`ted requests may add a route to
+    the budget, so unauthenticated or 404 junk paths can't use it up and push
+    real routes into "other".
+    """
+
+    OTHER = "other"
+
+    def __init__(self, routes: RouteTable, local_routes: Iterable[str], max_routes_per_service: int):
+        self.routes = routes
+        self.local_routes = frozenset(local_routes)
+        self.max_routes_per_service = max_routes_per_service
+        self._seen: Dict[str, Set[str]] = {}
+
+    def labels(self, path: str, admit: bool = True) -> Tuple[str, str]:
+        match = self.routes.resolve(path)
+        if match is None:
+            return "gateway", path if path in self.local_routes else self.OTHER
+        template = route_template(match.forward_path)
+        seen = self._seen.setdefault(match.service, set())
+        if template not in seen:
+            if not admit or len(seen) >= self.max_routes_per_service:
+                return match.service, self.OTHER
+            seen.add(template)
+        return match.service, template
+
+
+route_labeler = RouteLabeler(
+    route_table,
+    local_routes=(
+        "/health",
+        settings.METRICS_PATH,
+        "/openapi.json",
+        f"/api/{settings.API_VERSION}/health",
+        f"/api/{settings.API_VERSION}/docs",
+        f"/api/{settings.API_VERSION}/redoc",
+    ),
+    max_routes_per_service=settings.METRICS_MAX_ROUTES_PER_SERVICE,
+)
+
+
+class UpstreamPoolCollector:
+    """Reports upstream connection pool usage at scrape time."""
+
+    def collect(self):
+        connections = GaugeMetricFamily(
+            'gateway_upstream_pool_connections',
+            'Open upstream connections by service and state',
+            labels=['service', 'state'],
+        )
+        limit = GaugeMetricFamily(
+            'gateway_upstream_pool_max_connections',
+            'Configured connection limit by service',
+            labels=['service'],
+        )
+        for service, stats in upstream_pools.stats().items():
+            connections.add_metric([service, 'active'], stats['active'])
+            connections.add_metric([service, 'idle'], stats['idle'])
+            limit.add_metric([service], stats['max'])
+        yield connections
+        yield limit
+
+
+class LoadBalancerCollector:
+    """Reports per-endpoint load, latency and outlier ejections at scrape time."""
+
+    def collect(self):
+        in_flight = GaugeMetricFamily(
+            'gateway_upstream_endpoint_in_flight',
+            'Outstanding upstream attempts by endpoint',
+            labels=['service', 'endpoint'],
+        )
+        latency = GaugeMetricFamily(
+            'gateway_upstream_endpoint_latency_seconds',
+            'Moving average of time to response headers by endpoint',
+            labels=['service', 'endpoint'],
+        )
+        ejected = GaugeMetricFamily(
+            'gateway_upstream_endpoint_ejected',
+            'Whether the endpoint is ejected as an outlier (1) or in rotation (0)',
+            labels=['service', 'endpoint'],
+        )
+        ejections = CounterMetricFamily(
+            'gateway_upstream_endpoint_ejections',
+            'Times the endpoint was ejected for consecutive failures',
+            labels=['service', 'endpoint'],
+        )
+        for service, balancer in balancers.items():
+            for endpoint, stats in balancer.stats().items():
+                in_flight.add_metric([service, endpoint], stats['in_flight'])
+                if stats['latency'] is not None:
+                    latency.add_metric([service, endpoint], stats['latency'])
+                ejected.add_metric([service, endpoint], int(stats['ejected']))
+                ejections.add_metric([service, endpoint], stats['ejections'])
+        yield in_flight
+        yield latency
+        yield ejected
+        yield ejections
+
+
+class AdaptiveTimeoutCollector:
+    """Reports the effective upstream timeouts per route and the latency they derive from."""
+
+    def collect(self):
+        timeout = GaugeMetricFamily(
+            'gateway_upstream_timeout_seconds',
+            'Effective upstream timeout by service, method, route and kind (connect, read, pool)',
+            labels=['service', 'method', 'route', 'kind'],
+        )
+        observed = GaugeMetricFamily(
+            'gateway_upstream_observed_latency_seconds',
+            'Recent time to response headers at ADAPTIVE_TIMEOUT_QUANTILE, by service, method and route',
+            labels=['service', 'method', 'route'],
+        )
+        samples = GaugeMetricFamily(
+            'gateway_upstream_latency_samples',
+            'Samples in the latency sketch behind each route timeout',
+            labels=['service', 'method', 'route'],
+        )
+        for (service, method, route), stats in adaptive_timeouts.stats().items():
+            for kind in ('connect', 'read', 'pool'):
+                timeout.add_metric([service, method, route, kind], stats[kind])
+            if stats['observed'] is not None:
+                observed.add_metric([service, method, route], stats['observed'])
+            samples.add_metric([service, method, route], stats['samples'])
+        yield timeout
+        yield observed
+        yield samples
+
+
+class TokenCacheCollector:
+    """Reports verified-JWT cache effectiveness and size at scrape time."""
+
+    def collect(self):
+        stats = token_cache.stats()
+        lookups = CounterMetricFamily(
+            'gateway_jwt_cache_lookups',
+            'JWT cache lookups by result',
+            labels=['result'],
+        )
+        lookups.add_metric(['hit'], stats['hits'])
+        lookups.add_metric(['miss'], stats['misses'])
+        yield lookups
+        yield CounterMetricFamily(
+            'gateway_jwt_cache_evictions',
+            'JWT cache entries evicted to stay within limits',
+            value=stats['evictions'],
+        )
+        yield GaugeMetricFamily(
+            'gateway_jwt_cache_entries', 'Tokens currently cached', value=stats['entries']
+        )
+        yield GaugeMetricFamily(
+            'gateway_jwt_cache_bytes', 'Estimated JWT cache memory use', value=stats['bytes']
+        )
+
+
+class ResilienceCollector:
+    """Reports circuit breaker state and upstream retry counts at scrape time."""
+
+    def collect(self):
+        state = GaugeMetricFamily(
+            'gateway_circuit_state',
+            'Circuit breaker state by service (1 for the current state)',
+            labels=['service', 'state'],
+        )
+        opened = CounterMetricFamily(
+            'gateway_circuit_opened',
+            'Times the circuit breaker has opened',
+            labels=['service'],
+        )
+        rejected = CounterMetricFamily(
+            'gateway_circuit_rejected',
+            'Requests failed fast because the circuit was open',
+            labels=['service'],
+        )
+        retries = CounterMetricFamily(
+            'gateway_upstream_retries',
+            'Upstream retries attempted',
+            labels=['service'],
+        )
+        denied = CounterMetricFamily(
+            'gateway_upstream_retries_denied',
+            'Failed upstream attempts that were not retried, by reason',
+            labels=['service', 'reason'],
+        )
+        for service, guard in service_guards.items():
+            stats = guard.stats()
+            for circuit_state in CircuitState:
+                state.add_metric(
+                    [service, circuit_state.value], int(stats['state'] == circuit_state.value)
+                )
+            opened.add_metric([service], stats['times_opened'])
+            rejected.add_metric([service], stats['rejected'])
+            retries.add_metric([service], stats['retries'])
+            for reason, count in stats['retries_denied'].items():
+                denied.add_metric([service, reason], count)
+        yield state
+        yield opened
+        yield rejected
+        yield retries
+        yield denied
+
+
+class HedgingCollector:
+    """Reports how often hedged requests fire and win at scrape time."""
+
+    def collect(self):
+        hedges = CounterMetricFamily(
+            'gateway_hedged_requests',
+            'Hedge decisions by service and outcome',
+            labels=['service', 'outcome'],
+        )
+        delay = GaugeMetricFamily(
+            'gateway_hedge_delay_seconds',
+            'Current hedge delay (recent p95) by service',
+            labels=['service'],
+        )
+        for service, hedger in hedgers.items():
+            stats = hedger.stats()
+            for outcome in ('fired', 'won', 'denied'):
+                hedges.add_metric([service, outcome], stats[outcome])
+            if hedger.delay() is not None:
+                delay.add_metric([service], hedger.delay())
+        yield hedges
+        yield delay
+
+
+class ResponseCacheCollector:
+    """Reports response cache hit ratio inputs and memory use at scrape time."""
+
+    def collect(self):
+        stats = response_cache.stats()
+        lookups = CounterMetricFamily(
+            'gateway_response_cache_lookups',
+            'Response cache lookups by result',
+            labels=['result'],
+        )
+        lookups.add_metric(['hit'], stats['hits'])
+        lookups.add_metric(['revalidated'], stats['revalidated'])
+        lookups.add_metric(['miss'], stats['misses'])
+        yield lookups
+        yield CounterMetricFamily(
+            'gateway_response_cache_evictions',
+            'Cached responses evicted to stay within limits',
+            value=stats['evictions'],
+        )
+        yield GaugeMetricFamily(
+            'gateway_response_cache_entries', 'Responses currently cached', value=stats['entries']
+        )
+        yield GaugeMetricFamily(
+            'gateway_response_cache_bytes', 'Estimated response cache memory use', value=stats['bytes']
+        )
+
+
+class CoalescingCollector:
+    """Reports upstream calls saved by request coalescing at scrape time."""
+
+    def collect(self):
+        stats = request_coalescer.stats()
+        yield CounterMetricFamily(
+            'gateway_coalesced_upstream_calls',
+            'Upstream calls made on behalf of coalesced requests',
+            value=stats['leaders'],
+        )
+        yield CounterMetricFamily(
+            'gateway_coalescing_saved_calls',
+            'Requests answered from another request\'s upstream call',
+            value=stats['shared'],
+        )
+        fallbacks = CounterMetricFamily(
+            'gateway_coalescing_fallbacks',
+            'Waiters that made their own upstream call, by reason',
+            labels=['reason'],
+        )
+        fallbacks.add_metric(['timeout'], stats['timeouts'])
+        fallbacks.add_metric(['unshareable'], stats['unshareable'])
+        yield fallbacks
+        yield GaugeMetricFamily(
+            'gateway_coalescing_in_flight', 'Distinct coalesced calls in flight', value=stats['in_flight']
+        )
+
+
+class LogSinkCollector:
+    """Reports log records written, dropped and sampled out at scrape time."""
+
+    def collect(self):
+        stats = log_sink.stats()
+        records = CounterMetricFamily(
+            'gateway_log_records',
+            'Log records by outcome',
+            labels=['outcome'],
+        )
+        records.add_metric(['written'], stats['written'])
+        records.add_metric(['dropped'], stats['dropped'])
+        records.add_metric(['error'], stats['errors'])
+        records.add_metric(['sampled_out'], log_sampler.sampled_out)
+        yield records
+        yield GaugeMetricFamily(
+            'gateway_log_queue_depth', 'Log records waiting to be written', value=stats['queued']
+        )
+
+
+class TracingCollector:
+    """Reports tail-sampling decisions of the span recorder at scrape time."""
+
+    def collect(self):
+        stats = tracer.stats()
+        traces = CounterMetricFamily(
+            'gateway_traces',
+            'Local traces by tail-sampling outcome',
+            labels=['outcome'],
+        )
+        traces.add_metric(['exported'], stats['exported'])
+        traces.add_metric(['discarded'], stats['discarded'])
+        yield traces
+        yield CounterMetricFamily(
+            'gateway_trace_spans_dropped',
+            'Spans dropped for ending after their trace or exceeding the per-trace limit',
+            value=stats['spans_dropped'],
+        )
+
+
+class AdmissionCollector:
+    """Reports adaptive concurrency limits, queue depth and shed requests at scrape time."""
+
+    def collect(self):
+        limit = GaugeMetricFamily(
+            'gateway_admission_limit', 'Current adaptive concurrency limit', labels=['service']
+        )
+        in_flight = GaugeMetricFamily(
+            'gateway_admission_in_flight', 'Upstream calls holding an admission slot', labels=['service']
+        )
+        queued = GaugeMetricFamily(
+            'gateway_admission_queue_depth', 'Requests waiting for an admission slot', labels=['service']
+        )
+        shed = CounterMetricFamily(
+            'gateway_admission_shed',
+            'Requests rejected with 503 by admission control, by reason',
+            labels=['service', 'reason'],
+        )
+        for service, bulkhead in bulkheads.items():
+            stats = bulkhead.stats()
+            limit.add_metric([service], stats['limit'])
+            in_flight.add_metric([service], stats['in_flight'])
+            queued.add_metric([service], stats['queued'])
+            shed.add_metric([service, 'queue_full'], stats['shed_queue_full'])
+            shed.add_metric([service, 'timeout'], stats['shed_timeout'])
+        yield limit
+        yield in_flight
+        yield queued
+        yield shed
+
+
+SCRAPE_TIME_COLLECTORS = (
+    UpstreamPoolCollector(),
+    LoadBalancerCollector(),
+    AdaptiveTimeoutCollector(),
+    TokenCacheCollector(),
+    ResilienceCollector(),
+    HedgingCollector(),
+    ResponseCacheCollector(),
+    CoalescingCollector(),
+    LogSinkCollector(),
+    TracingCollector(),
+    AdmissionCollector(),
+)
+
+# With several workers (METRICS_MULTIPROCESS_DIR) a scrape reports all of them: the
+# counters and histograms above summed from their mmap'd files, and every worker's
+# scrape-time collectors labelled with its pid
+worker_collectors: Optional[WorkerCollectors] = None
+if settings.METRICS_MULTIPROCESS_DIR:
+    worker_collectors = WorkerCollectors(
+        settings.METRICS_MULTIPROCESS_DIR,
+        SCRAPE_TIME_COLLECTORS,
+        interval=settings.METRICS_WORKER_SNAPSHOT_INTERVAL,
+    )
+    exposition_registry = CollectorRegistry()
+    MultiProcessCollector(exposition_registry, path=settings.METRICS_MULTIPROCESS_DIR)
+    exposition_registry.register(worker_collectors)
+else:
+    for collector in SCRAPE_TIME_COLLECTORS:
+        REGISTRY.register(collector)
+    exposition_registry = REGISTRY
+
+
 class MetricsMiddleware(BaseHTTPMiddleware):
     """Starlette-compatible middleware for collecting Prometheus metrics."""
 
     async def dispatch(self, request: Request, call_next):
-        # Extract service from path
-        path_parts = request.url.path.strip("/").split("/")
-        service = path_parts[0] if path_parts else "unknown"
+        service, route = route_labeler.labels(request.url.path)
 
         start_time = time.time()
         try:
             response = await call_next(request)
 
-            REQUEST_COUNT.labels(service=service, status=response.status_code).inc()
+            REQUEST_COUNT.labels(service=service, route=route, status=response.status_code).inc()
             return response
         except Exception as e:
             UPSTREAM_ERRORS.labels(
@@ -45,9 +464,21 @@ class MetricsMiddleware(BaseHTTPMiddleware):
             ).inc()
             raise
         finally:
-            REQUEST_LATENCY.labels(service=service).observe(time.time() - start_time)
+            REQUEST_LATENCY.labels(service=service, route=route).observe(time.time() - start_time)
+
+
+def render_metrics(openmetrics_format: bool = False) -> bytes:
+    if openmetrics_format:
+        return openmetrics.generate_latest(exposition_registry)
+    return generate_latest(exposition_registry)
+
+
+metrics_exposition = CachedExposition(render_metrics, ttl=settings.METRICS_CACHE_TTL)
 
 
-def get_metrics():
-    """Get current metrics in Prometheus format."""
-    return generate_latest()
+def get_metrics(openmetrics_format: bool = False):
+    """
+    Get current metrics in Prometheus (or OpenMetrics, which carries exemplars) format,
+    rendered at most once per METRICS_CACHE_TTL.
+    """
+    return metrics_exposition.get(openmetrics_format)
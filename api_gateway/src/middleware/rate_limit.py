@@ -1,49 +1,171 @@
 """Rate limiting middleware."""
-from fastapi import Request, HTTPException
-from datetime import datetime, timedelta
-from typing import Dict
+import asyncio
+import math
+import time
+from typing import Callable, Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+import structlog
+
+from core.config import settings
+
+logger = structlog.get_logger()
+
+
+class TokenBucket:
+    """Per-key limiter state: two floats, no per-request allocations."""
+
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
 
 
 class RateLimiter:
-    def __init__(self, requests_per_minute: int = 60):
+    """
+    Token-bucket rate limiter keyed by client (IP, user or API key).
+
+    Each key may burst up to `burst` requests and is refilled at
+    `requests_per_minute / 60` tokens per second, so memory and time per key
+    are O(1) regardless of traffic. A bucket that has been idle long enough to
+    refill completely is indistinguishable from a fresh one, so the sweeper
+    can drop it without changing any decision.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int = 60,
+        burst: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
         self.requests_per_minute = requests_per_minute
-        self.requests: Dict[str, list] = {}
-    
-    def is_allowed(self, client_ip: str) -> bool:
-        now = datetime.now()
-        minute_ago = now - timedelta(minutes=1)
-        
-        # Clean old requests
-        self.requests[client_ip] = [
-            req_time for req_time in self.requests.get(client_ip, [])
-            if req_time > minute_ago
-        ]
-        
-        # Check rate limit
-        if len(self.requests.get(client_ip, [])) >= self.requests_per_minute:
+        self.capacity = float(burst or requests_per_minute)
+        self.rate = requests_per_minute / 60.0
+        # Seconds after which an untouched bucket is full again
+        self.idle_after = self.capacity / self.rate
+        self.buckets: Dict[str, TokenBucket] = {}
+        self._clock = clock
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def is_allowed(self, key: str, cost: float = 1.0) -> bool:
+        """Take `cost` tokens from `key`'s bucket, all or nothing."""
+        now = self._clock()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if cost > self.capacity:
+                return False
+            self.buckets[key] = TokenBucket(self.capacity - cost, now)
+            return True
+
+        tokens = bucket.tokens + (now - bucket.updated) * self.rate
+        if tokens > self.capacity:
+            tokens = self.capacity
+        bucket.updated = now
+        if tokens < cost:
+            bucket.tokens = tokens
             return False
-        
-        # Add new request
-        if client_ip not in self.requests:
-            self.requests[client_ip] = []
-        self.requests[client_ip].append(now)
+        bucket.tokens = tokens - cost
         return True
 
-rate_limiter = RateLimiter()
+    def retry_after(self, key: str, cost: float = 1.0) -> int:
+        """Whole seconds until `key` has `cost` tokens again."""
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            return 0
+        missing = cost - bucket.tokens - (self._clock() - bucket.updated) * self.rate
+        return max(1, math.ceil(missing / self.rate))
+
+    def sweep(self) -> int:
+        """Evict buckets that have refilled completely; returns how many were dropped."""
+        cutoff = self._clock() - self.idle_after
+        idle = [key for key, bucket in self.buckets.items() if bucket.updated <= cutoff]
+        for key in idle:
+            del self.buckets[key]
+        return len(idle)
+
+    async def _run_sweeper(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            evicted = self.sweep()
+            if evicted:
+                logger.debug("rate_limit_sweep", evicted=evicted, tracked=len(self.buckets))
+
+    def start(self, interval: float = settings.RATE_LIMIT_SWEEP_INTERVAL) -> None:
+        """Start the periodic idle-key sweeper."""
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._run_sweeper(interval))
+
+    async def stop(self) -> None:
+        task, self._sweeper = self._sweeper, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+
+def client_ip_key(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+def user_key(request: Request) -> str:
+    """Authenticated subject, falling back to the client IP for anonymous calls."""
+    user = getattr(request.state, "user", None)
+    if user and user.get("sub"):
+        return f"user:{user['sub']}"
+    return client_ip_key(request)
+
+
+def api_key_key(request: Request) -> str:
+    """`X-API-Key` header, falling back to the client IP."""
+    api_key = request.headers.get("x-api-key")
+    return f"key:{api_key}" if api_key else client_ip_key(request)
+
+
+KEY_FUNCTIONS: Dict[str, Callable[[Request], str]] = {
+    "ip": client_ip_key,
+    "user": user_key,
+    "api_key": api_key_key,
+}
+
+
+def build_rate_limiter() -> RateLimiter:
+    """Limiter for the configured RATE_LIMIT_BACKEND."""
+    if settings.RATE_LIMIT_BACKEND == "shared":
+        from middleware.rate_limit_shared import SharedRateLimiter
+
+        return SharedRateLimiter(
+            path=settings.RATE_LIMIT_SHM_PATH,
+            slots=settings.RATE_LIMIT_SHM_SLOTS,
+            stripes=settings.RATE_LIMIT_SHM_STRIPES,
+            requests_per_minute=settings.RATE_LIMIT_REQUESTS_PER_MINUTE,
+            burst=settings.RATE_LIMIT_BURST or None,
+        )
+    return RateLimiter(
+        requests_per_minute=settings.RATE_LIMIT_REQUESTS_PER_MINUTE,
+        burst=settings.RATE_LIMIT_BURST or None,
+    )
+
+
+rate_limiter = build_rate_limiter()
+rate_limit_key = KEY_FUNCTIONS[settings.RATE_LIMIT_KEY]
+
 
 async def rate_limit_middleware(request: Request, call_next):
-    """Limit requests per client IP."""
-    client_ip = request.client.host if request.client else "unknown"
-    
+    """Limit requests per client key (IP, user or API key; see RATE_LIMIT_KEY)."""
     # Skip rate limiting for health check
     if request.url.path == "/health":
         return await call_next(request)
-    
-    if not rate_limiter.is_allowed(client_ip):
-        raise HTTPException(
+
+    key = rate_limit_key(request)
+    if not rate_limiter.is_allowed(key):
+        return JSONResponse(
             status_code=429,
-            detail="Too many requests",
-            headers={"Retry-After": "60"}
+            content={"detail": "Too many requests"},
+            headers={"Retry-After": str(rate_limiter.retry_after(key))},
         )
-    
-    return await call_next(request)
\ No newline at end of file
+
+    return await call_next(request)
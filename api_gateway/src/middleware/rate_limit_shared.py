@@ -0,0 +1,188 @@
+"""Host-wide rate limiting shared by all gateway worker processes."""
+import asyncio
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import struct
+import time
+from typing import Callable, Optional, Tuple
+
+import structlog
+
+from middleware.rate_limit import RateLimiter
+
+logger = structlog.get_logger()
+
+# File layout: header, then `slots` fixed-size slots split into `stripes` equal stripes.
+HEADER = struct.Struct("<4sIQQ")  # magic, layout version, slots, stripes
+HEADER_SIZE = 64
+MAGIC = b"AFRL"
+LAYOUT_VERSION = 1
+SLOT = struct.Struct("<Qdd")  # key hash (0 = empty), tokens, updated (monotonic seconds)
+
+
+def key_hash(key: str) -> int:
+    """Stable 64-bit key hash; builtin hash() is salted per process and can't be shared."""
+    value = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little")
+    return value or 1
+
+
+class SharedRateLimiter(RateLimiter):
+    """
+    Token-bucket limiter whose buckets live in a memory-mapped file.
+
+    Every worker on the host maps the same file, so they enforce one budget
+    without a network round trip. The table is open addressing over fixed-size
+    slots, split into stripes: a key hashes to a home slot, probes linearly
+    (wrapping) inside its stripe only, and each update holds an fcntl byte-range
+    lock on just that stripe. Buckets that have refilled completely are free
+    for reuse, so the table does not need deletes to stay bounded. If a stripe
+    is full of active keys the request is allowed (fail open) and counted.
+
+    `time.monotonic()` is CLOCK_MONOTONIC on Linux, which is system-wide, so
+    timestamps written by one process are meaningful to the others.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        slots: int = 65536,
+        stripes: int = 64,
+        max_probe: int = 16,
+        requests_per_minute: int = 60,
+        burst: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        super().__init__(requests_per_minute=requests_per_minute, burst=burst, clock=clock)
+        self.path = path
+        self.overflows = 0
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        self.slots, self.stripes = self._init_layout(slots, stripes)
+        self.stripe_slots = self.slots // self.stripes
+        self.max_probe = min(max_probe, self.stripe_slots)
+        self._map = mmap.mmap(self._fd, HEADER_SIZE + self.slots * SLOT.size)
+
+    def _init_layout(self, slots: int, stripes: int) -> Tuple[int, int]:
+        """Create the table or adopt the layout of the one another worker created."""
+        if slots % stripes:
+            raise ValueError("RATE_LIMIT_SHM_SLOTS must be a multiple of RATE_LIMIT_SHM_STRIPES")
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, HEADER_SIZE, 0)
+        try:
+            header = os.pread(self._fd, HEADER.size, 0)
+            if len(header) == HEADER.size:
+                magic, version, existing_slots, existing_stripes = HEADER.unpack(header)
+                if magic == MAGIC and version == LAYOUT_VERSION:
+                    if (existing_slots, existing_stripes) != (slots, stripes):
+                        logger.warning(
+                            "rate_limit_shm_layout_mismatch", path=self.path,
+                            slots=existing_slots, stripes=existing_stripes,
+                        )
+                    return existing_slots, existing_stripes
+            os.ftruncate(self._fd, HEADER_SIZE + slots * SLOT.size)
+            os.pwrite(self._fd, HEADER.pack(MAGIC, LAYOUT_VERSION, slots, stripes), 0)
+            return slots, stripes
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, HEADER_SIZE, 0)
+
+    def _locate(self, h: int) -> Tuple[int, int]:
+        """(first slot of the stripe, home slot offset inside it) for a key hash."""
+        index = h % self.slots
+        stripe_start = index - index % self.stripe_slots
+        return stripe_start, index - stripe_start
+
+    def _lock(self, stripe_start: int, op: int) -> None:
+        fcntl.lockf(
+            self._fd, op, self.stripe_slots * SLOT.size, HEADER_SIZE + stripe_start * SLOT.size
+        )
+
+    def _offset(self, stripe_start: int, home: int, probe: int) -> int:
+        slot = stripe_start + (home + probe) % self.stripe_slots
+        return HEADER_SIZE + slot * SLOT.size
+
+    def is_allowed(self, key: str, cost: float = 1.0) -> bool:
+        h = key_hash(key)
+        stripe_start, home = self._locate(h)
+        self._lock(stripe_start, fcntl.LOCK_EX)
+        try:
+            now = self._clock()
+            free_offset = -1
+            reclaim_before = now - self.idle_after
+            for probe in range(self.max_probe):
+                offset = self._offset(stripe_start, home, probe)
+                slot_hash, tokens, updated = SLOT.unpack_from(self._map, offset)
+                if slot_hash == h:
+                    tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+                    allowed = tokens >= cost
+                    SLOT.pack_into(self._map, offset, h, tokens - cost if allowed else tokens, now)
+                    return allowed
+                if free_offset < 0 and (slot_hash == 0 or updated <= reclaim_before):
+                    free_offset = offset
+
+            if free_offset < 0:
+                self.overflows += 1
+                return True
+            if cost > self.capacity:
+                return False
+            SLOT.pack_into(self._map, free_offset, h, self.capacity - cost, now)
+            return True
+        finally:
+            self._lock(stripe_start, fcntl.LOCK_UN)
+
+    def retry_after(self, key: str, cost: float = 1.0) -> int:
+        h = key_hash(key)
+        stripe_start, home = self._locate(h)
+        # Shared lock: another worker may be halfway through writing the slot
+        self._lock(stripe_start, fcntl.LOCK_SH)
+        try:
+            for probe in range(self.max_probe):
+                slot_hash, tokens, updated = SLOT.unpack_from(
+                    self._map, self._offset(stripe_start, home, probe)
+                )
+                if slot_hash == h:
+                    missing = cost - tokens - (self._clock() - updated) * self.rate
+                    return max(1, math.ceil(missing / self.rate))
+            return 0
+        finally:
+            self._lock(stripe_start, fcntl.LOCK_UN)
+
+    def sweep_stripe(self, stripe_start: int) -> int:
+        """Clear fully refilled slots of one stripe so its probe windows stay short."""
+        evicted = 0
+        self._lock(stripe_start, fcntl.LOCK_EX)
+        try:
+            cutoff = self._clock() - self.idle_after
+            for slot in range(stripe_start, stripe_start + self.stripe_slots):
+                offset = HEADER_SIZE + slot * SLOT.size
+                slot_hash, _, updated = SLOT.unpack_from(self._map, offset)
+                if slot_hash and updated <= cutoff:
+                    SLOT.pack_into(self._map, offset, 0, 0.0, 0.0)
+                    evicted += 1
+        finally:
+            self._lock(stripe_start, fcntl.LOCK_UN)
+        return evicted
+
+    def sweep(self) -> int:
+        """Sweep every stripe at once (tests and tooling; the sweeper spreads them out)."""
+        return sum(
+            self.sweep_stripe(stripe_start) for stripe_start in range(0, self.slots, self.stripe_slots)
+        )
+
+    async def _run_sweeper(self, interval: float) -> None:
+        # One stripe per tick, so a pass over the whole table takes `interval`
+        # and no tick blocks the event loop for more than one stripe's walk.
+        # (Not offloaded to a thread: fcntl locks belong to the process, so
+        # they wouldn't exclude this worker's own event loop.)
+        tick = interval / self.stripes
+        while True:
+            evicted = 0
+            for stripe_start in range(0, self.slots, self.stripe_slots):
+                await asyncio.sleep(tick)
+                evicted += self.sweep_stripe(stripe_start)
+            if evicted:
+                logger.debug("rate_limit_sweep", evicted=evicted)
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
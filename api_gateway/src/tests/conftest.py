@@ -0,0 +1,119 @@
+# conftest.py
+import inspect
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+from httpx import AsyncClient, ASGITransport
+from jose import jwt
+
+# Make `core`, `middleware` and `main` importable the same way the Dockerfile does
+src_root = str(Path(__file__).parent.parent)
+if src_root not in sys.path:
+    sys.path.insert(0, src_root)
+
+from core.admission import build_bulkheads, bulkheads
+from core.balancer import balancers, build_balancers
+from core.cache import response_cache
+from core.config import settings
+from core.health import HealthAggregator
+from core.pools import UpstreamPools
+from core.resilience import build_guards, service_guards
+from core.timeouts import adaptive_timeouts
+from main import app
+from middleware.metrics import metrics_exposition
+from middleware.rate_limit import rate_limiter
+
+
+class UpstreamStub:
+    """Records proxied requests and answers them with a configurable handler."""
+
+    def __init__(self):
+        self.requests = []
+        self.handler = lambda request: httpx.Response(200, json={"ok": True})
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        self.requests.append((request, body))
+        response = self.handler(request)
+        if inspect.isawaitable(response):
+            response = await response
+        # Hand the gateway an unread stream, as a real connection would
+        return httpx.Response(response.status_code, headers=response.headers, stream=response.stream)
+
+
+@pytest.fixture(autouse=True)
+def reset_rate_limiter(monkeypatch):
+    """Give every test its own rate-limit budget."""
+    monkeypatch.setattr(rate_limiter, "buckets", {})
+
+
+@pytest.fixture(autouse=True)
+def reset_response_cache():
+    """Start every test with an empty response cache."""
+    response_cache.clear()
+    yield
+    response_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_service_guards(monkeypatch):
+    """Fresh circuit breakers and retry budgets for every test."""
+    for name, guard in build_guards(service_guards).items():
+        monkeypatch.setitem(service_guards, name, guard)
+
+
+@pytest.fixture(autouse=True)
+def reset_bulkheads(monkeypatch):
+    """Fresh admission limits and queues for every test."""
+    for name, bulkhead in build_bulkheads(bulkheads).items():
+        monkeypatch.setitem(bulkheads, name, bulkhead)
+
+
+@pytest.fixture(autouse=True)
+def reset_balancers(monkeypatch):
+    """Fresh endpoint load and ejection state for every test."""
+    for name, balancer in build_balancers(settings.SERVICE_ROUTES).items():
+        monkeypatch.setitem(balancers, name, balancer)
+
+
+@pytest.fixture(autouse=True)
+def reset_adaptive_timeouts(monkeypatch):
+    """No route latency history carried between tests."""
+    monkeypatch.setattr(adaptive_timeouts, "routes", {})
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics_exposition():
+    """Render /metrics afresh in every test."""
+    metrics_exposition.clear()
+
+
+@pytest.fixture
+def upstream():
+    """Fake upstream services reached through the gateway connection pools."""
+    return UpstreamStub()
+
+
+@pytest.fixture
+async def client(upstream):
+    """Gateway test client whose upstream calls are served by `upstream`."""
+    pools = UpstreamPools(settings.SERVICE_ROUTES, transport=httpx.MockTransport(upstream))
+    app.state.pools = pools
+    app.state.health = HealthAggregator(settings.SERVICE_ROUTES, pools)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as test_client:
+        try:
+            yield test_client
+        finally:
+            await pools.aclose()
+            del app.state.pools
+            del app.state.health
+
+
+@pytest.fixture
+def auth_headers():
+    """Bearer token signed with the gateway's JWT settings."""
+    token = jwt.encode({"sub": "demo"}, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+    return {"Authorization": f"Bearer {token}"}
@@ -0,0 +1,179 @@
+import asyncio
+
+import httpx
+import pytest
+
+from core.admission import PRIORITY_HIGH, AIMDLimit, Bulkhead, Overloaded, bulkheads
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _bulkhead(limit=1, max_queue=10, max_wait=1.0, clock=None):
+    clock = clock or FakeClock()
+    return Bulkhead(
+        AIMDLimit(initial=limit, min_limit=1, max_limit=100, clock=clock),
+        max_queue=max_queue,
+        max_wait=max_wait,
+        clock=clock,
+    )
+
+
+class TestAIMDLimit:
+    def test_grows_while_saturated_and_latency_is_normal(self):
+        limit = AIMDLimit(initial=10, min_limit=1, max_limit=100, clock=FakeClock())
+
+        for _ in range(11):
+            limit.on_sample(0.05, in_flight=10, overloaded=False)
+
+        assert limit.current == 11
+
+    def test_does_not_grow_while_underused(self):
+        limit = AIMDLimit(initial=10, min_limit=1, max_limit=100, clock=FakeClock())
+
+        for _ in range(50):
+            limit.on_sample(0.05, in_flight=2, overloaded=False)
+
+        assert limit.current == 10
+
+    def test_backs_off_once_per_round_trip(self):
+        clock = FakeClock()
+        limit = AIMDLimit(initial=100, min_limit=1, max_limit=100, backoff_ratio=0.5, clock=clock)
+        limit.on_sample(0.1, in_flight=1, overloaded=False)
+
+        limit.on_sample(1.0, in_flight=100, overloaded=False)
+        limit.on_sample(1.0, in_flight=100, overloaded=False)
+        assert limit.current == 50
+
+        clock.now += 1
+        limit.on_sample(0.1, in_flight=100, overloaded=True)
+        assert limit.current == 25
+
+    def test_never_drops_below_minimum(self):
+        limit = AIMDLimit(initial=4, min_limit=3, max_limit=100, backoff_ratio=0.1, clock=FakeClock())
+
+        limit.on_sample(0.1, in_flight=4, overloaded=True)
+
+        assert limit.current == 3
+
+
+@pytest.mark.asyncio
+class TestBulkhead:
+    async def test_queues_over_the_limit_and_hands_slots_on(self):
+        bulkhead = _bulkhead(limit=1)
+        first = await bulkhead.acquire("a")
+
+        waiter = asyncio.ensure_future(bulkhead.acquire("b"))
+        await asyncio.sleep(0)
+        assert bulkhead.queued == 1 and not waiter.done()
+
+        bulkhead.release(first)
+        second = await waiter
+        assert bulkhead.in_flight == 1 and bulkhead.queued == 0
+        bulkhead.release(second)
+        assert bulkhead.in_flight == 0
+
+    async def test_round_robin_across_keys(self):
+        bulkhead = _bulkhead(limit=1)
+        permit = await bulkhead.acquire("busy")
+        order = []
+
+        async def request(key):
+            granted = await bulkhead.acquire(key)
+            order.append(key)
+            bulkhead.release(granted)
+
+        tasks = [asyncio.ensure_future(request(key)) for key in ("busy", "busy", "busy", "quiet")]
+        await asyncio.sleep(0)
+        bulkhead.release(permit)
+        await asyncio.gather(*tasks)
+
+        assert order == ["busy", "quiet", "busy", "busy"]
+
+    async def test_high_priority_goes_first(self):
+        bulkhead = _bulkhead(limit=1)
+        permit = await bulkhead.acquire("a")
+        order = []
+
+        async def request(key, priority):
+            granted = await bulkhead.acquire(key, priority)
+            order.append(key)
+            bulkhead.release(granted)
+
+        normal = asyncio.ensure_future(request("normal", 1))
+        await asyncio.sleep(0)
+        health = asyncio.ensure_future(request("health", PRIORITY_HIGH))
+        await asyncio.sleep(0)
+        bulkhead.release(permit)
+        await asyncio.gather(normal, health)
+
+        assert order == ["health", "normal"]
+
+    async def test_sheds_when_queue_is_full(self):
+        bulkhead = _bulkhead(limit=1, max_queue=1)
+        permit = await bulkhead.acquire("a")
+        waiter = asyncio.ensure_future(bulkhead.acquire("b"))
+        await asyncio.sleep(0)
+
+        with pytest.raises(Overloaded) as shed:
+            await bulkhead.acquire("c")
+
+        assert shed.value.reason == "queue_full"
+        assert shed.value.retry_after >= 1
+        assert bulkhead.stats()["shed_queue_full"] == 1
+        bulkhead.release(permit)
+        bulkhead.release(await waiter)
+
+    async def test_sheds_after_max_wait(self):
+        bulkhead = _bulkhead(limit=1, max_wait=0.01)
+        permit = await bulkhead.acquire("a")
+
+        with pytest.raises(Overloaded) as shed:
+            await bulkhead.acquire("b")
+
+        assert shed.value.reason == "timeout"
+        assert bulkhead.queued == 0
+        bulkhead.release(permit)
+        assert bulkhead.in_flight == 0
+
+    async def test_cancelled_waiter_leaves_the_queue(self):
+        bulkhead = _bulkhead(limit=1)
+        permit = await bulkhead.acquire("a")
+        waiter = asyncio.ensure_future(bulkhead.acquire("b"))
+        await asyncio.sleep(0)
+
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        bulkhead.release(permit)
+
+        assert bulkhead.queued == 0
+        assert bulkhead.in_flight == 0
+
+
+@pytest.mark.asyncio
+class TestAdmissionControl:
+    async def test_excess_requests_get_503_with_retry_after(self, client, upstream, auth_headers, monkeypatch):
+        monkeypatch.setitem(bulkheads, "orders", _bulkhead(limit=1, max_queue=0))
+        release = asyncio.Event()
+
+        async def slow(request):
+            await release.wait()
+            return httpx.Response(200, json={"ok": True})
+
+        upstream.handler = slow
+        first = asyncio.ensure_future(client.post("/api/v1/orders", headers=auth_headers, json={}))
+        while not upstream.requests:
+            await asyncio.sleep(0)
+
+        shed = await client.post("/api/v1/orders", headers=auth_headers, json={})
+        release.set()
+
+        assert shed.status_code == 503
+        assert int(shed.headers["retry-after"]) >= 1
+        assert (await first).status_code == 200
+        assert len(upstream.requests) == 1
@@ -0,0 +1,146 @@
+import asyncio
+
+import httpx
+import pytest
+
+from core.balancer import Endpoint, EndpointDiscovery, LoadBalancer, balancers
+from core.config import settings
+
+ORIGIN = "http://order_service:9001"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _balancer(*urls, clock=None, **kwargs):
+    return LoadBalancer(
+        ORIGIN, [Endpoint(url) for url in urls], clock=clock or FakeClock(), **kwargs
+    )
+
+
+class TestLoadBalancer:
+    def test_prefers_the_less_loaded_endpoint(self):
+        balancer = _balancer("http://a:1", "http://b:1")
+        busy = balancer.endpoints[0]
+        busy.in_flight = 5
+
+        picks = [balancer.pick() for _ in range(5)]
+
+        assert all(endpoint is not busy for endpoint in picks)
+
+    def test_prefers_the_faster_endpoint(self):
+        balancer = _balancer("http://a:1", "http://b:1")
+        slow, fast = balancer.endpoints
+        balancer.release(balancer.pick(exclude=[fast]), latency=0.5)
+        balancer.release(balancer.pick(exclude=[slow]), latency=0.01)
+
+        for _ in range(10):
+            endpoint = balancer.pick()
+            assert endpoint is fast
+            balancer.release(endpoint, latency=0.01)
+
+    def test_avoids_excluded_endpoints(self):
+        balancer = _balancer("http://a:1", "http://b:1")
+        first = balancer.pick()
+
+        assert balancer.pick(exclude=[first]) is not first
+
+    def test_ejects_after_consecutive_failures_until_the_ejection_time_passes(self):
+        clock = FakeClock()
+        balancer = _balancer(
+            "http://a:1", "http://b:1", clock=clock, consecutive_failures=2, ejection_time=30
+        )
+        bad, good = balancer.endpoints
+        for _ in range(2):
+            balancer.release(balancer.pick(exclude=[good]), failed=True)
+
+        assert balancer.stats()["http://a:1"]["ejected"]
+        assert all(balancer.pick() is good for _ in range(10))
+
+        clock.now += 31
+        assert not balancer.stats()["http://a:1"]["ejected"]
+        assert bad.ejections == 1
+
+    def test_never_ejects_more_than_the_allowed_share(self):
+        balancer = _balancer("http://a:1", "http://b:1", consecutive_failures=1, max_ejection_percent=50)
+        first, second = balancer.endpoints
+
+        balancer.release(balancer.pick(exclude=[second]), failed=True)
+        balancer.release(balancer.pick(exclude=[first]), failed=True)
+
+        assert [endpoint.ejections for endpoint in balancer.endpoints] == [1, 0]
+
+    def test_update_keeps_surviving_endpoint_state(self):
+        balancer = _balancer("http://a:1", "http://b:1")
+        survivor = balancer.endpoints[1]
+        survivor.latency = 0.2
+
+        balancer.update([("http://b:1", None), ("http://c:1", None)])
+
+        assert balancer.endpoints[0] is survivor
+        assert [endpoint.url for endpoint in balancer.endpoints] == ["http://b:1", "http://c:1"]
+
+    def test_rewrites_urls_onto_the_endpoint(self):
+        balancer = _balancer("http://10.0.0.7:9001")
+
+        assert balancer.url(balancer.endpoints[0], f"{ORIGIN}/42?x=1") == "http://10.0.0.7:9001/42?x=1"
+
+
+@pytest.mark.asyncio
+class TestEndpointDiscovery:
+    async def test_one_endpoint_per_address_with_original_host(self, monkeypatch):
+        answers = [["10.0.0.2", "10.0.0.1"], OSError("resolver down")]
+
+        async def fake_getaddrinfo(host, port, **kwargs):
+            answer = answers.pop(0)
+            if isinstance(answer, Exception):
+                raise answer
+            return [(None, None, None, "", (address, port)) for address in answer]
+
+        monkeypatch.setattr(asyncio.get_running_loop(), "getaddrinfo", fake_getaddrinfo)
+        balancer = _balancer(ORIGIN)
+        discovery = EndpointDiscovery({"orders": {"endpoints": [ORIGIN]}}, {"orders": balancer})
+
+        await discovery.refresh()
+        await discovery.refresh()  # failed lookups keep the last good answer
+
+        assert [(e.url, e.authority) for e in balancer.endpoints] == [
+            ("http://10.0.0.1:9001", "order_service:9001"),
+            ("http://10.0.0.2:9001", "order_service:9001"),
+        ]
+
+
+@pytest.mark.asyncio
+class TestBalancedProxy:
+    async def test_spreads_requests_and_retries_on_another_replica(
+        self, client, upstream, auth_headers, monkeypatch
+    ):
+        balancer = _balancer(
+            "http://10.0.0.1:9001", "http://10.0.0.2:9001", consecutive_failures=1
+        )
+        healthy, broken = balancer.endpoints
+        healthy.authority = "order_service:9001"
+        healthy.latency, broken.latency = 0.5, 0.001  # the broken replica looks faster
+        monkeypatch.setitem(balancers, "orders", balancer)
+        monkeypatch.setattr(settings, "RETRY_BACKOFF_MAX", 0.0)
+
+        def handler(request):
+            if request.url.host == "10.0.0.2":
+                raise httpx.ConnectError("refused", request=request)
+            return httpx.Response(200, json={"ok": True})
+
+        upstream.handler = handler
+        for _ in range(4):
+            response = await client.get("/api/v1/orders/42", headers=auth_headers)
+            assert response.status_code == 200
+
+        hosts = [request.url.host for request, _ in upstream.requests]
+        assert hosts == ["10.0.0.2"] + ["10.0.0.1"] * 4
+        assert upstream.requests[1][0].headers["host"] == "order_service:9001"
+        assert broken.ejections == 1
+        assert healthy.in_flight == broken.in_flight == 0
@@ -0,0 +1,135 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from core.config import settings
+from middleware.rate_limit import rate_limiter
+
+
+def _echo(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(200, json={"path": request.url.path, "method": request.method})
+
+
+@pytest.mark.asyncio
+class TestBatch:
+    async def test_runs_items_and_returns_results_in_order(self, client, upstream, auth_headers):
+        upstream.handler = _echo
+
+        response = await client.post("/api/v1/batch", headers=auth_headers, json=[
+            {"id": "order", "path": "/orders/1"},
+            {"id": "me", "path": "/auth/me"},
+            {"id": "pay", "method": "POST", "path": "/api/v1/billing/payments", "body": {"amount": 5}},
+        ])
+
+        assert response.status_code == 200
+        results = response.json()
+        assert [r["id"] for r in results] == ["order", "me", "pay"]
+        assert [r["status"] for r in results] == [200, 200, 200]
+        assert results[0]["body"] == {"path": "/1", "method": "GET"}
+        assert results[2]["body"]["method"] == "POST"
+        payment = next(body for request, body in upstream.requests if request.method == "POST")
+        assert json.loads(payment) == {"amount": 5}
+
+    async def test_items_share_the_batch_credentials(self, client, upstream, auth_headers):
+        response = await client.post("/api/v1/batch", headers=auth_headers, json=[
+            {"path": "/orders/1", "headers": {"Authorization": "Bearer forged", "X-Trace": "t"}},
+        ])
+
+        forwarded = upstream.requests[0][0].headers
+        assert response.json()[0]["status"] == 200
+        assert forwarded["authorization"] == auth_headers["Authorization"]
+        assert forwarded["x-user"] == "demo"
+        assert forwarded["x-trace"] == "t"
+        assert forwarded["x-request-id"].endswith("-0")
+
+    async def test_requires_authentication(self, client):
+        response = await client.post("/api/v1/batch", json=[{"path": "/orders/1"}])
+
+        assert response.status_code == 401
+
+    async def test_per_item_errors(self, client, upstream, auth_headers):
+        upstream.handler = lambda request: httpx.Response(500, text="boom")
+
+        response = await client.post("/api/v1/batch", headers=auth_headers, json=[
+            {"path": "/nowhere/1"},
+            {"path": "/orders/1"},
+        ])
+
+        first, second = response.json()
+        assert first["status"] == 404
+        assert second["status"] == 500
+        assert second["body"] == "boom"
+
+    @pytest.mark.parametrize("payload, code", [
+        ([], 400),
+        ({"requests": "nope"}, 400),
+        ([{"method": "GET"}], 422),
+        ([{"path": "/batch"}], 400),
+    ])
+    async def test_rejects_bad_batches(self, client, auth_headers, payload, code):
+        response = await client.post("/api/v1/batch", headers=auth_headers, json=payload)
+
+        assert response.status_code == code
+
+    async def test_caps_batch_size(self, client, auth_headers, monkeypatch):
+        monkeypatch.setattr(settings, "BATCH_MAX_REQUESTS", 2)
+
+        response = await client.post("/api/v1/batch", headers=auth_headers, json=[{"path": "/orders/1"}] * 3)
+
+        assert response.status_code == 413
+
+    async def test_limits_concurrency_and_enforces_deadline(self, client, upstream, auth_headers, monkeypatch):
+        monkeypatch.setattr(settings, "BATCH_CONCURRENCY", 2)
+        running = peak = 0
+
+        async def slow(request):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.5 if request.url.path == "/slow" else 0.01)
+            running -= 1
+            return httpx.Response(200, json={})
+
+        upstream.handler = slow
+        items = [{"path": "/orders/1"}] * 4 + [{"id": "slow", "path": "/orders/slow", "timeout": 0.1}]
+
+        results = (await client.post("/api/v1/batch", headers=auth_headers, json=items)).json()
+
+        assert peak <= 2
+        assert results[-1]["status"] == 504
+        assert [r["status"] for r in results[:4]] == [200] * 4
+
+    async def test_streams_ndjson_as_items_complete(self, client, upstream, auth_headers):
+        async def handler(request):
+            await asyncio.sleep(0.05 if request.url.path == "/late" else 0)
+            return httpx.Response(200, json={"path": request.url.path})
+
+        upstream.handler = handler
+
+        response = await client.post(
+            "/api/v1/batch",
+            headers={**auth_headers, "Accept": "application/x-ndjson"},
+            json=[{"id": "late", "path": "/orders/late"}, {"id": "early", "path": "/orders/early"}],
+        )
+
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [line["id"] for line in lines] == ["early", "late"]
+        assert [line["index"] for line in lines] == [1, 0]
+
+    async def test_items_are_charged_to_the_rate_limit(self, client, upstream, auth_headers, monkeypatch):
+        monkeypatch.setattr(rate_limiter, "capacity", 4.0)
+
+        first = await client.post("/api/v1/batch", headers=auth_headers, json=[
+            {"path": f"/orders/{i}"} for i in range(3)
+        ])
+        second = await client.post("/api/v1/batch", headers=auth_headers, json=[
+            {"path": f"/orders/{i}"} for i in range(2)
+        ])
+
+        assert first.status_code == 200
+        assert second.status_code == 429
+        assert int(second.headers["retry-after"]) >= 1
+        assert len(upstream.requests) == 3
@@ -0,0 +1,166 @@
+import httpx
+import pytest
+from jose import jwt
+
+from core.cache import ResponseCache, etag_matches, freshness_lifetime, response_cache
+from core.config import settings
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _cache(clock=None, **limits):
+    options = {"max_entries": 10, "max_bytes": 1 << 20, "max_entry_bytes": 1 << 16, "max_ttl": 300}
+    options.update(limits)
+    return ResponseCache(clock=clock or FakeClock(), **options)
+
+
+def _key(path="/orders/1", user="demo"):
+    return ("GET", path, "", user, "")
+
+
+class TestResponseCache:
+    def test_entry_goes_stale_after_lifetime(self):
+        clock = FakeClock()
+        cache = _cache(clock)
+        cache.put(_key(), 200, [], b"{}", etag='"v1"', lifetime=10)
+
+        assert cache.is_fresh(cache.get(_key()))
+        clock.now += 10
+        entry = cache.get(_key())
+        assert entry is not None and not cache.is_fresh(entry)
+
+        cache.refresh(_key(), 5)
+        assert cache.is_fresh(cache.get(_key()))
+
+    def test_byte_budget_evicts_least_recently_used(self):
+        cache = _cache(max_bytes=3 * 1024)
+        for name in ("a", "b"):
+            cache.put(_key(f"/{name}"), 200, [], b"x" * 600, etag=None, lifetime=60)
+        cache.get(_key("/a"))
+        cache.put(_key("/c"), 200, [], b"x" * 600, etag=None, lifetime=60)
+
+        assert cache.get(_key("/b")) is None
+        assert cache.get(_key("/a")) is not None
+        assert cache.stats()["evictions"] == 1
+        assert cache.bytes <= 3 * 1024
+
+    def test_rejects_oversized_entries(self):
+        cache = _cache(max_entry_bytes=1024)
+        assert not cache.put(_key(), 200, [], b"x" * 1024, etag=None, lifetime=60)
+        assert cache.stats()["entries"] == 0
+
+    def test_invalidate_path_drops_every_user_and_query(self):
+        cache = _cache()
+        cache.put(_key(user="a"), 200, [], b"1", etag=None, lifetime=60)
+        cache.put(_key(user="b"), 200, [], b"2", etag=None, lifetime=60)
+        cache.put(_key("/orders/2"), 200, [], b"3", etag=None, lifetime=60)
+
+        assert cache.invalidate_path("/orders/1") == 2
+        assert cache.stats()["entries"] == 1
+
+
+class TestCachePolicy:
+    @pytest.mark.parametrize("headers, expected", [
+        ({"cache-control": "max-age=60"}, 60.0),
+        ({"cache-control": "public, s-maxage=30, max-age=60"}, 30.0),
+        ({"cache-control": "max-age=60", "age": "15"}, 45.0),
+        ({"cache-control": "max-age=9999"}, 300.0),
+        ({"cache-control": "no-cache", "etag": '"v1"'}, 0.0),
+        ({"etag": '"v1"'}, 0.0),
+        ({"cache-control": "no-store, max-age=60"}, None),
+        ({"cache-control": "max-age=60", "set-cookie": "a=1"}, None),
+        ({"cache-control": "max-age=60", "vary": "Accept-Language"}, None),
+        ({"cache-control": "max-age=60", "vary": "Cookie"}, None),
+        ({}, None),
+    ])
+    def test_freshness_lifetime(self, headers, expected):
+        assert freshness_lifetime(httpx.Headers(headers), max_ttl=300) == expected
+
+    def test_etag_matching_is_weak(self):
+        assert etag_matches('"a", W/"v1"', '"v1"')
+        assert etag_matches('"v1"', 'W/"v1"')
+        assert etag_matches("*", '"v1"')
+        assert not etag_matches('"v2"', '"v1"')
+        assert not etag_matches('"v1"', None)
+
+
+@pytest.mark.asyncio
+class TestProxyCaching:
+    async def test_serves_fresh_responses_from_cache(self, client, upstream, auth_headers):
+        upstream.handler = lambda request: httpx.Response(
+            200, json={"id": 1}, headers={"cache-control": "max-age=60", "etag": '"v1"'}
+        )
+
+        hits = response_cache.hits
+        first = await client.get("/api/v1/orders/1", headers=auth_headers)
+        second = await client.get("/api/v1/orders/1", headers=auth_headers)
+
+        assert len(upstream.requests) == 1
+        assert second.json() == first.json() == {"id": 1}
+        assert second.headers["x-cache"] == "HIT"
+        assert second.headers["etag"] == '"v1"'
+
+        not_modified = await client.get(
+            "/api/v1/orders/1", headers={**auth_headers, "If-None-Match": '"v1"'}
+        )
+        assert not_modified.status_code == 304
+        assert response_cache.hits - hits == 2
+
+    async def test_revalidates_stale_entries_with_etag(self, client, upstream, auth_headers):
+        def handler(request):
+            if request.headers.get("if-none-match") == '"v1"':
+                return httpx.Response(304, headers={"etag": '"v1"'})
+            return httpx.Response(200, json={"id": 1}, headers={"etag": '"v1"'})
+
+        upstream.handler = handler
+        await client.get("/api/v1/orders/1", headers=auth_headers)
+        response = await client.get("/api/v1/orders/1", headers=auth_headers)
+
+        assert len(upstream.requests) == 2
+        assert response.status_code == 200
+        assert response.json() == {"id": 1}
+        assert response.headers["x-cache"] == "REVALIDATED"
+
+    async def test_cache_is_scoped_per_user(self, client, upstream):
+        upstream.handler = lambda request: httpx.Response(
+            200, json={"user": request.headers["x-user"]}, headers={"cache-control": "max-age=60"}
+        )
+
+        for user in ("alice", "bob"):
+            token = _bearer(user)
+            response = await client.get("/api/v1/auth/me", headers=token)
+            assert response.json() == {"user": user}
+        assert len(upstream.requests) == 2
+
+    async def test_responses_varying_on_cookie_are_not_shared(self, client, upstream, auth_headers):
+        upstream.handler = lambda request: httpx.Response(
+            200, json={"session": request.headers["cookie"]},
+            headers={"cache-control": "max-age=60", "vary": "Cookie"},
+        )
+
+        for session in ("session=a", "session=b"):
+            response = await client.get("/api/v1/orders/1", headers={**auth_headers, "Cookie": session})
+            assert response.json() == {"session": session}
+        assert len(upstream.requests) == 2
+
+    async def test_unsafe_request_invalidates_path(self, client, upstream, auth_headers):
+        upstream.handler = lambda request: httpx.Response(
+            200, json={"id": 1}, headers={"cache-control": "max-age=60"}
+        )
+
+        await client.get("/api/v1/orders/1", headers=auth_headers)
+        await client.put("/api/v1/orders/1", json={"id": 1}, headers=auth_headers)
+        await client.get("/api/v1/orders/1", headers=auth_headers)
+
+        assert [request.method for request, _ in upstream.requests] == ["GET", "PUT", "GET"]
+
+
+def _bearer(sub):
+    token = jwt.encode({"sub": sub}, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+    return {"Authorization": f"Bearer {token}"}
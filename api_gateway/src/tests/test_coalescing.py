@@ -0,0 +1,164 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi.responses import Response, StreamingResponse
+
+from core.services import Flight, RequestCoalescer, UpstreamStreamingResponse
+
+
+class TrackedStream(httpx.AsyncByteStream):
+    def __init__(self):
+        self.closed = False
+
+    async def __aiter__(self):
+        yield b"big"
+
+    async def aclose(self):
+        self.closed = True
+
+
+def streamed(stream):
+    return UpstreamStreamingResponse(httpx.Response(200, stream=stream), raw_headers=[])
+
+
+class SlowCall:
+    """Upstream call stand-in that blocks until released."""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self, buffer_limit: int = 0) -> Response:
+        self.calls += 1
+        await self.release.wait()
+        return Response(content=b'{"id": 1}', status_code=200)
+
+
+@pytest.mark.asyncio
+class TestRequestCoalescer:
+    async def test_concurrent_requests_share_one_call(self):
+        coalescer = RequestCoalescer(max_wait=5, max_body_bytes=1024)
+        call = SlowCall()
+
+        waiters = [asyncio.ensure_future(coalescer.run("k", call)) for _ in range(5)]
+        await asyncio.sleep(0)
+        call.release.set()
+        responses = await asyncio.gather(*waiters)
+
+        assert call.calls == 1
+        assert {response.body for response in responses} == {b'{"id": 1}'}
+        assert len({id(response) for response in responses}) == 5
+        assert coalescer.stats()["shared"] == 4
+        assert coalescer.stats()["in_flight"] == 0
+
+    async def test_cancelled_leader_does_not_cancel_followers(self):
+        coalescer = RequestCoalescer(max_wait=5, max_body_bytes=1024)
+        call = SlowCall()
+
+        leader = asyncio.ensure_future(coalescer.run("k", call))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(coalescer.run("k", call))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        call.release.set()
+
+        assert (await follower).body == b'{"id": 1}'
+        assert call.calls == 1
+
+    async def test_call_cancelled_when_nobody_waits(self):
+        coalescer = RequestCoalescer(max_wait=5, max_body_bytes=1024)
+        call = SlowCall()
+
+        leader = asyncio.ensure_future(coalescer.run("k", call))
+        await asyncio.sleep(0)
+        flight = coalescer._flights["k"]
+        leader.cancel()
+        await asyncio.gather(leader, flight.task, return_exceptions=True)
+
+        assert flight.task.cancelled()
+        assert "k" not in coalescer._flights
+
+    async def test_follower_falls_back_after_max_wait(self):
+        coalescer = RequestCoalescer(max_wait=0.01, max_body_bytes=1024)
+        stuck = SlowCall()
+        leader = asyncio.ensure_future(coalescer.run("k", stuck))
+        await asyncio.sleep(0)
+
+        async def own_call(buffer_limit: int = 0):
+            return Response(content=b"own")
+
+        async def follower_call(buffer_limit: int = 0):
+            return await (stuck(buffer_limit) if buffer_limit else own_call())
+
+        assert (await coalescer.run("k", follower_call)).body == b"own"
+        assert coalescer.stats()["timeouts"] == 1
+        stuck.release.set()
+        await leader
+
+    async def test_streamed_result_goes_to_one_waiter(self):
+        coalescer = RequestCoalescer(max_wait=5, max_body_bytes=1024)
+        release = asyncio.Event()
+        calls = []
+
+        async def call(buffer_limit: int = 0):
+            calls.append(buffer_limit)
+            await release.wait()
+            return StreamingResponse(iter([b"big"]))
+
+        waiters = [asyncio.ensure_future(coalescer.run("k", call)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*waiters)
+
+        assert calls == [1024, 0, 0]
+        assert coalescer.stats()["unshareable"] == 2
+
+    async def test_single_waiter_keeps_its_streamed_result(self):
+        coalescer = RequestCoalescer(max_wait=5, max_body_bytes=1024)
+        stream = TrackedStream()
+
+        async def call(buffer_limit: int = 0):
+            return streamed(stream)
+
+        response = await coalescer.run("k", call)
+
+        assert response.upstream.stream is stream
+        assert not stream.closed
+        assert coalescer.stats()["unshareable"] == 0
+
+    async def test_abandoned_stream_is_closed_in_a_referenced_task(self):
+        coalescer = RequestCoalescer(max_wait=5, max_body_bytes=1024)
+        stream = TrackedStream()
+        task = asyncio.get_running_loop().create_future()
+        task.set_result(streamed(stream))
+
+        coalescer._abandon(Flight(task))
+
+        assert len(coalescer._closing) == 1
+        await asyncio.gather(*coalescer._closing)
+        assert stream.closed
+        assert not coalescer._closing
+
+
+@pytest.mark.asyncio
+class TestProxyCoalescing:
+    async def test_identical_gets_reach_upstream_once(self, client, upstream, auth_headers):
+        release = asyncio.Event()
+
+        async def slow(request):
+            await release.wait()
+            return httpx.Response(200, json={"id": 42})
+
+        upstream.handler = slow
+        requests = [
+            asyncio.ensure_future(client.get("/api/v1/orders/42", headers=auth_headers))
+            for _ in range(4)
+        ]
+        await asyncio.sleep(0.05)
+        release.set()
+        responses = await asyncio.gather(*requests)
+
+        assert [response.json() for response in responses] == [{"id": 42}] * 4
+        assert len(upstream.requests) == 1
@@ -0,0 +1,143 @@
+import gzip
+import json
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import StreamingResponse
+from starlette.routing import Route
+
+from core.cache import response_cache
+from core.compression import (
+    accepted_encodings,
+    choose_encoding,
+    compress,
+    compression_level,
+    negotiate,
+)
+from middleware.compression import CompressionMiddleware
+
+PAYLOAD = {"items": [{"id": i, "name": f"order-{i}"} for i in range(200)]}
+LEVELS = {"application/json": {"zstd": 3, "gzip": 6}, "text/*": {"gzip": 5}}
+
+
+class TestNegotiation:
+    @pytest.mark.parametrize("header, expected", [
+        ("", None),
+        ("gzip", "gzip"),
+        ("gzip, zstd", "zstd"),
+        ("gzip;q=1.0, zstd;q=0.5", "gzip"),
+        ("zstd;q=0, *", "br"),
+        ("identity", None),
+        ("gzip;q=0", None),
+    ])
+    def test_prefers_highest_q_then_server_order(self, header, expected):
+        assert negotiate(header, ["zstd", "br", "gzip"]) == expected
+
+    def test_equivalent_headers_share_a_cache_key_component(self):
+        assert accepted_encodings("gzip, deflate, br") == accepted_encodings("br,deflate,GZIP;q=1")
+        assert accepted_encodings("gzip;q=0, br") == "br"
+
+    @pytest.mark.parametrize("content_type, encoding, expected", [
+        ("application/json", "gzip", 6),
+        ("application/json; charset=utf-8", "zstd", 3),
+        ("text/html", "gzip", 5),
+        ("text/html", "zstd", None),
+        ("text/event-stream", "gzip", None),
+        ("image/png", "gzip", None),
+        ("", "gzip", None),
+    ])
+    def test_levels_per_media_type(self, content_type, encoding, expected):
+        assert compression_level(content_type, encoding, LEVELS) == expected
+
+    def test_skips_codings_without_a_compressor(self):
+        assert choose_encoding("unknown, gzip", "application/json", ["unknown", "gzip"], LEVELS) == ("gzip", 6)
+
+    def test_gzip_round_trip(self):
+        body = json.dumps(PAYLOAD).encode()
+
+        assert gzip.decompress(compress(body, "gzip", 6)) == body
+
+
+@pytest.mark.asyncio
+class TestGatewayCompression:
+    async def test_compresses_identity_upstream_bodies(self, client, upstream, auth_headers):
+        upstream.handler = lambda request: httpx.Response(200, json=PAYLOAD)
+
+        response = await client.get(
+            "/api/v1/orders/list", headers={**auth_headers, "Accept-Encoding": "gzip"}
+        )
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert "accept-encoding" in response.headers["vary"].lower()
+        assert response.json() == PAYLOAD
+
+    async def test_small_bodies_are_not_compressed(self, client, upstream, auth_headers):
+        response = await client.get("/api/v1/orders/1", headers={**auth_headers, "Accept-Encoding": "gzip"})
+
+        assert "content-encoding" not in response.headers
+
+    async def test_encoded_upstream_bodies_pass_through(self, client, upstream, auth_headers):
+        encoded = gzip.compress(json.dumps(PAYLOAD).encode(), 1)
+        upstream.handler = lambda request: httpx.Response(
+            200, content=encoded,
+            headers={"content-type": "application/json", "content-encoding": "gzip"},
+        )
+
+        response = await client.get(
+            "/api/v1/orders/list", headers={**auth_headers, "Accept-Encoding": "gzip"}
+        )
+
+        assert upstream.requests[0][0].headers["accept-encoding"] == "gzip"
+        assert response.headers["content-encoding"] == "gzip"
+        assert int(response.headers["content-length"]) == len(encoded)
+        assert response.json() == PAYLOAD
+
+    async def test_upstream_is_asked_for_identity_when_client_sends_nothing(
+        self, client, upstream, auth_headers
+    ):
+        request = client.build_request("GET", "/api/v1/orders/1", headers=auth_headers)
+        del request.headers["accept-encoding"]
+        await client.send(request)
+
+        assert upstream.requests[0][0].headers["accept-encoding"] == "identity"
+
+    async def test_cache_keeps_compressed_variants(self, client, upstream, auth_headers):
+        upstream.handler = lambda request: httpx.Response(
+            200, json=PAYLOAD, headers={"cache-control": "max-age=60"}
+        )
+        headers = {**auth_headers, "Accept-Encoding": "gzip"}
+
+        first = await client.get("/api/v1/orders/list", headers=headers)
+        bytes_before = response_cache.bytes
+        second = await client.get("/api/v1/orders/list", headers=headers)
+        bytes_after_variant = response_cache.bytes
+        third = await client.get("/api/v1/orders/list", headers=headers)
+
+        assert len(upstream.requests) == 1
+        assert second.headers["x-cache"] == third.headers["x-cache"] == "HIT"
+        assert second.headers["content-encoding"] == "gzip"
+        assert second.json() == third.json() == first.json() == PAYLOAD
+        assert bytes_after_variant > bytes_before
+        assert response_cache.bytes == bytes_after_variant
+
+
+@pytest.mark.asyncio
+class TestCompressionMiddleware:
+    async def test_streams_are_compressed_chunk_by_chunk(self):
+        async def lines():
+            for i in range(3):
+                yield json.dumps({"line": i}).encode() + b"\n"
+
+        async def endpoint(request):
+            return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+        app = CompressionMiddleware(Starlette(routes=[Route("/", endpoint)]), levels=LEVELS | {
+            "application/x-ndjson": {"gzip": 6},
+        })
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://t") as client:
+            response = await client.get("/", headers={"Accept-Encoding": "gzip"})
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        assert [json.loads(line) for line in response.text.splitlines()] == [{"line": i} for i in range(3)]
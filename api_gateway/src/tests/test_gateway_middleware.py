@@ -0,0 +1,100 @@
+import pytest
+from prometheus_client import REGISTRY
+
+from core.routing import route_table
+from middleware.metrics import RouteLabeler
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def _requests_total(service, route, status):
+    return _sample("gateway_requests_total", service=service, route=route, status=str(status))
+
+
+@pytest.mark.asyncio
+class TestGatewayMiddleware:
+    async def test_missing_token_is_401(self, client, upstream):
+        response = await client.get("/api/v1/orders/1")
+
+        assert response.status_code == 401
+        assert response.json() == {"detail": "Missing authentication token"}
+        assert response.headers["www-authenticate"] == "Bearer"
+        assert upstream.requests == []
+
+    @pytest.mark.parametrize("header, detail", [
+        ("Basic abc", "Invalid authentication scheme"),
+        ("Bearer", "Invalid authentication format"),
+        ("Bearer not-a-jwt", "Invalid authentication credentials"),
+    ])
+    async def test_bad_credentials_are_401(self, client, header, detail):
+        response = await client.get("/api/v1/orders/1", headers={"Authorization": header})
+
+        assert response.status_code == 401
+        assert response.json() == {"detail": detail}
+
+    async def test_public_paths_skip_auth(self, client, upstream):
+        response = await client.post("/api/v1/auth/token", data={"username": "u", "password": "p"})
+
+        assert response.status_code == 200
+        assert "x-user" not in upstream.requests[0][0].headers
+
+    async def test_counts_forwarded_and_rejected_requests(self, client, auth_headers):
+        ok_before = _requests_total("orders", "/{id}", 200)
+        rejected_before = _requests_total("orders", "/{id}", 401)
+
+        await client.get("/api/v1/orders/1", headers=auth_headers)
+        await client.get("/api/v1/orders/2")
+
+        assert _requests_total("orders", "/{id}", 200) == ok_before + 1
+        assert _requests_total("orders", "/{id}", 401) == rejected_before + 1
+
+    async def test_records_phase_histograms(self, client, auth_headers):
+        def count(phase):
+            return _sample(
+                "gateway_request_phase_seconds_count", service="billing", route="/payments", phase=phase
+            )
+
+        before = {phase: count(phase) for phase in ("auth", "rate_limit", "ttfb", "stream")}
+        await client.get("/api/v1/billing/payments", headers=auth_headers)
+
+        assert {phase: count(phase) - n for phase, n in before.items()} == {
+            "auth": 1, "rate_limit": 1, "ttfb": 1, "stream": 1,
+        }
+
+    async def test_request_id_is_returned_and_used_as_exemplar(self, client, auth_headers):
+        response = await client.get(
+            "/api/v1/billing/invoices/7", headers={**auth_headers, "X-Request-ID": "req-123"}
+        )
+        assert response.headers["x-request-id"] == "req-123"
+
+        generated = await client.get("/api/v1/billing/invoices/7", headers={
+            **auth_headers, "X-Request-ID": "bad id with spaces",
+        })
+        assert len(generated.headers["x-request-id"]) == 32
+
+        metrics = await client.get(
+            "/metrics", headers={**auth_headers, "Accept": "application/openmetrics-text"}
+        )
+        assert metrics.headers["content-type"].startswith("application/openmetrics-text")
+        assert 'route="/invoices/{id}"' in metrics.text
+        assert "# {request_id=" in metrics.text
+
+    def test_route_labels_are_bounded(self):
+        labeler = RouteLabeler(route_table, local_routes=["/health"], max_routes_per_service=2)
+
+        assert labeler.labels("/api/v1/orders/42/items") == ("orders", "/{id}/items")
+        assert labeler.labels("/api/v1/orders/9") == ("orders", "/{id}")
+        assert labeler.labels("/api/v1/orders/search") == ("orders", "other")
+        assert labeler.labels("/api/v1/orders/7") == ("orders", "/{id}")
+        assert labeler.labels("/health") == ("gateway", "/health")
+        assert labeler.labels("/api/v1/nope/1") == ("gateway", "other")
+
+    def test_unadmitted_requests_do_not_use_up_the_route_budget(self):
+        labeler = RouteLabeler(route_table, local_routes=[], max_routes_per_service=1)
+
+        assert labeler.labels("/api/v1/orders/junk-a/x", admit=False) == ("orders", "other")
+        assert labeler.labels("/api/v1/orders/junk-b/y", admit=False) == ("orders", "other")
+        assert labeler.labels("/api/v1/orders/9") == ("orders", "/{id}")
+        assert labeler.labels("/api/v1/orders/7", admit=False) == ("orders", "/{id}")
@@ -0,0 +1,42 @@
+import httpx
+import pytest
+
+
+def _billing_down(request):
+    if request.url.host == "billing_service":
+        raise httpx.ConnectError("refused", request=request)
+    return httpx.Response(200, json={"status": "ok"})
+
+
+@pytest.mark.asyncio
+class TestHealthAPI:
+    async def test_reports_each_service(self, client, upstream):
+        upstream.handler = _billing_down
+
+        response = await client.get("/health")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "degraded"
+        assert data["services"]["orders"]["status"] == "up"
+        assert data["services"]["billing"]["status"] == "down"
+        assert len(data["services"]["orders"]["history_ms"]) == 1
+
+    async def test_all_down_is_unhealthy(self, client, upstream):
+        def refuse(request):
+            raise httpx.ConnectError("refused", request=request)
+
+        upstream.handler = refuse
+
+        response = await client.get("/api/v1/health")
+
+        assert response.json()["status"] == "unhealthy"
+
+    async def test_snapshot_is_cached(self, client, upstream):
+        await client.get("/health")
+        probes = len(upstream.requests)
+
+        response = await client.get("/api/v1/health")
+
+        assert response.json()["status"] == "healthy"
+        assert len(upstream.requests) == probes == 3
@@ -0,0 +1,126 @@
+import asyncio
+
+import httpx
+import pytest
+
+from core.hedging import Hedger
+
+
+def warmed_hedger(delay: float, **kwargs) -> Hedger:
+    hedger = Hedger(min_samples=1, min_delay=0.0, **kwargs)
+    for _ in range(20):
+        hedger.record(delay)
+    return hedger
+
+
+class SlowFirstAttempt:
+    """Attempt 0 takes `primary_delay`, later attempts answer immediately."""
+
+    def __init__(self, primary_delay: float):
+        self.primary_delay = primary_delay
+        self.started = []
+        self.cancelled = []
+
+    async def __call__(self, index: int) -> httpx.Response:
+        self.started.append(index)
+        try:
+            if index == 0:
+                await asyncio.sleep(self.primary_delay)
+            return httpx.Response(200, headers={"x-attempt": str(index)})
+        except asyncio.CancelledError:
+            self.cancelled.append(index)
+            raise
+
+
+@pytest.mark.asyncio
+class TestHedger:
+    async def test_fast_primary_is_not_hedged(self):
+        hedger = warmed_hedger(0.05)
+        attempts = SlowFirstAttempt(primary_delay=0)
+
+        response = await hedger.send(attempts)
+
+        assert response.headers["x-attempt"] == "0"
+        assert attempts.started == [0]
+        assert hedger.stats()["fired"] == 0
+
+    async def test_slow_primary_is_hedged_and_cancelled(self):
+        hedger = warmed_hedger(0.01)
+        attempts = SlowFirstAttempt(primary_delay=5)
+
+        response = await hedger.send(attempts)
+
+        assert response.headers["x-attempt"] == "1"
+        assert attempts.started == [0, 1]
+        assert attempts.cancelled == [0]
+        assert hedger.stats() == {"requests": 1, "fired": 1, "won": 1, "denied": 0}
+
+    async def test_hedge_rate_is_capped(self):
+        hedger = warmed_hedger(0.001, max_ratio=0.0)
+
+        await hedger.send(SlowFirstAttempt(primary_delay=0.01))  # spends the initial token
+        await hedger.send(SlowFirstAttempt(primary_delay=0.01))
+
+        assert hedger.stats()["fired"] == 1
+        assert hedger.stats()["denied"] == 1
+
+    async def test_failed_attempt_falls_back_to_the_other(self):
+        hedger = warmed_hedger(0.001)
+
+        async def attempt(index):
+            if index == 0:
+                await asyncio.sleep(0.01)
+                return httpx.Response(200)
+            raise httpx.ConnectError("refused")
+
+        response = await hedger.send(attempt)
+
+        assert response.status_code == 200
+        assert hedger.stats()["won"] == 0
+
+    async def test_fast_5xx_hedge_does_not_beat_a_slow_success(self):
+        hedger = warmed_hedger(0.001)
+        errors = []
+
+        async def attempt(index):
+            if index == 0:
+                await asyncio.sleep(0.02)
+                return httpx.Response(200)
+            errors.append(httpx.Response(503))
+            return errors[-1]
+
+        response = await hedger.send(attempt)
+
+        assert response.status_code == 200
+        assert errors[0].is_closed
+        assert hedger.stats()["won"] == 0
+
+    async def test_5xx_is_returned_when_no_attempt_succeeds(self):
+        hedger = warmed_hedger(0.001)
+
+        async def attempt(index):
+            if index == 0:
+                await asyncio.sleep(0.01)
+                raise httpx.ReadTimeout("slow")
+            return httpx.Response(503)
+
+        response = await hedger.send(attempt)
+
+        assert response.status_code == 503
+
+    async def test_no_hedging_until_enough_samples(self):
+        hedger = Hedger(min_samples=5)
+        attempts = SlowFirstAttempt(primary_delay=0.01)
+
+        await hedger.send(attempts)
+
+        assert hedger.delay() is None
+        assert attempts.started == [0]
+
+    def test_delay_tracks_p95(self):
+        hedger = Hedger(min_samples=1, min_delay=0.0, window=100)
+        for ms in range(1, 101):
+            hedger.record(ms / 1000)
+        hedger._refresh_delay()
+
+        assert hedger.delay() == pytest.approx(0.095)
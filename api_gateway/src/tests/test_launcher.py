@@ -0,0 +1,31 @@
+import multiprocessing
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+
+from core.launcher import Launcher
+
+
+@asynccontextmanager
+async def _broken_lifespan(app):
+    raise RuntimeError("database unreachable")
+    yield
+
+
+broken_app = FastAPI(lifespan=_broken_lifespan)
+
+
+def _run(workers):
+    Launcher(broken_app, "127.0.0.1", 0, workers=workers, reuse_port=False, graceful_timeout=1).run()
+
+
+class TestLauncher:
+    def test_worker_startup_failure_stops_the_server(self):
+        process = multiprocessing.get_context("fork").Process(target=_run, args=(2,))
+        process.start()
+        process.join(timeout=10)
+
+        if process.is_alive():
+            process.kill()
+            process.join()
+        assert process.exitcode == 3
@@ -0,0 +1,108 @@
+import io
+import json
+import threading
+
+import pytest
+import structlog
+
+from core.logsink import LogSampler, LogSink
+
+
+class BlockingStream(io.StringIO):
+    """Stream whose writes wait until released, like a stalled log consumer."""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+        self.writes = 0
+
+    def write(self, text):
+        self.release.wait(5)
+        self.writes += 1
+        return super().write(text)
+
+
+class TestLogSink:
+    def test_writes_json_lines_in_batches(self):
+        stream = BlockingStream()
+        sink = LogSink(max_queue=100, batch_size=50, stream=stream)
+        sink.start()
+        for i in range(10):
+            sink.put({"event": "e", "i": i})
+        stream.release.set()
+        sink.close()
+
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert [line["i"] for line in lines] == list(range(10))
+        assert stream.writes < 10
+        assert sink.stats()["written"] == 10
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        stream = BlockingStream()
+        sink = LogSink(max_queue=2, batch_size=1, stream=stream)
+
+        results = [sink.put({"event": "e", "i": i}) for i in range(5)]
+
+        assert results == [True, True, False, False, False]
+        assert sink.stats()["dropped"] == 3
+        stream.release.set()
+        sink.start()
+        sink.close()
+        assert sink.stats()["written"] == 2
+
+    def test_unrenderable_records_are_counted(self):
+        stream = io.StringIO()
+        sink = LogSink(render=lambda record: str(1 / record), stream=stream)
+        sink.start()
+        sink.put(0)
+        sink.put(2)
+        sink.close()
+
+        assert sink.stats()["errors"] == 1
+        assert stream.getvalue() == "0.5\n"
+
+    def test_forked_child_gets_its_own_writer(self):
+        stream = BlockingStream()
+        sink = LogSink(stream=stream)
+        sink.start()
+        sink.put({"event": "left to the parent"})
+        sink.put({"event": "left to the parent"})
+        parent_thread = sink._thread
+
+        sink._after_fork()  # what os.fork() runs in the child
+
+        assert sink._thread is not parent_thread and sink._thread.is_alive()
+        assert sink.depth() == 0
+        sink.put({"event": "from the child"})
+        stream.release.set()
+        sink.close()
+        assert "from the child" in stream.getvalue()
+
+
+class TestLogSampler:
+    def test_keeps_the_configured_fraction_by_request(self):
+        sampler = LogSampler({"request_completed": 0.1}, slow_ms=1000)
+
+        kept = sum(
+            sampler.keep("request_completed", "info", {"request_id": f"req-{i}"}) for i in range(10_000)
+        )
+
+        assert 800 < kept < 1200
+        assert sampler.keep("incoming_request", "info", {"request_id": "req-1"})
+
+    def test_errors_slow_and_failed_requests_are_always_kept(self):
+        sampler = LogSampler({"request_completed": 0.0}, slow_ms=500)
+
+        assert sampler.keep("request_completed", "error", {})
+        assert sampler.keep("request_completed", "warning", {})
+        assert sampler.keep("request_completed", "info", {"status_code": 503})
+        assert sampler.keep("request_completed", "info", {"duration_ms": 750})
+        assert not sampler.keep("request_completed", "info", {"status_code": 200, "duration_ms": 5})
+
+    def test_dropped_events_are_counted(self):
+        sampler = LogSampler({"noisy": 0.0}, slow_ms=500)
+
+        with pytest.raises(structlog.DropEvent):
+            sampler(None, "info", {"event": "noisy"})
+        assert sampler(None, "error", {"event": "noisy"}) == {"event": "noisy"}
+        assert sampler.sampled_out == 1
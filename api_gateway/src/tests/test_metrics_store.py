@@ -0,0 +1,101 @@
+import os
+
+from prometheus_client import CollectorRegistry
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.mmap_dict import MmapedDict
+from prometheus_client.values import mmap_key
+
+from core import metrics_store
+from core.metrics_store import (
+    CachedExposition,
+    MultiProcessCollector,
+    WorkerCollectors,
+    archive_worker,
+    reset_directory,
+)
+
+REQUESTS = mmap_key("gateway_requests", "gateway_requests_total", ("service",), ("orders",), "Requests")
+
+
+def _write(directory, filename, key, value):
+    values = MmapedDict(os.path.join(directory, filename))
+    values.write_value(key, value, 0.0)
+    values.close()
+
+
+def _registry(directory):
+    registry = CollectorRegistry()
+    MultiProcessCollector(registry, path=str(directory))
+    return registry
+
+
+class PoolCollector:
+    def __init__(self, active):
+        self.active = active
+
+    def collect(self):
+        gauge = GaugeMetricFamily("gateway_pool_active", "Active connections", labels=["service"])
+        gauge.add_metric(["orders"], self.active)
+        yield gauge
+        yield CounterMetricFamily("gateway_cache_hits", "Cache hits", value=self.active * 10)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestArchiveWorker:
+    def test_dead_worker_counters_are_kept_and_its_files_removed(self, tmp_path):
+        _write(tmp_path, "counter_111.db", REQUESTS, 3.0)
+        _write(tmp_path, "counter_222.db", REQUESTS, 4.0)
+        _write(tmp_path, "gauge_all_111.db", REQUESTS, 9.0)
+
+        archive_worker(str(tmp_path), 111)
+        _write(tmp_path, "counter_333.db", REQUESTS, 1.0)
+        archive_worker(str(tmp_path), 333)
+
+        assert sorted(os.listdir(tmp_path)) == ["counter_222.db", "counter_archive.db"]
+        assert _registry(tmp_path).get_sample_value(
+            "gateway_requests_total", {"service": "orders"}
+        ) == 8.0
+
+    def test_reset_removes_files_of_an_earlier_run(self, tmp_path):
+        _write(tmp_path, "counter_archive.db", REQUESTS, 3.0)
+        (tmp_path / "collectors_111.json").write_text("[]")
+        (tmp_path / "unrelated.txt").write_text("")
+
+        reset_directory(str(tmp_path))
+
+        assert os.listdir(tmp_path) == ["unrelated.txt"]
+
+
+class TestWorkerCollectors:
+    def test_reports_every_worker_labelled_by_pid(self, tmp_path, monkeypatch):
+        with monkeypatch.context() as other_worker:
+            other_worker.setattr(metrics_store.os, "getpid", lambda: 111)
+            WorkerCollectors(str(tmp_path), [PoolCollector(active=2)], interval=5).write()
+        registry = CollectorRegistry()
+        registry.register(WorkerCollectors(str(tmp_path), [PoolCollector(active=5)], interval=5))
+
+        own = str(os.getpid())
+        assert registry.get_sample_value("gateway_pool_active", {"service": "orders", "pid": own}) == 5
+        assert registry.get_sample_value("gateway_pool_active", {"service": "orders", "pid": "111"}) == 2
+        assert registry.get_sample_value("gateway_cache_hits_total", {"pid": "111"}) == 20
+
+
+class TestCachedExposition:
+    def test_renders_once_per_ttl_and_format(self):
+        clock = FakeClock()
+        exposition = CachedExposition(lambda openmetrics: b"om" if openmetrics else b"text", ttl=1.0, clock=clock)
+
+        assert exposition.get() == exposition.get() == b"text"
+        assert exposition.get(openmetrics_format=True) == b"om"
+        assert exposition.renders == 2
+
+        clock.now += 1.5
+        exposition.get()
+        assert exposition.renders == 3
@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+from starlette.requests import Request
+
+from core.balancer import EndpointDiscovery, build_balancers
+from core.config import settings
+from core.pools import CachingDNSBackend, UpstreamPools, build_transport
+from core.services import RequestBody, send_upstream
+
+
+class _RecordingBackend:
+    def __init__(self):
+        self.hosts = []
+
+    async def connect_tcp(self, host, port, **kwargs):
+        self.hosts.append(host)
+        return object()
+
+
+class _KeepAliveServer:
+    """Minimal HTTP/1.1 upstream counting the connections it accepts."""
+
+    def __init__(self):
+        self.connections = 0
+        self.hosts = []
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                for line in head.decode().split("\r\n"):
+                    if line.lower().startswith("host:"):
+                        self.hosts.append(line.split(":", 1)[1].strip())
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+@pytest.mark.asyncio
+class TestUpstreamPools:
+    async def test_one_client_per_service(self):
+        pools = UpstreamPools(settings.SERVICE_ROUTES)
+        try:
+            assert pools.client("orders") is pools.client("orders")
+            assert pools.client("orders") is not pools.client("billing")
+        finally:
+            await pools.aclose()
+
+    async def test_route_overrides_pool_limits(self, monkeypatch):
+        monkeypatch.setattr(settings, "UPSTREAM_POOLS", {"orders": {"max_connections": 7}})
+        routes = settings.SERVICE_ROUTES
+
+        assert routes["orders"]["pool"]["max_connections"] == 7
+        assert routes["billing"]["pool"]["max_connections"] == settings.POOL_MAX_CONNECTIONS
+
+        pools = UpstreamPools(routes)
+        try:
+            await pools.start(warm_up=False)
+            stats = pools.stats()
+            assert stats["orders"] == {"active": 0, "idle": 0, "max": 7}
+        finally:
+            await pools.aclose()
+
+    async def test_dns_cache_is_installed(self):
+        transport = build_transport("orders", settings.pool_config("orders"))
+        assert isinstance(transport._pool._network_backend, CachingDNSBackend)
+        await transport.aclose()
+
+    async def test_dns_cache_resolves_once_per_ttl(self, monkeypatch):
+        lookups = []
+
+        async def fake_getaddrinfo(host, port, **kwargs):
+            lookups.append(host)
+            return [(None, None, None, "", ("10.0.0.5", port))]
+
+        backend = _RecordingBackend()
+        resolver = CachingDNSBackend(backend, ttl=60)
+        monkeypatch.setattr(asyncio.get_running_loop(), "getaddrinfo", fake_getaddrinfo)
+
+        await resolver.connect_tcp("order_service", 9001)
+        await resolver.connect_tcp("order_service", 9001)
+        await resolver.connect_tcp("127.0.0.1", 9001)
+
+        assert lookups == ["order_service"]
+        assert backend.hosts == ["10.0.0.5", "10.0.0.5", "127.0.0.1"]
+
+    async def test_requests_reuse_connections_warmed_on_discovered_endpoints(self, monkeypatch):
+        server = _KeepAliveServer()
+        listener = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+
+        async def fake_getaddrinfo(host, port, **kwargs):
+            return [(None, None, None, "", ("127.0.0.1", port))]
+
+        monkeypatch.setattr(asyncio.get_running_loop(), "getaddrinfo", fake_getaddrinfo)
+        host = f"http://order_service:{port}"
+        route = {**settings.SERVICE_ROUTES["orders"], "host": host, "endpoints": [host]}
+        route["pool"] = {**route["pool"], "warmup_connections": 1}
+        routes = {"orders": route}
+        balancers = build_balancers(routes)
+        await EndpointDiscovery(routes, balancers, interval=0).refresh()
+        pools = UpstreamPools(routes, balancers=balancers)
+        try:
+            await pools.start()
+            assert server.connections == 1
+
+            request = Request({"type": "http", "method": "GET", "path": "/", "headers": [], "query_string": b""})
+            body = RequestBody(request, max_bytes=0, replayable_bytes=0)
+            await body.prepare()
+            upstream = await send_upstream(
+                pools.client("orders"), request, f"{host}/api/orders/1", [], body,
+                balancer=balancers["orders"],
+            )
+            await upstream.aread()
+
+            assert upstream.status_code == 200
+            assert server.connections == 1
+            assert server.hosts == [f"order_service:{port}"] * 2
+        finally:
+            await pools.aclose()
+            listener.close()
+            await listener.wait_closed()
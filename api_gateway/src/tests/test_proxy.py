@@ -0,0 +1,159 @@
+import asyncio
+import gzip
+
+import httpx
+import pytest
+
+from core.config import settings
+from core.hedging import Hedger, hedgers
+from core.resilience import service_guards
+
+
+@pytest.mark.asyncio
+class TestForwardRequest:
+    async def test_forwards_to_service_path(self, client, upstream, auth_headers):
+        response = await client.get("/api/v1/orders/42?expand=items", headers=auth_headers)
+
+        assert response.status_code == 200
+        assert response.json() == {"ok": True}
+        request, _ = upstream.requests[0]
+        assert request.url.host == "order_service"
+        assert request.url.path == "/42"
+        assert request.url.params["expand"] == "items"
+        assert request.headers["x-user"] == "demo"
+
+    async def test_streams_large_request_body(self, client, upstream, auth_headers):
+        payload = b"x" * (settings.PROXY_REPLAYABLE_BODY_BYTES * 3)
+
+        response = await client.post("/api/v1/orders", content=payload, headers=auth_headers)
+
+        assert response.status_code == 200
+        _, body = upstream.requests[0]
+        assert body == payload
+
+    async def test_rejects_oversized_request_body(self, client, upstream, auth_headers, monkeypatch):
+        monkeypatch.setattr(settings, "PROXY_MAX_REQUEST_BODY_BYTES", 10)
+
+        response = await client.post("/api/v1/orders", content=b"x" * 11, headers=auth_headers)
+
+        assert response.status_code == 413
+        assert upstream.requests == []
+
+    async def test_passes_encoded_body_and_repeated_headers_through(self, client, upstream, auth_headers):
+        compressed = gzip.compress(b'{"id": 1}')
+        upstream.handler = lambda request: httpx.Response(
+            200,
+            content=compressed,
+            headers=[
+                ("content-type", "application/json"),
+                ("content-encoding", "gzip"),
+                ("set-cookie", "a=1"),
+                ("set-cookie", "b=2"),
+            ],
+        )
+
+        response = await client.get("/api/v1/orders/1", headers=auth_headers)
+
+        assert response.json() == {"id": 1}
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers.get_list("set-cookie") == ["a=1", "b=2"]
+
+    async def test_retries_replayable_body(self, client, upstream, auth_headers, monkeypatch):
+        monkeypatch.setattr("core.services.asyncio.sleep", _no_sleep)
+        calls = []
+
+        def flaky(request):
+            calls.append(request)
+            if len(calls) < 3:
+                raise httpx.ConnectError("refused", request=request)
+            return httpx.Response(201, json={"order_id": 1})
+
+        upstream.handler = flaky
+        headers = {**auth_headers, "Idempotency-Key": "order-1"}
+        response = await client.post("/api/v1/orders", json={"amount": 1}, headers=headers)
+
+        assert response.status_code == 201
+        assert len(calls) == 3
+
+    async def test_does_not_retry_non_idempotent_post(self, client, upstream, auth_headers, monkeypatch):
+        monkeypatch.setattr("core.services.asyncio.sleep", _no_sleep)
+
+        def refused(request):
+            raise httpx.ConnectError("refused", request=request)
+
+        upstream.handler = refused
+        response = await client.post("/api/v1/orders", json={"amount": 1}, headers=auth_headers)
+
+        assert response.status_code == 503
+        assert len(upstream.requests) == 1
+        assert service_guards["orders"].retries_denied["not_idempotent"] == 1
+
+    async def test_open_circuit_fails_fast(self, client, upstream, auth_headers, monkeypatch):
+        monkeypatch.setattr("core.services.asyncio.sleep", _no_sleep)
+        upstream.handler = lambda request: httpx.Response(503)
+
+        for _ in range(settings.CIRCUIT_FAILURE_THRESHOLD):
+            response = await client.post("/api/v1/orders", json={}, headers=auth_headers)
+            assert response.status_code == 503
+
+        response = await client.get("/api/v1/orders/1", headers=auth_headers)
+
+        assert response.status_code == 503
+        assert "circuit open" in response.json()["detail"]
+        assert int(response.headers["retry-after"]) >= 1
+        assert len(upstream.requests) == settings.CIRCUIT_FAILURE_THRESHOLD
+
+    async def test_does_not_retry_consumed_stream(self, client, upstream, auth_headers, monkeypatch):
+        monkeypatch.setattr("core.services.asyncio.sleep", _no_sleep)
+
+        def broken(request):
+            raise httpx.ReadError("reset", request=request)
+
+        upstream.handler = broken
+        payload = b"x" * (settings.PROXY_REPLAYABLE_BODY_BYTES + 1)
+        headers = {**auth_headers, "Idempotency-Key": "upload-1"}
+        response = await client.post("/api/v1/orders", content=payload, headers=headers)
+
+        assert response.status_code == 503
+        assert len(upstream.requests) == 1
+
+    async def test_hedges_slow_get(self, client, upstream, auth_headers, monkeypatch):
+        monkeypatch.setattr(settings, "HEDGING_ENABLED", True)
+        hedger = Hedger(min_samples=1, min_delay=0.0)
+        hedger.record(0.001)
+        monkeypatch.setitem(hedgers, "orders", hedger)
+        calls = []
+
+        async def first_slow(request):
+            calls.append(request)
+            if len(calls) == 1:
+                await asyncio.sleep(5)
+            return httpx.Response(200, json={"attempt": len(calls)})
+
+        upstream.handler = first_slow
+        response = await client.get("/api/v1/orders/42", headers=auth_headers)
+
+        assert response.json() == {"attempt": 2}
+        assert hedger.stats()["won"] == 1
+
+    async def test_long_poll_waits_past_default_timeout_and_is_never_cached(
+        self, client, upstream, auth_headers, monkeypatch
+    ):
+        monkeypatch.setattr(settings, "RESPONSE_CACHE_ENABLED", True)
+        upstream.handler = lambda request: httpx.Response(
+            200, json={"status": "paid"}, headers={"cache-control": "max-age=60"}
+        )
+
+        for _ in range(2):
+            response = await client.get(
+                "/api/v1/orders/42?wait_for_change=pending", headers=auth_headers
+            )
+            assert response.json() == {"status": "paid"}
+
+        assert len(upstream.requests) == 2
+        request, _ = upstream.requests[0]
+        assert request.extensions["timeout"]["read"] == settings.LONG_POLLING_TIMEOUT
+
+
+async def _no_sleep(_delay):
+    return None
@@ -0,0 +1,65 @@
+import pytest
+
+from middleware.rate_limit import RateLimiter, rate_limiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRateLimiter:
+    def test_allows_burst_then_blocks(self):
+        limiter = RateLimiter(requests_per_minute=3, clock=FakeClock())
+
+        assert [limiter.is_allowed("1.2.3.4") for _ in range(4)] == [True, True, True, False]
+        assert limiter.is_allowed("5.6.7.8")
+
+    def test_refills_over_time(self):
+        clock = FakeClock()
+        limiter = RateLimiter(requests_per_minute=60, burst=1, clock=clock)
+
+        assert limiter.is_allowed("k")
+        assert not limiter.is_allowed("k")
+        assert limiter.retry_after("k") == 1
+
+        clock.now += 1.0
+        assert limiter.is_allowed("k")
+
+    def test_cost_is_taken_all_or_nothing(self):
+        limiter = RateLimiter(requests_per_minute=60, burst=5, clock=FakeClock())
+
+        assert limiter.is_allowed("k", cost=4)
+        assert not limiter.is_allowed("k", cost=2)
+        assert limiter.retry_after("k", cost=2) == 1
+        assert limiter.is_allowed("k")
+        assert not limiter.is_allowed("new", cost=6)
+
+    def test_sweep_evicts_only_refilled_buckets(self):
+        clock = FakeClock()
+        limiter = RateLimiter(requests_per_minute=60, clock=clock)
+        limiter.is_allowed("idle")
+        clock.now += 30
+        limiter.is_allowed("active")
+        clock.now += 30
+
+        assert limiter.sweep() == 1
+        assert list(limiter.buckets) == ["active"]
+
+
+@pytest.mark.asyncio
+class TestRateLimitMiddleware:
+    async def test_returns_429_with_retry_after(self, client, auth_headers, monkeypatch):
+        monkeypatch.setattr(rate_limiter, "capacity", 2.0)
+
+        statuses = [
+            (await client.get("/api/v1/orders/1", headers=auth_headers)).status_code
+            for _ in range(3)
+        ]
+
+        assert statuses == [200, 200, 429]
+        response = await client.get("/api/v1/orders/1", headers=auth_headers)
+        assert int(response.headers["retry-after"]) >= 1
@@ -0,0 +1,93 @@
+import asyncio
+import multiprocessing
+
+import pytest
+
+from middleware.rate_limit_shared import SharedRateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def shm_path(tmp_path):
+    return str(tmp_path / "ratelimit")
+
+
+def _consume(path, count, results):
+    limiter = SharedRateLimiter(path, slots=64, stripes=4, requests_per_minute=5)
+    results.put([limiter.is_allowed("10.0.0.1") for _ in range(count)])
+    limiter.close()
+
+
+class TestSharedRateLimiter:
+    def test_workers_share_one_budget(self, shm_path):
+        first = SharedRateLimiter(shm_path, slots=64, stripes=4, requests_per_minute=3)
+        second = SharedRateLimiter(shm_path, slots=64, stripes=4, requests_per_minute=3)
+
+        assert [first.is_allowed("k"), second.is_allowed("k"), first.is_allowed("k")] == [True] * 3
+        assert not second.is_allowed("k")
+        assert second.retry_after("k") >= 1
+        first.close()
+        second.close()
+
+    def test_budget_is_shared_across_processes(self, shm_path):
+        context = multiprocessing.get_context("fork")
+        results = context.Queue()
+        SharedRateLimiter(shm_path, slots=64, stripes=4, requests_per_minute=5).close()
+
+        worker = context.Process(target=_consume, args=(shm_path, 3, results))
+        worker.start()
+        worker.join()
+        limiter = SharedRateLimiter(shm_path, slots=64, stripes=4, requests_per_minute=5)
+
+        assert results.get() == [True, True, True]
+        assert [limiter.is_allowed("10.0.0.1") for _ in range(3)] == [True, True, False]
+        limiter.close()
+
+    def test_full_stripe_fails_open_and_reclaims_idle_slots(self, shm_path):
+        clock = FakeClock()
+        limiter = SharedRateLimiter(
+            shm_path, slots=4, stripes=1, requests_per_minute=60, burst=1, clock=clock
+        )
+        for i in range(4):
+            assert limiter.is_allowed(f"key-{i}")
+
+        assert limiter.is_allowed("overflow")
+        assert limiter.overflows == 1
+
+        clock.now += limiter.idle_after
+        assert limiter.is_allowed("late")
+        assert limiter.sweep() == 3
+        limiter.close()
+
+    @pytest.mark.asyncio
+    async def test_sweeper_walks_one_stripe_per_tick(self, shm_path, monkeypatch):
+        clock = FakeClock()
+        limiter = SharedRateLimiter(shm_path, slots=64, stripes=4, burst=1, clock=clock)
+        for i in range(8):
+            limiter.is_allowed(f"key-{i}")
+        clock.now += limiter.idle_after
+        swept = []
+        sweep_stripe = limiter.sweep_stripe
+        monkeypatch.setattr(limiter, "sweep_stripe", lambda start: swept.append(start) or sweep_stripe(start))
+
+        limiter.start(interval=0.02)
+        await asyncio.sleep(0.1)
+        await limiter.stop()
+
+        assert swept[:4] == [0, 16, 32, 48]
+        assert limiter.sweep() == 0
+        limiter.close()
+
+    def test_adopts_existing_layout(self, shm_path):
+        SharedRateLimiter(shm_path, slots=64, stripes=4).close()
+        limiter = SharedRateLimiter(shm_path, slots=128, stripes=8)
+
+        assert (limiter.slots, limiter.stripes) == (64, 4)
+        limiter.close()
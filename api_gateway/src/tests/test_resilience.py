@@ -0,0 +1,114 @@
+from core.resilience import (
+    CircuitBreaker,
+    CircuitState,
+    RetryBudget,
+    ServiceGuard,
+    backoff_delay,
+    is_idempotent,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker:
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker(failure_threshold=3, clock=FakeClock())
+
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        breaker.record_failure()
+        assert breaker.state is CircuitState.CLOSED
+
+        breaker.record_failure()
+        assert breaker.state is CircuitState.OPEN
+        assert not breaker.allow_request()
+
+    def test_half_open_probe_closes_or_reopens(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=10, clock=clock)
+        breaker.record_failure()
+
+        clock.now += 10
+        assert breaker.allow_request()
+        assert breaker.state is CircuitState.HALF_OPEN
+        assert not breaker.allow_request()  # only one probe at a time
+
+        breaker.record_failure()
+        assert breaker.state is CircuitState.OPEN
+        assert breaker.retry_after() == 10
+
+        clock.now += 10
+        assert breaker.allow_request()
+        breaker.record_success()
+        assert breaker.state is CircuitState.CLOSED
+        assert breaker.times_opened == 2
+
+    def test_lost_probe_is_forgotten_after_recovery_timeout(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=5, clock=clock)
+        breaker.record_failure()
+        clock.now += 5
+        assert breaker.allow_request()
+
+        clock.now += 5
+        assert breaker.allow_request()
+
+
+class TestRetryBudget:
+    def test_retries_limited_to_ratio_of_traffic(self):
+        budget = RetryBudget(ratio=0.25, min_per_second=0, max_balance=1, clock=FakeClock())
+        assert budget.try_withdraw()
+        assert not budget.try_withdraw()
+
+        for _ in range(3):
+            budget.deposit()
+        assert not budget.try_withdraw()
+        budget.deposit()
+        assert budget.try_withdraw()
+
+    def test_minimum_allowance_refills_over_time(self):
+        clock = FakeClock()
+        budget = RetryBudget(ratio=0, min_per_second=2, max_balance=1, clock=clock)
+        assert budget.try_withdraw()
+        assert not budget.try_withdraw()
+
+        clock.now += 0.5
+        assert budget.try_withdraw()
+
+
+class TestRetryPolicy:
+    def test_idempotency(self):
+        assert is_idempotent("get", {})
+        assert is_idempotent("PUT", {})
+        assert not is_idempotent("POST", {})
+        assert is_idempotent("POST", {"idempotency-key": "abc"})
+
+    def test_backoff_is_jittered_and_capped(self):
+        for attempt in range(1, 8):
+            delay = backoff_delay(attempt, base=0.1, cap=1.0)
+            assert 0 <= delay <= min(1.0, 0.1 * 2 ** (attempt - 1))
+
+    def test_denied_reasons_are_counted(self):
+        guard = ServiceGuard(
+            CircuitBreaker(clock=FakeClock()),
+            RetryBudget(ratio=0, min_per_second=0, max_balance=1, clock=FakeClock()),
+            max_attempts=3,
+        )
+
+        assert guard.retry_denied_reason(1, idempotent=False, replayable=True) == "not_idempotent"
+        assert guard.retry_denied_reason(1, idempotent=True, replayable=False) == "body_consumed"
+        assert guard.retry_denied_reason(1, idempotent=True, replayable=True) is None
+        assert guard.retry_denied_reason(2, idempotent=True, replayable=True) == "budget_exhausted"
+        assert guard.retry_denied_reason(3, idempotent=True, replayable=True) == "max_attempts"
+        assert guard.stats()["retries"] == 1
+        assert guard.stats()["retries_denied"] == {
+            "not_idempotent": 1, "body_consumed": 1, "budget_exhausted": 1, "max_attempts": 1,
+        }
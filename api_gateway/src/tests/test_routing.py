@@ -0,0 +1,51 @@
+import pytest
+
+from core.config import settings
+from core.routing import RouteTable
+
+table = RouteTable.from_settings(settings)
+
+
+class TestRouteTable:
+    @pytest.mark.parametrize(
+        "path, service, forward_path",
+        [
+            ("/api/v1/orders/123", "orders", "/123"),
+            ("/api/v1/orders", "orders", "/"),
+            ("/api/v1/orders/", "orders", "/"),
+            ("/billing/payments/7", "billing", "/payments/7"),
+        ],
+    )
+    def test_resolves_service_and_forward_path(self, path, service, forward_path):
+        match = table.resolve(path)
+
+        assert match.service == service
+        assert match.forward_path == forward_path
+        assert match.host == settings.SERVICE_ROUTES[service]["host"]
+
+    def test_reports_version(self):
+        assert table.resolve("/api/v1/orders/1").version == "v1"
+        assert table.resolve("/orders/1").version is None
+
+    def test_unknown_service(self):
+        assert table.resolve("/api/v1/unknown/1") is None
+        assert table.resolve("/api/v2/orders/1") is None
+
+    @pytest.mark.parametrize(
+        "path, method",
+        [
+            ("/health", "GET"),
+            ("/api/v1/health", "GET"),
+            ("/api/v1/docs", "GET"),
+            ("/openapi.json", "GET"),
+            ("/api/v1/auth/token", "POST"),
+            ("/auth/register", "POST"),
+            ("/api/v1/orders/1", "OPTIONS"),
+        ],
+    )
+    def test_public_paths(self, path, method):
+        assert table.is_public(path, method)
+
+    @pytest.mark.parametrize("path", ["/api/v1/orders/1", "/api/v1/auth/me", "/api/v1", "/"])
+    def test_private_paths(self, path):
+        assert not table.is_public(path, "GET")
@@ -0,0 +1,68 @@
+import time
+
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+
+from core.config import settings
+from core.security import TokenCache, token_cache, verify_token
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _token(**claims):
+    return jwt.encode(claims, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+
+
+class TestTokenCache:
+    def test_entry_expires_at_token_exp(self):
+        clock = FakeClock()
+        cache = TokenCache(max_entries=10, max_bytes=1 << 20, max_ttl=300, clock=clock)
+        cache.put("t", {"sub": "demo", "exp": clock.now + 10})
+
+        assert cache.get("t") == {"sub": "demo", "exp": clock.now + 10}
+        clock.now += 10
+        assert cache.get("t") is None
+        assert cache.stats()["entries"] == 0
+
+    def test_lru_eviction_by_count_and_bytes(self):
+        cache = TokenCache(max_entries=2, max_bytes=1 << 20, max_ttl=300)
+        cache.put("a", {})
+        cache.put("b", {})
+        cache.get("a")
+        cache.put("c", {})
+
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.evictions == 1
+
+        small = TokenCache(max_entries=100, max_bytes=600, max_ttl=300)
+        for name in ("x", "y", "z"):
+            small.put(name, {})
+        assert small.stats()["entries"] == 2
+        assert small.bytes <= 600
+
+
+@pytest.mark.asyncio
+class TestVerifyToken:
+    async def test_second_verification_is_a_cache_hit(self):
+        token_cache.clear()
+        token = _token(sub="demo", exp=int(time.time()) + 60)
+        hits = token_cache.hits
+
+        first = await verify_token(token)
+        second = await verify_token(token)
+
+        assert first == second
+        assert token_cache.hits == hits + 1
+
+    async def test_invalid_token_is_rejected_and_not_cached(self):
+        with pytest.raises(HTTPException) as exc:
+            await verify_token("not-a-jwt")
+        assert exc.value.status_code == 401
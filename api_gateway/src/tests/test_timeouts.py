@@ -0,0 +1,111 @@
+import random
+
+import pytest
+
+from core.config import settings
+from core.timeouts import AdaptiveTimeouts, LatencySketch, adaptive_timeouts
+from middleware import get_metrics
+
+
+class TestLatencySketch:
+    def test_quantiles_within_relative_accuracy(self):
+        sketch = LatencySketch(accuracy=0.02)
+        rng = random.Random(7)
+        values = sorted(rng.lognormvariate(-4, 1) for _ in range(900))
+        for value in values:
+            sketch.record(value)
+
+        for q in (0.5, 0.9, 0.99):
+            exact = values[int(q * (len(values) - 1))]
+            assert sketch.quantile(q) == pytest.approx(exact, rel=0.05)
+
+    def test_forgets_samples_older_than_two_windows(self):
+        sketch = LatencySketch(window=10)
+        for _ in range(10):
+            sketch.record(5.0)
+        for _ in range(15):
+            sketch.record(0.01)
+
+        assert sketch.count == 15
+        assert sketch.quantile(1.0) == pytest.approx(0.01, rel=0.02)
+
+    def test_empty_sketch_has_no_quantiles(self):
+        assert LatencySketch().quantile(0.99) is None
+
+
+class TestAdaptiveTimeouts:
+    def _warm(self, timeouts, latency, count=100):
+        entry = timeouts.for_route("orders", "GET", "/{id}")
+        for _ in range(count):
+            entry.record(latency)
+        return entry
+
+    def test_ceiling_until_enough_samples(self):
+        timeouts = AdaptiveTimeouts(ceiling=30.0, min_samples=100)
+
+        entry = self._warm(timeouts, 0.02, count=50)
+
+        assert entry.timeout.read == 30.0
+
+    def test_multiple_of_p99_with_fixed_connect_and_pool(self):
+        timeouts = AdaptiveTimeouts(multiplier=3.0, floor=0.01, connect=1.5, pool=4.0, min_samples=100)
+
+        entry = self._warm(timeouts, 0.2)
+
+        assert entry.timeout.read == pytest.approx(0.6, rel=0.03)
+        assert (entry.timeout.connect, entry.timeout.pool) == (1.5, 4.0)
+
+    def test_clamped_to_floor_and_ceiling(self):
+        timeouts = AdaptiveTimeouts(multiplier=3.0, floor=0.5, ceiling=2.0, min_samples=100)
+
+        assert self._warm(timeouts, 0.01).timeout.read == 0.5
+        assert self._warm(AdaptiveTimeouts(floor=0.5, ceiling=2.0), 5.0).timeout.read == 2.0
+
+    def test_routes_beyond_the_limit_share_one_entry(self):
+        timeouts = AdaptiveTimeouts(max_routes_per_service=1)
+
+        first = timeouts.for_route("orders", "GET", "/{id}")
+        other = timeouts.for_route("orders", "GET", "/a")
+
+        assert other is timeouts.for_route("orders", "GET", "/b") is not first
+        assert set(timeouts.routes["orders"]) == {("GET", "/{id}"), ("GET", "other")}
+
+    def test_methods_on_one_route_are_kept_apart(self):
+        timeouts = AdaptiveTimeouts()
+
+        assert timeouts.for_route("orders", "GET", "/{id}") is not timeouts.for_route("orders", "PUT", "/{id}")
+
+
+@pytest.mark.asyncio
+class TestAdaptiveProxyTimeouts:
+    async def test_route_timeout_tightens_with_observed_latency(
+        self, client, upstream, auth_headers, monkeypatch
+    ):
+        monkeypatch.setattr(adaptive_timeouts, "min_samples", 20)
+        for _ in range(20):
+            response = await client.get("/api/v1/orders/42", headers=auth_headers)
+            assert response.status_code == 200
+
+        response = await client.get("/api/v1/orders/7", headers=auth_headers)
+
+        request, _ = upstream.requests[-1]
+        read = request.extensions["timeout"]["read"]
+        assert read < adaptive_timeouts.ceiling
+        assert read == adaptive_timeouts.routes["orders"][("GET", "/{id}")].timeout.read
+        assert (
+            b'gateway_upstream_timeout_seconds{kind="read",method="GET",route="/{id}",service="orders"}'
+            in get_metrics()
+        )
+
+    async def test_writes_keep_the_default_timeout(self, client, upstream, auth_headers, monkeypatch):
+        monkeypatch.setattr(adaptive_timeouts, "min_samples", 20)
+        for _ in range(20):
+            await client.get("/api/v1/orders/42", headers=auth_headers)
+
+        await client.get("/api/v1/orders/7", headers=auth_headers)
+        await client.post("/api/v1/orders/7", headers=auth_headers, json={"status": "paid"})
+
+        (get, _), (post, _) = upstream.requests[-2:]
+        assert get.extensions["timeout"]["read"] < adaptive_timeouts.ceiling
+        assert post.extensions["timeout"]["read"] == settings.DEFAULT_TIMEOUT
+        assert ("POST", "/{id}") not in adaptive_timeouts.routes["orders"]
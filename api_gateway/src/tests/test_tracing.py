@@ -0,0 +1,156 @@
+import asyncio
+import contextvars
+
+import pytest
+
+from core.tracing import TraceContext, Tracer, format_traceparent, parse_traceparent, tracer
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT = f"00-{TRACE_ID}-00f067aa0ba902b7-01"
+
+
+def _tracer(exported, **kwargs):
+    options = {"slow_ms": 1000, "sample_rate": 0.0}
+    options.update(kwargs)
+    return Tracer("test", exported.append, **options)
+
+
+class TestTraceparent:
+    def test_round_trip(self):
+        context = parse_traceparent(PARENT)
+
+        assert context == TraceContext(TRACE_ID, "00f067aa0ba902b7", True)
+        assert format_traceparent(context) == PARENT
+
+    @pytest.mark.parametrize("value", [
+        None,
+        "",
+        "garbage",
+        f"ff-{TRACE_ID}-00f067aa0ba902b7-01",
+        f"00-{'0' * 32}-00f067aa0ba902b7-01",
+        f"00-{TRACE_ID}-{'0' * 16}-01",
+        f"00-{TRACE_ID}-00f067aa0ba902b7-01-extra",
+    ])
+    def test_rejects_invalid_values(self, value):
+        assert parse_traceparent(value) is None
+
+    def test_accepts_future_versions_with_extra_fields(self):
+        assert parse_traceparent(f"01-{TRACE_ID}-00f067aa0ba902b7-00-extra").sampled is False
+
+
+class TestTracer:
+    def test_children_share_the_trace(self):
+        exported = []
+        recorder = _tracer(exported, sample_rate=1.0)
+
+        with recorder.span("root", parse_traceparent(PARENT)) as root:
+            with recorder.span("child") as child:
+                assert recorder.traceparent() == child.traceparent()
+
+        assert [span["name"] for span in exported] == ["child", "root"]
+        assert {span["trace_id"] for span in exported} == {TRACE_ID}
+        assert exported[0]["parent_id"] == root.span_id
+        assert exported[1]["parent_id"] == "00f067aa0ba902b7"
+        assert recorder.current() is None
+
+    def test_fast_unsampled_traces_are_discarded(self):
+        exported = []
+        recorder = _tracer(exported)
+
+        with recorder.span("root"):
+            with recorder.span("child"):
+                pass
+
+        assert exported == []
+        assert recorder.stats()["discarded"] == 1
+
+    def test_slow_traces_are_kept(self):
+        exported = []
+        recorder = _tracer(exported, slow_ms=0)
+
+        with recorder.span("root"):
+            pass
+
+        assert len(exported) == 1
+        assert recorder.stats()["exported"] == 1
+
+    def test_failed_traces_are_kept(self):
+        exported = []
+        recorder = _tracer(exported)
+
+        with recorder.span("root"):
+            with pytest.raises(ValueError):
+                with recorder.span("child"):
+                    raise ValueError("boom")
+
+        assert exported[0]["error"] is True
+        assert exported[0]["attributes"]["error_type"] == "ValueError"
+        assert exported[1]["error"] is False
+
+    def test_head_sampling_is_consistent_per_trace_id(self):
+        recorder = _tracer([], sample_rate=0.5)
+
+        decisions = [recorder.head_sampled(f"{i:032x}{i:032x}"[:32]) for i in range(1000)]
+
+        assert decisions == [recorder.head_sampled(f"{i:032x}{i:032x}"[:32]) for i in range(1000)]
+
+    def test_spans_outliving_their_root_are_dropped(self):
+        exported = []
+        recorder = _tracer(exported, sample_rate=1.0)
+
+        # Like a task spawned under the root and still running when the root ends
+        with recorder.span("root"):
+            detached = contextvars.copy_context()
+            late = recorder.span("late")
+            detached.run(late.__enter__)
+        detached.run(late.__exit__, None, None, None)
+
+        assert [span["name"] for span in exported] == ["root"]
+        assert recorder.stats()["spans_dropped"] == 1
+
+    async def test_cancellation_is_not_a_failure(self):
+        exported = []
+        recorder = _tracer(exported, sample_rate=1.0)
+
+        async def attempt():
+            with recorder.span("hedge"):
+                await asyncio.sleep(10)
+
+        with recorder.span("root"):
+            task = asyncio.ensure_future(attempt())
+            await asyncio.sleep(0)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        assert exported[0]["error"] is False
+        assert exported[0]["attributes"]["cancelled"] is True
+
+
+@pytest.mark.asyncio
+class TestPropagation:
+    async def test_forwards_trace_context_and_request_id(self, client, upstream, auth_headers, monkeypatch):
+        exported = []
+        monkeypatch.setattr(tracer, "export", exported.append)
+        monkeypatch.setattr(tracer, "sample_rate", 1.0)
+
+        response = await client.get(
+            "/api/v1/orders/1", headers={**auth_headers, "traceparent": PARENT, "x-request-id": "abc"}
+        )
+
+        forwarded = upstream.requests[0][0].headers
+        context = parse_traceparent(forwarded["traceparent"])
+        assert context.trace_id == TRACE_ID
+        assert forwarded["x-request-id"] == response.headers["x-request-id"] == "abc"
+
+        spans = {span["name"]: span for span in exported}
+        assert spans["upstream.request"]["span_id"] == context.span_id
+        assert spans["upstream.request"]["parent_id"] == spans["gateway.request"]["span_id"]
+        assert spans["gateway.request"]["parent_id"] == "00f067aa0ba902b7"
+        assert spans["gateway.request"]["attributes"]["status_code"] == 200
+
+    async def test_generated_request_id_is_forwarded(self, client, upstream, auth_headers):
+        response = await client.get("/api/v1/orders/1", headers=auth_headers)
+
+        forwarded = upstream.requests[0][0].headers
+        assert forwarded["x-request-id"] == response.headers["x-request-id"]
+        assert parse_traceparent(forwarded["traceparent"]) is not None
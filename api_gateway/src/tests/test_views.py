@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+
+def _pages(delays=None, statuses=None):
+    """Upstream answering each view part, optionally slow or failing per service host."""
+    delays = delays or {}
+    statuses = statuses or {}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        await asyncio.sleep(delays.get(host, 0.05))
+        if host in statuses:
+            return httpx.Response(statuses[host], json={"detail": "nope"})
+        return httpx.Response(200, json={"from": host, "path": request.url.path})
+
+    return handler
+
+
+@pytest.mark.asyncio
+class TestCompositeViews:
+    async def test_fetches_parts_concurrently_and_merges_them(self, client, upstream, auth_headers):
+        upstream.handler = _pages()
+
+        started = time.perf_counter()
+        response = await client.get("/api/v1/views/order/42", headers=auth_headers)
+        elapsed = time.perf_counter() - started
+
+        assert response.status_code == 200
+        assert response.json() == {
+            "order": {"from": "order_service", "path": "/api/orders/42"},
+            "payment": {"from": "billing_service", "path": "/payments"},
+            "user": {"from": "auth_service", "path": "/auth/me"},
+            "errors": {},
+        }
+        assert elapsed < 0.15  # three 50 ms parts, not 150 ms in a row
+        assert all(request.headers["authorization"] == auth_headers["Authorization"]
+                   for request, _ in upstream.requests)
+
+    async def test_slow_or_failing_optional_parts_degrade_to_null(self, client, upstream, auth_headers):
+        upstream.handler = _pages(delays={"billing_service": 5}, statuses={"auth_service": 500})
+
+        response = await client.get("/api/v1/views/order/42", headers=auth_headers)
+
+        body = response.json()
+        assert response.status_code == 200
+        assert body["order"]["from"] == "order_service"
+        assert body["payment"] is None and body["user"] is None
+        assert body["errors"] == {
+            "payment": {"status": 504, "detail": "Sub-request timed out"},
+            "user": {"status": 500, "detail": "nope"},
+        }
+
+    async def test_failed_required_part_fails_the_view(self, client, upstream, auth_headers):
+        upstream.handler = _pages(statuses={"order_service": 404})
+
+        response = await client.get("/api/v1/views/order/42", headers=auth_headers)
+
+        assert response.status_code == 404
+        assert response.json()["detail"] == "nope"
+
+    async def test_unknown_view_is_404(self, client, auth_headers):
+        response = await client.get("/api/v1/views/nothing/42", headers=auth_headers)
+
+        assert response.status_code == 404
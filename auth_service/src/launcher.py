@@ -0,0 +1,244 @@
+"""
+Pre-forking production server: N uvicorn workers sharing one port.
+
+Each service's image has its own build context, so the gateway, order and
+auth services carry identical copies of this module (like logsink.py and
+tracing.py). Keep them in sync; the gateway's tests cover all three.
+"""
+import gc
+import logging
+import os
+import random
+import signal
+import socket
+import sys
+import time
+from typing import Any, Callable, Dict, Optional, Union
+
+import uvicorn
+from uvicorn.config import STARTUP_FAILURE
+from uvicorn.importer import import_from_string
+
+logger = logging.getLogger("uvicorn.error")
+
+REUSE_PORT_SUPPORTED = hasattr(socket, "SO_REUSEPORT")
+
+
+def event_loop() -> str:
+    """uvloop when it is installed, else the stdlib loop."""
+    try:
+        import uvloop  # noqa: F401
+    except ImportError:
+        return "asyncio"
+    return "uvloop"
+
+
+def http_protocol() -> str:
+    """httptools when it is installed, else h11."""
+    try:
+        import httptools  # noqa: F401
+    except ImportError:
+        return "h11"
+    return "httptools"
+
+
+def bind_socket(host: str, port: int, backlog: int, reuse_port: bool) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Launcher:
+    """
+    Supervises `workers` forked uvicorn processes.
+
+    With `reuse_port` (and SO_REUSEPORT available) every worker binds its own
+    listening socket and the kernel spreads new connections across them;
+    otherwise the master binds one socket before forking and the workers
+    accept from it. With `preload` an import-string app is imported in the
+    master, and the heap is frozen out of the cyclic GC, so workers share the
+    loaded code and data copy-on-write instead of each importing their own.
+    A worker exits gracefully after `max_requests` (plus up to
+    `max_requests_jitter`, so they don't all recycle at once) and is
+    replaced; crashed workers are replaced too, but a worker that fails to
+    start (uvicorn's exit status 3) stops the server with that status rather
+    than being respawned in a loop. SIGTERM/SIGINT stop all
+    workers gracefully; SIGHUP starts a fresh set and then gracefully stops
+    the old one. `on_worker_exit(pid)` runs in the master after each worker
+    is reaped, e.g. to clean up per-process files.
+    """
+
+    def __init__(
+        self,
+        app: Union[str, Any],
+        host: str,
+        port: int,
+        workers: int = 1,
+        backlog: int = 2048,
+        max_requests: int = 0,
+        max_requests_jitter: int = 0,
+        reuse_port: bool = True,
+        preload: bool = True,
+        graceful_timeout: int = 30,
+        on_worker_exit: Optional[Callable[[int], None]] = None,
+        **uvicorn_options: Any,
+    ):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = max(1, workers)
+        self.backlog = backlog
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.reuse_port = reuse_port and REUSE_PORT_SUPPORTED
+        self.preload = preload
+        self.graceful_timeout = graceful_timeout
+        self.on_worker_exit = on_worker_exit
+        self.uvicorn_options = uvicorn_options
+        self._socket: Optional[socket.socket] = None
+        self._children: Dict[int, float] = {}  # pid -> start time
+        self._stopping = False
+        self._restart = False
+        self._exit_code = 0
+
+    def config(self, **overrides: Any) -> uvicorn.Config:
+        options: Dict[str, Any] = {
+            "host": self.host,
+            "port": self.port,
+            "loop": event_loop(),
+            "http": http_protocol(),
+            "backlog": self.backlog,
+            "timeout_graceful_shutdown": self.graceful_timeout,
+            **self.uvicorn_options,
+            **overrides,
+        }
+        return uvicorn.Config(self.app, **options)
+
+    def run(self) -> None:
+        config = self.config()  # also sets up uvicorn's logging in the master
+        if self.workers == 1 and not self.max_requests:
+            uvicorn.Server(config).run()
+            return
+
+        if self.preload and isinstance(self.app, str):
+            self.app = import_from_string(self.app)
+        # Objects that exist now are never collected; keeping the GC from
+        # touching them keeps their pages shared with the workers
+        gc.collect()
+        gc.freeze()
+
+        if not self.reuse_port:
+            self._socket = bind_socket(self.host, self.port, self.backlog, reuse_port=False)
+        logger.info(
+            "Starting %d workers on %s:%d (loop=%s, http=%s, %s)",
+            self.workers, self.host, self.port, config.loop, config.http,
+            "SO_REUSEPORT" if self.reuse_port else "shared socket",
+        )
+
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGHUP, self._reload)
+        try:
+            self._supervise()
+        finally:
+            self._shutdown()
+        if self._exit_code:
+            sys.exit(self._exit_code)
+
+    def _supervise(self) -> None:
+        while not self._stopping:
+            while len(self._children) < self.workers and not self._stopping:
+                self._spawn()
+            if self._restart:
+                self._restart = False
+                for pid in list(self._children):
+                    self._replace(pid)
+            time.sleep(0.2)
+            self._reap()
+
+    def _spawn(self) -> None:
+        pid = os.fork()
+        if pid:
+            self._children[pid] = time.monotonic()
+            return
+        status = 1
+        try:
+            self._serve_worker()
+            status = 0
+        except SystemExit as e:  # uvicorn exits with 3 when startup fails
+            status = e.code if isinstance(e.code, int) else 1
+        except BaseException:
+            logger.exception("Worker %d failed", os.getpid())
+        finally:
+            os._exit(status)
+
+    def _serve_worker(self) -> None:
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(signum, signal.SIG_DFL)
+        sock = self._socket or bind_socket(self.host, self.port, self.backlog, reuse_port=True)
+        limit = None
+        if self.max_requests:
+            limit = self.max_requests + random.randint(0, max(0, self.max_requests_jitter))
+        uvicorn.Server(self.config(limit_max_requests=limit)).run(sockets=[sock])
+
+    def _replace(self, pid: int) -> None:
+        """Start a new worker, then gracefully stop the old one."""
+        self._spawn()
+        self._signal(pid, signal.SIGTERM)
+
+    def _reap(self) -> None:
+        while self._children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if not pid:
+                return
+            started = self._children.pop(pid, None)
+            if started is None:
+                continue
+            if self.on_worker_exit is not None:
+                try:
+                    self.on_worker_exit(pid)
+                except Exception:
+                    logger.exception("Cleanup after worker %d failed", pid)
+            code = os.waitstatus_to_exitcode(status)
+            if code == STARTUP_FAILURE and not self._stopping:
+                logger.error("Worker %d failed to start; stopping", pid)
+                self._stopping = True
+                self._exit_code = code
+            elif code and not self._stopping:
+                logger.warning("Worker %d exited with status %d; replacing it", pid, code)
+                if time.monotonic() - started < 1.0:
+                    time.sleep(1.0)  # don't spin on a worker that fails at startup
+
+    def _signal(self, pid: int, signum: int) -> None:
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            self._children.pop(pid, None)
+
+    def _stop(self, signum: int, frame: Any) -> None:
+        self._stopping = True
+
+    def _reload(self, signum: int, frame: Any) -> None:
+        self._restart = True
+
+    def _shutdown(self) -> None:
+        for pid in list(self._children):
+            self._signal(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout + 5
+        while self._children and time.monotonic() < deadline:
+            time.sleep(0.1)
+            self._reap()
+        for pid in list(self._children):
+            logger.warning("Worker %d did not stop in time; killing it", pid)
+            self._signal(pid, signal.SIGKILL)
+        if self._socket is not None:
+            self._socket.close()
+
+
+def serve(app: Union[str, Any], host: str, port: int, **options: Any) -> None:
+    Launcher(app, host, port, **options).run()
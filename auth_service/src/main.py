@@ -6,6 +6,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 import sqlalchemy as sa
 
 import security
+from launcher import serve
 from settings import settings
 from db.base import get_db
 from db.models.users import User
@@ -148,4 +149,19 @@ async def read_users(
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+
+if __name__ == "__main__":
+    # Production entry point; this process has already built `app`, so preloading is free
+    serve(
+        app if settings.SERVER_PRELOAD else "main:app",
+        host=settings.HOST,
+        port=settings.PORT,
+        workers=settings.SERVER_WORKERS,
+        backlog=settings.SERVER_BACKLOG,
+        reuse_port=settings.SERVER_REUSE_PORT,
+        max_requests=settings.SERVER_MAX_REQUESTS,
+        max_requests_jitter=settings.SERVER_MAX_REQUESTS_JITTER,
+        graceful_timeout=settings.SERVER_GRACEFUL_TIMEOUT,
+    )
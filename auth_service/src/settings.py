@@ -1,3 +1,4 @@
+from pydantic import AliasChoices, Field
 from pydantic_settings import BaseSettings
 
 
@@ -6,7 +7,16 @@ class Settings(BaseSettings):
     
     # Service configuration
     HOST: str = "0.0.0.0"
-    PORT: int = 9003
+    PORT: int = Field(9003, validation_alias=AliasChoices("AUTH_SERVICE_PORT", "PORT"))
+
+    # Production launcher (python src/main.py): pre-forked workers sharing the port
+    SERVER_WORKERS: int = 1
+    SERVER_BACKLOG: int = 2048  # listen() queue per socket
+    SERVER_REUSE_PORT: bool = True  # else one socket bound before fork
+    SERVER_PRELOAD: bool = True  # import the app once, share it copy-on-write
+    SERVER_MAX_REQUESTS: int = 0  # recycle workers after N requests; 0 = never
+    SERVER_MAX_REQUESTS_JITTER: int = 0
+    SERVER_GRACEFUL_TIMEOUT: int = 30
     
     # Database configuration
     POSTGRES_USER: str = "postgres"
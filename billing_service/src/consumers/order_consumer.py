@@ -10,6 +10,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from src.db.models.payments import Payment
 from src.models.events import OrderCreatedEvent, PaymentProcessedEvent
 from src.db.base import async_session
+from src.tracing import Span, parse_traceparent, tracer
 
 
 logger = logging.getLogger(__name__)
@@ -44,32 +45,43 @@ class OrderConsumer:
 
     async def process_message(self, message: IncomingMessage) -> None:
         """Process incoming order_created event."""
+        traceparent = (message.headers or {}).get("traceparent")
+        parent = parse_traceparent(traceparent.decode() if isinstance(traceparent, bytes) else traceparent)
         async with message.process():
-            try:
-                # Parse event
-                event_data = json.loads(message.body.decode())
-                order_event = OrderCreatedEvent(**event_data)
-                
-                # Process payment
+            with tracer.span("amqp.consume", parent, routing_key=message.routing_key) as span:
+                await self.handle_event(message, span)
+
+    async def handle_event(self, message: IncomingMessage, span: Span) -> None:
+        """Parse an order_created event, charge it and publish the result."""
+        try:
+            # Parse event
+            event_data = json.loads(message.body.decode())
+            order_event = OrderCreatedEvent(**event_data)
+            span.set(order_id=order_event.order_id)
+
+            # Process payment
+            with tracer.span("db.process_payment"):
                 payment_id = await self.process_payment(order_event)
-                
-                if payment_id:
-                    # Publish result
-                    await self.publish_result(
-                        order_id=order_event.order_id,
-                        user_id=order_event.user_id,
-                        payment_id=payment_id,
-                        amount=order_event.amount,
-                        status="completed"
-                    )
-                    logger.info(f"Payment processed: order_id={order_event.order_id}")
-                else:
-                    logger.error(f"Payment failed: order_id={order_event.order_id}")
-            
-            except Exception as e:
-                logger.exception(f"Error processing message: {e}")
-                # Requeue if needed (depends on your retry strategy)
-                # await message.reject(requeue=True)
+
+            if payment_id:
+                # Publish result
+                await self.publish_result(
+                    order_id=order_event.order_id,
+                    user_id=order_event.user_id,
+                    payment_id=payment_id,
+                    amount=order_event.amount,
+                    status="completed"
+                )
+                logger.info(f"Payment processed: order_id={order_event.order_id}")
+            else:
+                span.error = True
+                logger.error(f"Payment failed: order_id={order_event.order_id}")
+
+        except Exception as e:
+            span.error = True
+            logger.exception(f"Error processing message: {e}")
+            # Requeue if needed (depends on your retry strategy)
+            # await message.reject(requeue=True)
 
     async def process_payment(self, order: OrderCreatedEvent) -> Optional[int]:
         """Process payment for order and return payment_id if successful."""
@@ -116,13 +128,15 @@ class OrderConsumer:
             processed_at=datetime.utcnow()
         )
         
-        message = aio_pika.Message(
-            # model_dump_json handles Decimal and datetime; json.dumps(model_dump()) does not
-            body=event.model_dump_json().encode(),
-            delivery_mode=aio_pika.DeliveryMode.PERSISTENT
-        )
-        
-        await self.exchange.publish(
-            message,
-            routing_key="payment_processed"
-        )
\ No newline at end of file
+        with tracer.span("amqp.publish", routing_key="payment_processed", order_id=order_id):
+            message = aio_pika.Message(
+                # model_dump_json handles Decimal and datetime; json.dumps(model_dump()) does not
+                body=event.model_dump_json().encode(),
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                headers=tracer.headers(),
+            )
+
+            await self.exchange.publish(
+                message,
+                routing_key="payment_processed"
+            )
\ No newline at end of file
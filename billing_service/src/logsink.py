@@ -0,0 +1,174 @@
+"""
+Non-blocking, batched log output for the stdlib `logging` module (and spans).
+
+Same design as the API gateway's structlog sink: records go onto a bounded
+queue, a background thread formats them and writes each batch with a single
+write + flush, and a full queue drops (and counts) records instead of
+blocking the event loop.
+"""
+import logging
+import os
+import queue
+import sys
+import threading
+import weakref
+from typing import Any, Callable, Dict, List, Optional, TextIO
+
+_STOP = object()
+
+
+class LogSink:
+    """Bounded queue of log records drained by a background writer thread."""
+
+    def __init__(
+        self,
+        render: Callable[[Any], str],
+        max_queue: int = 10_000,
+        batch_size: int = 512,
+        stream: Optional[TextIO] = None,
+    ):
+        self._render = render
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self._stream = stream
+        self._thread: Optional[threading.Thread] = None
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        ref = weakref.ref(self)
+        os.register_at_fork(after_in_child=lambda: (sink := ref()) and sink._after_fork())
+
+    def _after_fork(self) -> None:
+        """Pre-forked workers get a fresh queue and writer thread of their own."""
+        running = self._thread is not None
+        self._queue = queue.Queue(maxsize=self._queue.maxsize)
+        self._thread = None
+        self.written = self.dropped = self.errors = 0
+        if running:
+            self.start()
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+            self._thread.start()
+
+    def put(self, record: Any) -> bool:
+        """Queue a record; returns False (and counts it) if the queue is full."""
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = _STOP in batch
+            self._write([record for record in batch if record is not _STOP])
+            if stop:
+                return
+
+    def _write(self, batch: List[Any]) -> None:
+        lines = []
+        for record in batch:
+            try:
+                lines.append(self._render(record))
+            except Exception:
+                self.errors += 1
+        if not lines:
+            return
+        stream = self._stream or sys.stderr
+        try:
+            stream.write("\n".join(lines) + "\n")
+            stream.flush()
+            self.written += len(lines)
+        except Exception:
+            self.errors += len(lines)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Flush everything queued so far and stop the writer thread."""
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        # Blocking put: the stop marker must not be dropped
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "written": self.written,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "queued": self._queue.qsize(),
+        }
+
+
+class SinkHandler(logging.Handler):
+    """
+    `logging.Handler` that hands records to a `LogSink`.
+
+    The message and traceback are resolved in the calling thread (like
+    `logging.handlers.QueueHandler`), so arguments mutated after the call
+    can't change what gets written; only formatting and I/O are deferred.
+    """
+
+    def __init__(self, sink: LogSink, sample_rates: Optional[Dict[str, float]] = None):
+        super().__init__()
+        self.sink = sink
+        self.sample_rates = sample_rates or {}
+        self._sample_counts: Dict[str, int] = {}
+        self.sampled_out = 0
+
+    def sampled(self, record: logging.LogRecord) -> bool:
+        """Keep every 1/rate-th record of a sampled logger; WARNING and above always pass."""
+        rate = self.sample_rates.get(record.name, 1.0)
+        if rate >= 1.0 or record.levelno >= logging.WARNING:
+            return True
+        count = self._sample_counts.get(record.name, 0) + 1
+        self._sample_counts[record.name] = count
+        if rate > 0 and count * rate % 1.0 < rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if not self.sampled(record):
+            return
+        try:
+            record.message = record.getMessage()
+            if record.exc_info and not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.msg, record.args, record.exc_info = record.message, None, None
+        except Exception:
+            self.handleError(record)
+            return
+        self.sink.put(record)
+
+    def close(self) -> None:
+        self.sink.close()
+        super().close()
+
+
+def install(
+    level: int,
+    fmt: str,
+    max_queue: int,
+    batch_size: int,
+    sample_rates: Optional[Dict[str, float]] = None,
+) -> SinkHandler:
+    """Replace the root logger's handlers with a started `SinkHandler` (in place of `basicConfig`)."""
+    sink = LogSink(logging.Formatter(fmt).format, max_queue=max_queue, batch_size=batch_size)
+    handler = SinkHandler(sink, sample_rates)
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+    sink.start()
+    return handler
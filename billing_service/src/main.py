@@ -1,20 +1,30 @@
 import asyncio
 import os
+import atexit
 import logging
 from contextlib import asynccontextmanager
 from typing import AsyncIterator
 
 import aio_pika
 from src.settings import settings
+from src.logsink import install as install_log_sink
+from src.tracing import span_sink
 from src.consumers.order_consumer import OrderConsumer
 
 
 # Setup logging
 logger = logging.getLogger("asyncflow.billing_service")
-logging.basicConfig(
+# Records are formatted and written by a background thread, off the event loop;
+# logging.shutdown() (atexit) closes the handler and flushes what is queued
+install_log_sink(
     level=getattr(logging, settings.log_level.upper(), logging.INFO),
-    format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    fmt="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    max_queue=settings.log_queue_size,
+    batch_size=settings.log_batch_size,
+    sample_rates=settings.log_sample_rates,
 )
+span_sink.start()
+atexit.register(span_sink.close)
 
 
 @asynccontextmanager
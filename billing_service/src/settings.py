@@ -1,6 +1,6 @@
 from pydantic import Field, validator, SecretStr
 from pydantic_settings import BaseSettings
-from typing import List, Optional
+from typing import Dict, List, Optional
 from enum import Enum
 
 
@@ -43,6 +43,25 @@ class Settings(BaseSettings):
         LogLevel.INFO,
         description="Logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)"
     )
+    log_queue_size: int = Field(
+        10000, ge=1, description="Log records buffered for the writer thread before dropping"
+    )
+    log_batch_size: int = Field(512, ge=1, description="Max log records per write/flush")
+    log_sample_rates: Dict[str, float] = Field(
+        default_factory=dict,
+        description="Fraction of INFO/DEBUG records kept per logger name (WARNING+ always kept)"
+    )
+
+    # Tracing
+    tracing_enabled: bool = Field(True, description="Record spans and export sampled traces")
+    tracing_export_path: Optional[str] = Field(
+        None, description="File that spans are appended to as JSON lines (stdout if unset)"
+    )
+    tracing_slow_ms: float = Field(500.0, ge=0, description="Traces at least this slow are always exported")
+    tracing_sample_rate: float = Field(
+        0.01, ge=0, le=1, description="Fraction of other traces exported (by trace id)"
+    )
+    tracing_max_spans_per_trace: int = Field(256, ge=1, description="Spans buffered per local trace")
 
     @property
     def database_url(self) -> str:
@@ -1,13 +1,20 @@
-from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi import APIRouter, Depends, status, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.types import Receive, Scope, Send
 from sqlalchemy import text
 from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Optional
 import aio_pika
+import asyncio
 import json
 
 from src.db.models.orders import Order
 from src.models.order_dto import OrderCreate, OrderResponse
 from src.api.dependencies import get_db, get_exchange
+from src.notifications import TERMINAL_STATUSES, Subscription, order_status_hub, serialize_order
+from src.settings import settings
+from src.tracing import tracer
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 
@@ -27,8 +34,9 @@ async def create_order(
     db.add(new_order)
 
     try:
-        await db.commit()
-        await db.refresh(new_order)
+        with tracer.span("db.insert_order"):
+            await db.commit()
+            await db.refresh(new_order)
     except Exception:
         await db.rollback()
         raise
@@ -41,8 +49,10 @@ async def create_order(
         "created_at": datetime.utcnow().isoformat(),
     }
 
-    message = aio_pika.Message(body=json.dumps(event).encode())
-    await exchange.publish(message, routing_key="order_created")
+    with tracer.span("amqp.publish", routing_key="order_created", order_id=new_order.id):
+        # The consumer continues the trace from the message headers
+        message = aio_pika.Message(body=json.dumps(event).encode(), headers=tracer.headers())
+        await exchange.publish(message, routing_key="order_created")
 
     return OrderResponse(
         order_id=new_order.id,
@@ -55,8 +65,9 @@ async def create_order(
 async def list_orders(db: AsyncSession = Depends(get_db)):
     """Возвращает список заказов (упрощённо)."""
     # Return simplified order list with basic fields
-    result = await db.execute(text("SELECT id, user_id, amount, status, created_at FROM orders ORDER BY id DESC"))
-    rows = result.fetchall()
+    with tracer.span("db.list_orders"):
+        result = await db.execute(text("SELECT id, user_id, amount, status, created_at FROM orders ORDER BY id DESC"))
+        rows = result.fetchall()
     return [
         {
             "id": row.id,
@@ -69,16 +80,110 @@ async def list_orders(db: AsyncSession = Depends(get_db)):
     ]
 
 
-@router.get("/{order_id}")
-async def get_order(order_id: int, db: AsyncSession = Depends(get_db)):
-    """Get a single order by id."""
-    order = await db.get(Order, order_id)
+async def read_order(db: AsyncSession, order_id: int) -> Dict[str, Any]:
+    with tracer.span("db.get_order"):
+        order = await db.get(Order, order_id)
     if order is None:
         raise HTTPException(status_code=404, detail="Order not found")
-    return {
-        "id": order.id,
-        "user_id": order.user_id,
-        "amount": float(order.amount),
-        "status": order.status,
-        "created_at": order.created_at,
-    }
\ No newline at end of file
+    return serialize_order(order)
+
+
+@router.get("/{order_id}")
+async def get_order(
+    order_id: int,
+    wait_for_change: Optional[str] = Query(
+        None, description="Status the client already has; wait until the order's status differs"
+    ),
+    timeout: Optional[float] = Query(None, gt=0, description="Longest wait, capped by the server"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Get a single order by id.
+
+    With `?wait_for_change=<status>` this is a long poll: if the order still
+    has that status the request is parked (up to `timeout` seconds, at most
+    LONG_POLL_TIMEOUT) until the order changes, then the order is returned
+    either way.
+    """
+    if wait_for_change is None:
+        return await read_order(db, order_id)
+
+    # Subscribe before reading so a change landing in between still wakes us
+    with order_status_hub.subscribe(order_id) as subscription:
+        order = await read_order(db, order_id)
+        # Don't hold a pooled database connection while parked
+        await db.close()
+        deadline = asyncio.get_running_loop().time() + min(
+            timeout or settings.long_poll_timeout, settings.long_poll_timeout
+        )
+        while order["status"] == wait_for_change:
+            remaining = deadline - asyncio.get_running_loop().time()
+            change = await subscription.next(remaining) if remaining > 0 else None
+            if change is None:
+                break
+            order = change
+    return order
+
+
+def sse_event(order: Dict[str, Any]) -> bytes:
+    return f"event: status\ndata: {json.dumps(order)}\n\n".encode()
+
+
+async def status_stream(subscription: Subscription, order: Dict[str, Any]) -> AsyncIterator[bytes]:
+    """The current order, then each status change until a final one (or the time limit)."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.sse_max_duration
+    yield sse_event(order)
+    while order["status"] not in TERMINAL_STATUSES:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            break
+        change = await subscription.next(min(settings.sse_keepalive_interval, remaining))
+        if change is None:
+            # Keeps proxies and load balancers from closing an idle stream
+            yield b": keepalive\n\n"
+            continue
+        order = change
+        yield sse_event(order)
+
+
+class SubscriptionStreamingResponse(StreamingResponse):
+    """
+    Streaming response that owns a hub subscription and closes it when done.
+
+    A generator's `finally` is not enough: a client that disconnects before
+    the first chunk gets the response cancelled before the generator ever
+    starts, and its `finally` never runs.
+    """
+
+    def __init__(self, content: AsyncIterator[bytes], subscription: Subscription, **kwargs: Any):
+        super().__init__(content, **kwargs)
+        self.subscription = subscription
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.subscription.close()
+
+
+@router.get("/{order_id}/events")
+async def order_events(order_id: int, db: AsyncSession = Depends(get_db)):
+    """
+    Server-sent events for one order: a `status` event with the order now
+    and after every status change, `: keepalive` comments in between. The
+    stream ends after a final status (paid, payment_failed, cancelled).
+    """
+    subscription = order_status_hub.subscribe(order_id)
+    try:
+        order = await read_order(db, order_id)
+    except BaseException:
+        subscription.close()
+        raise
+    await db.close()
+    return SubscriptionStreamingResponse(
+        status_stream(subscription, order),
+        subscription,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,5 +1,6 @@
 from __future__ import annotations
 from fastapi.encoders import jsonable_encoder
+import atexit
 import logging
 from contextlib import asynccontextmanager
 from typing import AsyncIterator, Optional, Sequence
@@ -14,15 +15,26 @@ from starlette.requests import Request
 from starlette.responses import JSONResponse
 
 from src.settings import settings
+from src.launcher import serve
+from src.logsink import install as install_log_sink
+from src.notifications import consume_payments, consume_status_changes
+from src.tracing import TraceMiddleware, span_sink
 from src.api import api_router
 
 
 # ── ЛОГИРОВАНИЕ ────────────────────────────────────────────────────────────────
 logger = logging.getLogger("asyncflow.order_service")
-logging.basicConfig(
+# Records are formatted and written by a background thread, off the event loop;
+# logging.shutdown() (atexit) closes the handler and flushes what is queued
+install_log_sink(
     level=getattr(logging, settings.log_level.upper(), logging.INFO),
-    format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    fmt="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    max_queue=settings.log_queue_size,
+    batch_size=settings.log_batch_size,
+    sample_rates=settings.log_sample_rates,
 )
+span_sink.start()
+atexit.register(span_sink.close)
 
 
 # ── LIFESPAN: подключение к RabbitMQ на старте, закрытие на остановке ──────────
@@ -70,6 +82,10 @@ async def lifespan(app: FastAPI) -> AsyncIterator[None]:
         app.state.amqp_channel = channel
         app.state.amqp_exchange = exchange
 
+        # Order status push: persist payment outcomes, wake long-poll/SSE waiters
+        await consume_payments(channel, exchange)
+        await consume_status_changes(channel, exchange)
+
         logger.info("RabbitMQ connected. Exchange '%s' ready.", settings.amqp_exchange)
         yield
 
@@ -118,6 +134,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Трассировка: корневой span на каждый запрос (продолжает traceparent от gateway)
+app.add_middleware(TraceMiddleware)
+
 
 # ── ГЛОБАЛЬНЫЕ ОБРАБОТЧИКИ ОШИБОК (без бизнес-логики) ─────────────────────────
 @app.exception_handler(RequestValidationError)
@@ -147,4 +166,19 @@ app.include_router(api_router)
 # Из обработчиков ты сможешь получить exchange так:
 #   exchange: aio_pika.abc.AbstractExchange = request.app.state.amqp_exchange
 # и публиковать события:
-#   await exchange.publish(aio_pika.Message(body=payload), routing_key="order_created")
\ No newline at end of file
+#   await exchange.publish(aio_pika.Message(body=payload), routing_key="order_created")
+
+
+if __name__ == "__main__":
+    # Production entry point; this process has already built `app`, so preloading is free
+    serve(
+        app if settings.server_preload else "src.main:app",
+        host=settings.host,
+        port=settings.port,
+        workers=settings.server_workers,
+        backlog=settings.server_backlog,
+        reuse_port=settings.server_reuse_port,
+        max_requests=settings.server_max_requests,
+        max_requests_jitter=settings.server_max_requests_jitter,
+        graceful_timeout=settings.server_graceful_timeout,
+    )
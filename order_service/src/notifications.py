@@ -0,0 +1,205 @@
+"""
+Order status push: wakes parked long-poll and SSE requests when an order changes.
+
+`payment_processed` events from billing land on a durable queue shared by all
+workers; whichever worker takes one updates the order and publishes
+`order_status_changed`. Every worker binds its own private queue to that
+routing key and hands the change to its in-process `OrderStatusHub`, which
+wakes the subscribers waiting on that order.
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Set
+
+import aio_pika
+from pydantic import ValidationError
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db.base import async_session
+from src.db.models.orders import Order
+from src.models.events import PaymentProcessedEvent
+from src.settings import settings
+from src.tracing import TraceContext, parse_traceparent, tracer
+
+logger = logging.getLogger(__name__)
+
+STATUS_CHANGED = "order_status_changed"
+
+# Payment outcome (billing) -> order status
+ORDER_STATUS_BY_PAYMENT = {"completed": "paid", "failed": "payment_failed"}
+
+# Statuses an order never leaves; SSE streams end after sending one
+TERMINAL_STATUSES = frozenset({"paid", "payment_failed", "cancelled"})
+
+
+def serialize_order(order: Any) -> Dict[str, Any]:
+    """JSON-ready order, as returned by GET /orders/{id} and pushed to subscribers."""
+    created_at = order.created_at
+    return {
+        "id": order.id,
+        "user_id": order.user_id,
+        "amount": float(order.amount),
+        "status": order.status,
+        "created_at": created_at.isoformat() if isinstance(created_at, datetime) else created_at,
+    }
+
+
+class Subscription:
+    """
+    One waiting client. Holds only the latest change, so a subscriber costs
+    the same however many changes it misses while busy.
+    """
+
+    __slots__ = ("order_id", "latest", "_event", "_hub")
+
+    def __init__(self, hub: "OrderStatusHub", order_id: int):
+        self.order_id = order_id
+        self.latest: Optional[Dict[str, Any]] = None
+        self._event = asyncio.Event()
+        self._hub = hub
+
+    def notify(self, order: Dict[str, Any]) -> None:
+        self.latest = order
+        self._event.set()
+
+    async def next(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """The latest change since the previous call, or None after `timeout` seconds."""
+        try:
+            async with asyncio.timeout(timeout):
+                await self._event.wait()
+        except TimeoutError:
+            return None
+        self._event.clear()
+        order, self.latest = self.latest, None
+        return order
+
+    def close(self) -> None:
+        self._hub.unsubscribe(self)
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+class OrderStatusHub:
+    """In-process fan-out of order changes to subscribers, keyed by order id."""
+
+    def __init__(self) -> None:
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self.published = 0
+        self.delivered = 0
+
+    def subscribe(self, order_id: int) -> Subscription:
+        """
+        Start listening before reading the order's current state, so a change
+        landing in between is not missed.
+        """
+        subscription = Subscription(self, order_id)
+        self._subscribers.setdefault(order_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._subscribers.get(subscription.order_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.order_id]
+
+    def publish(self, order: Dict[str, Any]) -> int:
+        """Wake everyone waiting on `order["id"]`; returns how many were woken."""
+        self.published += 1
+        subscribers = self._subscribers.get(order["id"], ())
+        for subscription in subscribers:
+            subscription.notify(order)
+        self.delivered += len(subscribers)
+        return len(subscribers)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "orders": len(self._subscribers),
+            "subscribers": sum(len(subscribers) for subscribers in self._subscribers.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+        }
+
+
+order_status_hub = OrderStatusHub()
+
+
+def message_parent(message: aio_pika.abc.AbstractIncomingMessage) -> Optional[TraceContext]:
+    traceparent = (message.headers or {}).get("traceparent")
+    return parse_traceparent(traceparent.decode() if isinstance(traceparent, bytes) else traceparent)
+
+
+async def apply_payment(
+    event: PaymentProcessedEvent,
+    session_factory: Callable[[], AsyncSession] = async_session,
+) -> Optional[Dict[str, Any]]:
+    """Record a payment outcome on its order; returns the changed order, or None if unchanged."""
+    status = ORDER_STATUS_BY_PAYMENT.get(event.status, f"payment_{event.status}")
+    async with session_factory() as session:
+        with tracer.span("db.update_order_status", order_id=event.order_id, status=status):
+            result = await session.execute(
+                update(Order)
+                .where(Order.id == event.order_id, Order.status != status)
+                .values(status=status)
+                .returning(Order.id, Order.user_id, Order.amount, Order.status, Order.created_at)
+            )
+            row = result.first()
+            await session.commit()
+    return serialize_order(row) if row is not None else None
+
+
+async def consume_payments(
+    channel: aio_pika.abc.AbstractChannel,
+    exchange: aio_pika.abc.AbstractExchange,
+) -> None:
+    """Persist `payment_processed` outcomes and announce the resulting status changes."""
+    queue = await channel.declare_queue(settings.payments_queue, durable=True)
+    await queue.bind(exchange, routing_key="payment_processed")
+
+    async def on_message(message: aio_pika.abc.AbstractIncomingMessage) -> None:
+        # Requeue on failure (database down); malformed events are acked and dropped
+        async with message.process(requeue=True):
+            with tracer.span("amqp.consume", message_parent(message), routing_key=message.routing_key):
+                try:
+                    event = PaymentProcessedEvent.model_validate_json(message.body)
+                except ValidationError as e:
+                    logger.warning("Dropping malformed payment_processed event: %s", e)
+                    return
+                order = await apply_payment(event)
+                if order is None:
+                    return
+                with tracer.span("amqp.publish", routing_key=STATUS_CHANGED, order_id=order["id"]):
+                    await exchange.publish(
+                        aio_pika.Message(body=json.dumps(order).encode(), headers=tracer.headers()),
+                        routing_key=STATUS_CHANGED,
+                    )
+
+    await queue.consume(on_message)
+
+
+async def consume_status_changes(
+    channel: aio_pika.abc.AbstractChannel,
+    exchange: aio_pika.abc.AbstractExchange,
+    hub: OrderStatusHub = order_status_hub,
+) -> None:
+    """Feed this worker's hub from a private queue bound to `order_status_changed`."""
+    queue = await channel.declare_queue(exclusive=True, auto_delete=True)
+    await queue.bind(exchange, routing_key=STATUS_CHANGED)
+
+    async def on_message(message: aio_pika.abc.AbstractIncomingMessage) -> None:
+        try:
+            order = json.loads(message.body)
+            hub.publish(order)
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning("Dropping malformed %s event: %s", STATUS_CHANGED, e)
+
+    # Best effort: a client that misses a notification sees the change on its next request
+    await queue.consume(on_message, no_ack=True)
@@ -1,6 +1,6 @@
-from pydantic import Field, validator, SecretStr
+from pydantic import AliasChoices, Field, validator, SecretStr
 from pydantic_settings import BaseSettings
-from typing import List, Optional
+from typing import Dict, List, Optional
 from enum import Enum
 
 
@@ -22,6 +22,31 @@ class Settings(BaseSettings):
     service_name: str = Field("order_service", description="Service name for logs and tracing")
     environment: str = Field("development", description="Deployment environment")
 
+    # Server (production launcher: python -m src.main)
+    host: str = Field("0.0.0.0", description="Interface to listen on")
+    port: int = Field(
+        9001,
+        ge=1,
+        le=65535,
+        validation_alias=AliasChoices("order_service_port", "port"),
+        description="Port to listen on (ORDER_SERVICE_PORT)",
+    )
+    server_workers: int = Field(1, ge=1, description="Worker processes sharing the port")
+    server_backlog: int = Field(2048, ge=1, description="listen() queue length per socket")
+    server_reuse_port: bool = Field(
+        True, description="Each worker binds with SO_REUSEPORT; else one socket is bound before forking"
+    )
+    server_preload: bool = Field(
+        True, description="Import the app before forking so workers share it copy-on-write"
+    )
+    server_max_requests: int = Field(
+        0, ge=0, description="Gracefully replace a worker after this many requests (0 = never)"
+    )
+    server_max_requests_jitter: int = Field(
+        0, ge=0, description="Random extra requests per worker so they don't all restart at once"
+    )
+    server_graceful_timeout: int = Field(30, ge=0, description="Seconds to finish in-flight requests on stop")
+
     # RabbitMQ Settings
     rabbitmq_user: str = Field("user", description="RabbitMQ username")
     rabbitmq_pass: SecretStr = Field("pass", description="RabbitMQ password")
@@ -32,6 +57,20 @@ class Settings(BaseSettings):
         description="RabbitMQ exchange name for event publishing"
     )
 
+    payments_queue: str = Field(
+        "order_service.payment_processed",
+        description="Durable queue of payment_processed events shared by all workers"
+    )
+
+    # Order status push (long-poll and SSE)
+    long_poll_timeout: float = Field(
+        60.0, gt=0, description="Longest a ?wait_for_change= request is parked (keep below the gateway's)"
+    )
+    sse_keepalive_interval: float = Field(15.0, gt=0, description="Seconds between SSE keep-alive comments")
+    sse_max_duration: float = Field(
+        900.0, gt=0, description="SSE streams are closed after this long; clients reconnect"
+    )
+
     # Database Settings
     db_user: str = Field("postgres", description="Database username")
     db_pass: SecretStr = Field("postgres", description="Database password")
@@ -56,6 +95,25 @@ class Settings(BaseSettings):
         LogLevel.INFO,
         description="Logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)"
     )
+    log_queue_size: int = Field(
+        10000, ge=1, description="Log records buffered for the writer thread before dropping"
+    )
+    log_batch_size: int = Field(512, ge=1, description="Max log records per write/flush")
+    log_sample_rates: Dict[str, float] = Field(
+        default_factory=dict,
+        description="Fraction of INFO/DEBUG records kept per logger name (WARNING+ always kept)"
+    )
+
+    # Tracing
+    tracing_enabled: bool = Field(True, description="Record spans and export sampled traces")
+    tracing_export_path: Optional[str] = Field(
+        None, description="File that spans are appended to as JSON lines (stdout if unset)"
+    )
+    tracing_slow_ms: float = Field(500.0, ge=0, description="Traces at least this slow are always exported")
+    tracing_sample_rate: float = Field(
+        0.01, ge=0, le=1, description="Fraction of other traces exported (by trace id)"
+    )
+    tracing_max_spans_per_trace: int = Field(256, ge=1, description="Spans buffered per local trace")
 
     @validator("cors_origins", "trusted_hosts", pre=True)
     def parse_list_from_str(cls, v):
@@ -0,0 +1,127 @@
+import asyncio
+import json
+from datetime import datetime
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.db.models.orders import Order
+from src.main import app
+from src.models.events import PaymentProcessedEvent
+from src.notifications import OrderStatusHub, apply_payment, order_status_hub, serialize_order
+
+
+def paid(order):
+    return {**serialize_order(order), "status": "paid"}
+
+
+async def publish_later(order, delay=0.05):
+    await asyncio.sleep(delay)
+    return order_status_hub.publish(order)
+
+
+@pytest.mark.asyncio
+class TestOrderStatusHub:
+    async def test_keeps_only_the_latest_change(self):
+        hub = OrderStatusHub()
+        subscription = hub.subscribe(7)
+
+        hub.publish({"id": 7, "status": "paid"})
+        hub.publish({"id": 7, "status": "refunded"})
+        hub.publish({"id": 8, "status": "paid"})
+
+        assert (await subscription.next(1))["status"] == "refunded"
+        assert await subscription.next(0.01) is None
+        assert hub.stats()["delivered"] == 2
+
+    async def test_closing_the_last_subscription_forgets_the_order(self):
+        hub = OrderStatusHub()
+        with hub.subscribe(7), hub.subscribe(7):
+            assert hub.stats()["subscribers"] == 2
+        assert hub.stats() == {"orders": 0, "subscribers": 0, "published": 0, "delivered": 0}
+
+
+@pytest.mark.asyncio
+class TestLongPoll:
+    async def test_returns_at_once_when_status_already_differs(self, client, sample_order):
+        response = await client.get(f"/api/orders/{sample_order.id}?wait_for_change=paid")
+
+        assert response.status_code == 200
+        assert response.json()["status"] == "pending"
+
+    async def test_parked_request_wakes_on_status_change(self, client, sample_order):
+        publisher = asyncio.create_task(publish_later(paid(sample_order)))
+
+        response = await client.get(f"/api/orders/{sample_order.id}?wait_for_change=pending&timeout=5")
+
+        assert response.json()["status"] == "paid"
+        assert await publisher == 1
+        assert order_status_hub.stats()["subscribers"] == 0
+
+    async def test_times_out_with_the_unchanged_order(self, client, sample_order):
+        response = await client.get(f"/api/orders/{sample_order.id}?wait_for_change=pending&timeout=0.05")
+
+        assert response.status_code == 200
+        assert response.json()["status"] == "pending"
+
+    async def test_unknown_order_is_404(self, client):
+        response = await client.get("/api/orders/999999?wait_for_change=pending")
+
+        assert response.status_code == 404
+        assert order_status_hub.stats()["subscribers"] == 0
+
+
+@pytest.mark.asyncio
+class TestServerSentEvents:
+    async def test_streams_current_status_then_changes_until_final(self, client, sample_order):
+        publisher = asyncio.create_task(publish_later(paid(sample_order)))
+
+        response = await client.get(f"/api/orders/{sample_order.id}/events")
+        await publisher
+
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = [
+            json.loads(line.removeprefix("data: "))
+            for line in response.text.splitlines()
+            if line.startswith("data: ")
+        ]
+        assert [event["status"] for event in events] == ["pending", "paid"]
+        assert order_status_hub.stats()["subscribers"] == 0
+
+    async def test_disconnect_before_first_event_releases_the_subscription(self, client, sample_order):
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": f"/api/orders/{sample_order.id}/events", "raw_path": b"",
+            "query_string": b"", "headers": [], "server": ("test", 80), "client": ("test", 1),
+            "root_path": "",
+        }
+        sent = []
+
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message["type"])
+            await asyncio.sleep(0)
+
+        await app(scope, receive, send)
+
+        assert "http.response.body" not in sent
+        assert order_status_hub.stats()["subscribers"] == 0
+
+
+@pytest.mark.asyncio
+class TestApplyPayment:
+    async def test_marks_order_paid_once(self, test_engine, sample_order):
+        session_factory = async_sessionmaker(test_engine, expire_on_commit=False)
+        event = PaymentProcessedEvent(
+            order_id=sample_order.id, user_id=1, status="completed", processed_at=datetime.utcnow()
+        )
+
+        changed = await apply_payment(event, session_factory)
+        repeated = await apply_payment(event, session_factory)
+
+        assert changed["id"] == sample_order.id and changed["status"] == "paid"
+        assert repeated is None
+        async with session_factory() as session:
+            assert (await session.get(Order, sample_order.id)).status == "paid"
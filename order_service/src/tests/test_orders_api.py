@@ -27,6 +27,17 @@ class TestOrdersAPI:
         # Verify event publication
         mock_exchange.publish.assert_awaited_once()
 
+    async def test_create_order_propagates_trace_to_event(self, client, mock_exchange):
+        trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+        headers = {"traceparent": f"00-{trace_id}-00f067aa0ba902b7-01"}
+
+        response = await client.post("/api/orders", json={"user_id": 1, "amount": 5}, headers=headers)
+
+        assert response.status_code == 201
+        message = mock_exchange.publish.await_args.args[0]
+        assert message.headers["traceparent"].startswith(f"00-{trace_id}-")
+        assert not message.headers["traceparent"].endswith("00f067aa0ba902b7-01")
+
     async def test_create_order_invalid_amount(self, client):
         payload = {"user_id": 123, "amount": -10}
         response = await client.post("/api/orders", json=payload)